@@ -18,13 +18,13 @@ void printSlice(double *array, int start, int end, int stride) {
 
 int coeffsFromSeed(double *dest, char *seed) {
 	if (strlen(seed) != 60) {
-		fprintf(stderr, "Error: Seeds must be exactly 60 characters in length");
+		fprintf(stderr, "Error: Seeds must be exactly 60 characters in length\n");
 		return 0;
 	}
 
 	for (int i = 0; i < 60; i++) {
 		if ('A' > seed[i] || seed[i] > 'Y') {
-			fprintf(stderr, "Error: Seeds must contain only the characters A-Y");
+			fprintf(stderr, "Error: Seeds must contain only the characters A-Y\n");
 			return 0;
 		}
 		dest[i] = ((seed[i] - 'A') % 25) / 10.0 - 1.2;
@@ -130,11 +130,28 @@ double* generateAttractor(char *seed) {
 			trajectoryIterate(trajectory, coeffs, 0, T_SEARCH);
 			if (checkPixelDensity(trajectory) && trajectoryIterate(positions, coeffs, T_IDX, T_RENDER)) {
 				printCoeffs(coeffs);
+				free(coeffs);
+				free(trajectory);
 				return positions;
 			}
 		}
 	}
 	trajectoryIterate(positions, coeffs, T_IDX, T_RENDER);
+	free(coeffs);
+	free(trajectory);
+	return positions;
+}
+
+double* attractorFromSeed(char *seed) {
+	double coeffs[60];
+	if (!coeffsFromSeed(coeffs, seed))
+		return NULL;
+
+	double *positions = malloc(3 * NUM_POSITIONS * sizeof(double));
+	if (positions == NULL || !trajectoryIterate(positions, coeffs, T_IDX, T_RENDER)) {
+		free(positions);
+		return NULL;
+	}
 	return positions;
 }
 
@@ -2,7 +2,9 @@
 #define ATTRACTOR_H
 
 #define T_SEARCH 2000
+#ifndef T_RENDER
 #define T_RENDER ((int)1e7)
+#endif
 #define T_IDX ((int)(T_RENDER/100))
 
 #define RADIUS 10
@@ -12,6 +14,8 @@
 #define NUM_POSITIONS (T_RENDER - T_IDX)
 
 double* generateAttractor(char *seed);
+double* attractorFromSeed(char *seed);
+int coeffsFromSeed(double *dest, char *seed);
 void printSlice(double *array, int start, int end, int stride);
 
 #endif
@@ -0,0 +1,194 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <stdint.h>
+#include <string.h>
+#include <errno.h>
+#include <time.h>
+#include <unistd.h>
+#include <pthread.h>
+#include <sys/stat.h>
+#include "render.h"
+#include "attractor.h"
+#include "transform.h"
+#include "image.h"
+
+/*
+ * Headless renderer: reads seeds (one per line, blank lines and lines starting
+ * with # ignored) from a file or stdin and renders each to OUTDIR/SEED.png or
+ * .ppm, several seeds at a time on a pool of threads. No X11 is needed.
+ *
+ *   ./batch [-o outdir] [-j threads] [-f png|ppm] [seedfile]
+ *
+ * Every thread holds one orbit of NUM_POSITIONS points (3 * 8 bytes each)
+ * while it renders, so memory grows with the thread count.
+ */
+
+struct batch {
+	char **seeds;
+	int count;
+	int next;
+	int failed;
+	const char *outdir;
+	const char *format;
+	pthread_mutex_t lock;
+};
+
+double seconds(void) {
+	struct timespec t;
+	clock_gettime(CLOCK_MONOTONIC, &t);
+	return t.tv_sec + t.tv_nsec * 1e-9;
+}
+
+void freeSeeds(char **seeds, int count) {
+	for (int i = 0; i < count; i++)
+		free(seeds[i]);
+	free(seeds);
+}
+
+/* the seeds read from f, or NULL if they could not be allocated */
+char **readSeeds(FILE *f, int *count) {
+	int size = 16;
+	char **seeds = malloc(size * sizeof(char *));
+	char line[256];
+
+	*count = 0;
+	if (seeds == NULL)
+		return NULL;
+	while (fgets(line, sizeof(line), f)) {
+		line[strcspn(line, " \t\r\n")] = '\0';
+		if (line[0] == '\0' || line[0] == '#')
+			continue;
+		if (*count == size) {
+			char **grown = realloc(seeds, 2 * size * sizeof(char *));
+			if (grown == NULL) {
+				freeSeeds(seeds, *count);
+				return NULL;
+			}
+			seeds = grown;
+			size *= 2;
+		}
+		if ((seeds[*count] = strdup(line)) == NULL) {
+			freeSeeds(seeds, *count);
+			return NULL;
+		}
+		(*count)++;
+	}
+	return seeds;
+}
+
+int renderSeed(struct batch *b, char *seed) {
+	char path[4096];
+	snprintf(path, sizeof(path), "%s/%s.%s", b->outdir, seed, b->format);
+
+	double start = seconds();
+	double *positions = attractorFromSeed(seed);
+	if (positions == NULL)
+		return 0;
+
+	uint8_t *data = malloc(XRES * YRES * 4);
+	if (data == NULL) {
+		free(positions);
+		pthread_mutex_lock(&b->lock);
+		fprintf(stderr, "Error: Could not allocate the image of %s\n", seed);
+		pthread_mutex_unlock(&b->lock);
+		return 0;
+	}
+	positionsToBGRAInPlace(data, positions);
+	free(positions);
+
+	int saved = strcmp(b->format, "ppm") == 0 ? writePPM(path, data, XRES, YRES) : writePNG(path, data, XRES, YRES);
+	free(data);
+
+	pthread_mutex_lock(&b->lock);
+	if (saved)
+		printf("Saved %s | %.2f sec\n", path, seconds() - start);
+	else
+		fprintf(stderr, "Error: Could not write %s\n", path);
+	fflush(stdout);
+	pthread_mutex_unlock(&b->lock);
+	return saved;
+}
+
+void *worker(void *arg) {
+	struct batch *b = arg;
+
+	while (1) {
+		pthread_mutex_lock(&b->lock);
+		int i = b->next++;
+		pthread_mutex_unlock(&b->lock);
+		if (i >= b->count)
+			return NULL;
+
+		if (!renderSeed(b, b->seeds[i])) {
+			pthread_mutex_lock(&b->lock);
+			fprintf(stderr, "Error: Could not render %s\n", b->seeds[i]);
+			b->failed++;
+			pthread_mutex_unlock(&b->lock);
+		}
+	}
+}
+
+int main(int argc, char **argv) {
+	struct batch b = {.outdir = ".", .format = "png"};
+	int nthreads = sysconf(_SC_NPROCESSORS_ONLN);
+	int opt;
+
+	while ((opt = getopt(argc, argv, "o:j:f:")) != -1) {
+		switch (opt) {
+			case 'o': b.outdir = optarg; break;
+			case 'j': nthreads = atoi(optarg); break;
+			case 'f': b.format = optarg; break;
+			default:
+				fprintf(stderr, "Usage: %s [-o outdir] [-j threads] [-f png|ppm] [seedfile]\n", argv[0]);
+				return 2;
+		}
+	}
+	if (strcmp(b.format, "png") != 0 && strcmp(b.format, "ppm") != 0) {
+		fprintf(stderr, "Error: Unknown format %s, expected png or ppm\n", b.format);
+		return 2;
+	}
+
+	FILE *f = stdin;
+	if (optind < argc && strcmp(argv[optind], "-") != 0) {
+		f = fopen(argv[optind], "r");
+		if (f == NULL) {
+			perror(argv[optind]);
+			return 1;
+		}
+	}
+	b.seeds = readSeeds(f, &b.count);
+	if (f != stdin)
+		fclose(f);
+	if (b.seeds == NULL) {
+		fprintf(stderr, "Error: Could not allocate the seeds\n");
+		return 1;
+	}
+
+	if (mkdir(b.outdir, 0777) != 0 && errno != EEXIST) {
+		perror(b.outdir);
+		freeSeeds(b.seeds, b.count);
+		return 1;
+	}
+	if (nthreads < 1)
+		nthreads = 1;
+	if (nthreads > b.count)
+		nthreads = b.count;
+
+	pthread_t *threads = malloc(nthreads * sizeof(pthread_t));
+	if (threads == NULL) {
+		fprintf(stderr, "Error: Could not allocate %d threads\n", nthreads);
+		freeSeeds(b.seeds, b.count);
+		return 1;
+	}
+
+	pthread_mutex_init(&b.lock, NULL);
+	for (int t = 0; t < nthreads; t++)
+		pthread_create(&threads[t], NULL, worker, &b);
+	for (int t = 0; t < nthreads; t++)
+		pthread_join(threads[t], NULL);
+	pthread_mutex_destroy(&b.lock);
+
+	freeSeeds(b.seeds, b.count);
+	free(threads);
+	return b.failed > 0;
+}
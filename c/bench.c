@@ -0,0 +1,35 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <stdint.h>
+#include <time.h>
+#include "render.h"
+#include "attractor.h"
+#include "transform.h"
+
+/* headless timing of render.c's pipeline, printed as one line of JSON.
+ * T_RENDER, XRES and YRES can be set at compile time, e.g. -DT_RENDER=1000000 */
+
+double seconds(void) {
+	struct timespec t;
+	clock_gettime(CLOCK_MONOTONIC, &t);
+	return t.tv_sec + t.tv_nsec * 1e-9;
+}
+
+int main(int argc, char **argv) {
+	char *seed = argc > 1 ? argv[1] : "PIIGEDYLHLKWHQXFCUPHPRNGSBIYBYSTKDAOGCCONONUGMDKJSRBMFJFJSGK";
+	uint8_t *data = malloc(XRES * YRES * 4);
+
+	double start = seconds();
+	double *attractor = generateAttractor(seed);
+	double iterated = seconds();
+	positionsToBGRA(data, attractor);
+	double end = seconds();
+
+	printf("{\"seed\": \"%s\", \"iterations\": %d, \"points\": %d, \"xres\": %d, \"yres\": %d, "
+			"\"iterate_seconds\": %.6f, \"scatter_seconds\": %.6f, \"seconds\": %.6f}\n",
+			seed, T_RENDER, NUM_POSITIONS, XRES, YRES, iterated - start, end - iterated, end - start);
+
+	free(attractor);
+	free(data);
+	return 0;
+}
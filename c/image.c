@@ -0,0 +1,107 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <stdint.h>
+#include "image.h"
+
+/*
+ * Image files from the BGRA buffers of positionsToBGRA, without any library.
+ * PNGs hold their pixels in stored (uncompressed) deflate blocks, so they are
+ * as large as the raw RGB data but any viewer reads them.
+ */
+
+int writePPM(const char *path, uint8_t *bgra, int width, int height) {
+	FILE *f = fopen(path, "wb");
+	if (f == NULL)
+		return 0;
+
+	fprintf(f, "P6\n%d %d\n255\n", width, height);
+	uint8_t *row = malloc(3 * width);
+	for (int y = 0; y < height; y++) {
+		for (int x = 0; x < width; x++) {
+			uint8_t *p = bgra + 4 * (width * y + x);
+			row[3 * x + 0] = p[2];
+			row[3 * x + 1] = p[1];
+			row[3 * x + 2] = p[0];
+		}
+		fwrite(row, 1, 3 * width, f);
+	}
+	free(row);
+	return fclose(f) == 0;
+}
+
+/* bitwise CRC-32, which needs no shared table and so is safe to run in several threads */
+static uint32_t crc(uint32_t c, const uint8_t *data, size_t len) {
+	for (size_t i = 0; i < len; i++) {
+		c ^= data[i];
+		for (int k = 0; k < 8; k++)
+			c = c & 1 ? 0xedb88320u ^ (c >> 1) : c >> 1;
+	}
+	return c;
+}
+
+static void put32(uint8_t *dest, uint32_t v) {
+	dest[0] = v >> 24, dest[1] = v >> 16, dest[2] = v >> 8, dest[3] = v;
+}
+
+/* a chunk's length, type, data and CRC */
+static void writeChunk(FILE *f, const char *type, const uint8_t *data, size_t len) {
+	uint8_t word[4];
+	put32(word, len);
+	fwrite(word, 1, 4, f);
+	fwrite(type, 1, 4, f);
+	fwrite(data, 1, len, f);
+	put32(word, crc(crc(0xffffffffu, (const uint8_t *)type, 4), data, len) ^ 0xffffffffu);
+	fwrite(word, 1, 4, f);
+}
+
+int writePNG(const char *path, uint8_t *bgra, int width, int height) {
+	static const uint8_t signature[8] = {137, 'P', 'N', 'G', '\r', '\n', 26, '\n'};
+	FILE *f = fopen(path, "wb");
+	if (f == NULL)
+		return 0;
+
+	/* 8 bit RGB, no interlacing */
+	uint8_t header[13] = {0};
+	put32(header, width);
+	put32(header + 4, height);
+	header[8] = 8, header[9] = 2;
+
+	/* every row is a filter byte (none) followed by its pixels */
+	size_t stride = 3 * (size_t)width + 1;
+	size_t raw = stride * height;
+	size_t blocks = (raw + 65534) / 65535;
+	uint8_t *idat = malloc(2 + raw + 5 * blocks + 4);
+	uint8_t *out = idat;
+	uint32_t a = 1, b = 0;
+
+	*out++ = 0x78, *out++ = 0x01;
+	size_t left = 0, block = 0;
+	for (int y = 0; y < height; y++) {
+		for (size_t i = 0; i < stride; i++) {
+			if (left == 0) {
+				left = raw - 65535 * block < 65535 ? raw - 65535 * block : 65535;
+				*out++ = ++block == blocks;
+				*out++ = left, *out++ = left >> 8;
+				*out++ = ~left, *out++ = ~left >> 8;
+			}
+			uint8_t v = 0;
+			if (i > 0) {
+				int x = (i - 1) / 3;
+				v = bgra[4 * ((size_t)width * y + x) + 2 - (i - 1) % 3];
+			}
+			*out++ = v;
+			a = (a + v) % 65521;
+			b = (b + a) % 65521;
+			left--;
+		}
+	}
+	put32(out, b << 16 | a);
+	out += 4;
+
+	fwrite(signature, 1, 8, f);
+	writeChunk(f, "IHDR", header, 13);
+	writeChunk(f, "IDAT", idat, out - idat);
+	writeChunk(f, "IEND", NULL, 0);
+	free(idat);
+	return fclose(f) == 0;
+}
@@ -0,0 +1,8 @@
+#ifndef IMAGE_H
+#define IMAGE_H
+#include <stdint.h>
+
+int writePPM(const char *path, uint8_t *bgra, int width, int height);
+int writePNG(const char *path, uint8_t *bgra, int width, int height);
+
+#endif
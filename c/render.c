@@ -92,7 +92,8 @@ int main(int argc,char **argv) {
 	char seed3[] = "KLYCUAVJBAQBNUDRICOHHKPVIHIBSPIDDHHBJFKLFEOVBTPJWGSGRKCARNBM";
 	char seed4[] = "PIIGEDYLHLKWHQXFCUPHPRNGSBIYBYSTKDAOGCCONONUGMDKJSRBMFJFJSGK";
 
-	double *attractor = generateAttractor(seed4);
+	// a seed given on the command line replaces seed4 (see batch.c for rendering without X11)
+	double *attractor = generateAttractor(argc > 1 ? argv[1] : seed4);
 
 	printf("Attractor constructed\n");
 	positionsToBGRA(img->data, attractor);
@@ -6,8 +6,12 @@
 
 #define SHRINK_RATIO 19 / 20
 
+#ifndef XRES
 #define XRES (MIN(WIDTH, HEIGHT) * SHRINK_RATIO)
+#endif
+#ifndef YRES
 #define YRES (MIN(WIDTH, HEIGHT) * SHRINK_RATIO)
+#endif
 
 #define WIDTH 1800
 #define HEIGHT 900
@@ -3,6 +3,7 @@
 #include <stdint.h>
 
 void positionsToBGRA(uint8_t *dest, double *positions);
+void positionsToBGRAInPlace(uint8_t *dest, double *positions);
 int checkPixelDensity(double* positions);
 
 #endif
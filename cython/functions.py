@@ -1,70 +1,47 @@
 import numpy as np 
+import sys
+import os
 
-def get_minmax_rng(data):
-	max_val = data.max()
-	min_val = data.min()
-	data_range = max_val - min_val
-
-	return min_val, data_range
+# bounds and depth alpha are shared with the scripts in py/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+import geometry
+from geometry import get_minmax_rng, zalpha
 
 def get_dx(xdata):
 	print('Calculating differences')
 	dx = abs(xdata - np.roll(xdata, 1))[1:]
 	return dx
 
-def zalpha(z, zmin, zrng, a_min=0):
-	""" return alpha based on z depth """
-	alpha = a_min + (1-a_min)*(z-zmin)/zrng
-	return alpha
-
 def get_index(x, xmin, xrng, xres):
 	""" map coordinate to array index """
 	return int((x-xmin)/xrng * (xres-1))
 
 def set_aspect(xdata, ydata, width, height, debug=False, margin=1.1):
-	""" get boundaries for given aspect ratio w/h """
+	""" get boundaries for given aspect ratio w/h, followed by the ranges of the data """
 	xmin, xrng = get_minmax_rng(xdata) 
 	ymin, yrng = get_minmax_rng(ydata)
 
-	xdata_rng = xrng 
-	ydata_rng = yrng 
-
-	if debug:
-		print('Data range | X: {:.2f} | Y: {:.2f} | Intrinsic aspect ratio: {:.2f}'.format(xrng, yrng, xrng/yrng))
-	
-	xmid = xmin + xrng/2
-	ymid = ymin + yrng/2
-
-	if xrng/yrng < width/height:
-		xrng = width/height * yrng
-	else:
-		yrng = height/width * xrng
-
-	xrng *= margin
-	yrng *= margin
+	return fit_aspect(xmin, xrng, ymin, yrng, width, height, debug, margin)
 
-	xmin = xmid - xrng/2.
-	ymin = ymid - yrng/2
-	if debug:
-		print('Rescaled data range | X: {:.2f} | Y: {:.2f} | New aspect ratio: {:.2f}'.format(xrng, yrng, xrng/yrng))
-
-	return xmin, ymin, xrng, yrng, xdata_rng, ydata_rng
+def fit_aspect(xmin, xrng, ymin, yrng, width, height, debug=False, margin=1.1):
+	""" set_aspect from the minimum and range of the data """
+	return geometry.fit_aspect(xmin, xrng, ymin, yrng, width, height, debug, margin) + (xrng, yrng)
 
 def pixel_density(xl, yl, xres=320, yres=180):
 	""" check for density of points in image """
 
 	xmin, ymin, xrng, yrng, xdr, ydr = set_aspect(xl, yl, xres, yres)
-	render = np.zeros((yres, xres))
 
-	try:
-		for x, y in zip(xl, yl):
-			J = get_index(x, xmin, xrng, xres)
-			I = get_index(y, ymin, yrng, yres)
-			render[I, J] += 1
-	except ValueError:
+	if not (np.isfinite(xrng) and np.isfinite(yrng) and xdr > 0 and ydr > 0):
 		print('Invalid value')
 		return False
 
+	J = ((xl-xmin)/xrng * (xres-1)).astype(int)
+	I = ((yl-ymin)/yrng * (yres-1)).astype(int)
+
+	render = np.zeros((yres, xres))
+	render.flat[I * xres + J] = 1
+
 	return check_density(render)
 	
 def check_density(render, min_fill=2.0):
@@ -1,62 +1,185 @@
 import numpy as np 
+from libc.math cimport isfinite, log, sqrt
+from libc.stdlib cimport calloc, free
 
-# cimport numpy as np
-# cimport cython
+cimport cython
 
-# @cython.boundscheck(False)
-# @cython.wraparound(False)
+cdef inline int n_monomials(int dimension) nogil:
+	return (dimension + 1) * (dimension + 2) * (dimension + 3) // 6
 
-def iteration_cubic_8d(int n_iterations, double[:] coeffs, int dimension):
+cdef void step_cubic(double *coeffs, double *coords, double *mono, int dimension) nogil:
+	""" advance coords (coords[0] == 1) by one iteration of the cubic map
 
-	cdef double fsum = 0
+	coeffs holds, for every output, one weight per unique monomial
+	coords[i] * coords[j] * coords[k] with i <= j <= k. The monomials are
+	built once per step into mono from a running pair product, instead of
+	being recomputed for every output
+	"""
 
-	cdef int t 
-	cdef int m 
-	cdef int n 
-	cdef int i
-	cdef int j 
-	cdef int k 
+	cdef int m, i, j, k, n
+	cdef int nm = n_monomials(dimension)
+	cdef double cij, fsum
 
-	cdef double[:] coords = np.zeros(dimension + 1)
-	cdef double[:] sums = np.zeros(dimension)
-	cdef double[:,:] itdata = np.zeros((n_iterations, dimension))
+	n = 0
+	for i in range(dimension + 1):
+		for j in range(i, dimension + 1):
+			cij = coords[i] * coords[j]
+			for k in range(j, dimension + 1):
+				mono[n] = cij * coords[k]
+				n += 1
 
-	# cdef np.ndarray[np.float64_t,ndim=1] coords 
-	# coords = np.zeros(dimension + 1, dtype=np.float64)
+	for m in range(dimension):
 
-	# cdef np.ndarray[np.float64_t,ndim=1] sums
-	# sums = np.zeros(dimension, dtype=np.float64)
+		fsum = 0
 
-	# cdef np.ndarray[np.float64_t,ndim=2] itdata
-	# itdata = np.zeros((n_iterations,dimension), dtype=np.float64)
+		for n in range(nm):
+			fsum = fsum + coeffs[m * nm + n] * mono[n]
 
-	coords[0] = 1
+		coords[m + 1] = fsum
 
-	for t in range(n_iterations):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def iteration_cubic_8d(int n_iterations, double[::1] coeffs, int dimension):
 
-		n = 0
-
-		for m in range(dimension):
-
-			fsum = 0
+	cdef int t 
+	cdef int m 
 
-			for i in range(dimension + 1):
-				for j in range(i, dimension + 1):
-					for k in range(j, dimension + 1):
+	cdef double[::1] coords = np.zeros(dimension + 1)
+	cdef double[::1] mono = np.zeros(n_monomials(dimension))
+	cdef double[:,:] itdata = np.zeros((n_iterations, dimension))
 
-						fsum = fsum + coeffs[n] * coords[i] * coords[j] * coords[k]
+	coords[0] = 1
 
-						n += 1
+	with nogil:
+		for t in range(n_iterations):
 
-			sums[m] = fsum
+			step_cubic(&coeffs[0], &coords[0], &mono[0], dimension)
 
-		coords[1:] = sums
-		itdata[t,:] = coords[1:]
+			for m in range(dimension):
+				itdata[t, m] = coords[m + 1]
 
 	return itdata
 
+def density_cubic_8d(int n_iterations, double[::1] coeffs, int dimension,
+	int xres=320, int yres=180, double min_fill=2.0):
+	""" fill percentage of the first two coordinates on an xres x yres grid
+
+	returns -1 if the orbit overflows. Bounds are taken from the whole run,
+	then the orbit is re-iterated into an occupancy bitmap which stops as
+	soon as min_fill is exceeded or can no longer be reached, in which case
+	the returned value is the partial fill
+	"""
+
+	cdef double[::1] coords = np.zeros(dimension + 1)
+	cdef double[::1] mono = np.zeros(n_monomials(dimension))
+	cdef double xmin = 0, xmax = 0, ymin = 0, ymax = 0
+	cdef double xrng, yrng, xmid, ymid
+	cdef int t, I, J, pos
+	cdef int size = xres * yres
+	cdef int needed = <int>(min_fill / 100 * size) + 1
+	cdef int filled = 0
+	cdef unsigned char *bitmap
 
+	coords[0] = 1
 
+	for t in range(n_iterations):
+		step_cubic(&coeffs[0], &coords[0], &mono[0], dimension)
+		if not isfinite(coords[1] + coords[2] + coords[dimension]):
+			return -1
+
+		if t == 0:
+			xmin = xmax = coords[1]
+			ymin = ymax = coords[2]
+		else:
+			xmin = min(xmin, coords[1])
+			xmax = max(xmax, coords[1])
+			ymin = min(ymin, coords[2])
+			ymax = max(ymax, coords[2])
+
+	xrng = xmax - xmin
+	yrng = ymax - ymin
+	if not (xrng > 0 and yrng > 0):
+		return 0
+
+	# same aspect correction and margin as set_aspect
+	xmid = xmin + xrng/2
+	ymid = ymin + yrng/2
+	if xrng/yrng < <double>xres/yres:
+		xrng = <double>xres/yres * yrng
+	else:
+		yrng = <double>yres/xres * xrng
+	xrng *= 1.1
+	yrng *= 1.1
+	xmin = xmid - xrng/2
+	ymin = ymid - yrng/2
+
+	bitmap = <unsigned char *>calloc(size, 1)
+	coords[:] = 0
+	coords[0] = 1
 
-
-
+	for t in range(n_iterations):
+		step_cubic(&coeffs[0], &coords[0], &mono[0], dimension)
+
+		J = <int>((coords[1]-xmin)/xrng * (xres-1))
+		I = <int>((coords[2]-ymin)/yrng * (yres-1))
+		pos = xres * I + J
+		if not bitmap[pos]:
+			bitmap[pos] = 1
+			filled += 1
+
+		if filled >= needed or filled + (n_iterations - t - 1) < needed:
+			break
+
+	free(bitmap)
+	return 100.0 * filled / size
+
+def lyapunov_cubic_8d(int n_iterations, double[:, ::1] coeffs, int dimension, int transient=0):
+	""" largest Lyapunov exponent (bits/iteration) of every row of coeffs
+
+	Sprott's method: a second orbit is kept at distance d0 from the first,
+	the log of its growth is summed after the transient and it is pulled back
+	to distance d0 after every step. Orbits that overflow get -inf
+	"""
+
+	cdef int n_candidates = coeffs.shape[0]
+	cdef double[:] exponents = np.full(n_candidates, -np.inf)
+	cdef double[::1] coords = np.zeros(dimension + 1)
+	cdef double[::1] ecoords = np.zeros(dimension + 1)
+	cdef double[::1] mono = np.zeros(n_monomials(dimension))
+	cdef double d0 = 1e-8
+	cdef double d, dm, lsum
+	cdef int c, t, m
+
+	for c in range(n_candidates):
+
+		coords[:] = 0
+		ecoords[:] = 0
+		coords[0] = 1
+		ecoords[0] = 1
+		ecoords[1] = d0
+		lsum = 0
+
+		for t in range(n_iterations):
+			step_cubic(&coeffs[c, 0], &coords[0], &mono[0], dimension)
+			step_cubic(&coeffs[c, 0], &ecoords[0], &mono[0], dimension)
+
+			d = 0
+			for m in range(1, dimension + 1):
+				dm = ecoords[m] - coords[m]
+				d += dm * dm
+			d = sqrt(d)
+
+			if not isfinite(d) or d == 0:
+				break
+
+			if t >= transient:
+				lsum += log(d / d0)
+
+			for m in range(1, dimension + 1):
+				ecoords[m] = coords[m] + d0 * (ecoords[m] - coords[m]) / d
+
+		else:
+			if n_iterations > transient:
+				exponents[c] = 1.4426950408889634 * lsum / (n_iterations - transient)
+
+	return np.asarray(exponents)
@@ -1,12 +1,21 @@
 import numpy as np 
+import matplotlib.pyplot as plt
+import itertools
+import contextlib
 import time 
+import sys
+import os
 
-from search import search_attractors
+# trajectory stores are shared with the scripts in py/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'py'))
+from trajectory import TrajectoryWriter, open_trajectory
+from tonemap import tone_map, cache_path, save_accumulation, load_accumulation
+
+from search import search_stream
 from compute import compute_attractors
 
 # these should be compiled first (see setup files)
-from render_v1 import render_attractors as render1
-from render_v2 import render_attractors as render2
+from render_v1 import accumulate_attractor, accumulate_store
 
 
 # iterations used in search 
@@ -22,41 +31,133 @@ render_check_ratio = 0.01
 # number of attractors to find and render
 n_attractors = 2
 
-# alpha value of the pixels (adjust to render_iterates)
-# too low may result in overly dark images
-# too high may result in over-saturated images
-# it is useful to render 1 or 2 attractors and adjust based on results
-# can also set manually in render functions below
-alpha = 0.01 * 50000000/render_iterates
-
-for i in range(n_attractors):
+# worker processes used during search (None uses all cores)
+search_workers = None
 
-	start = time.time()
+# base of the counter-based candidate seeds (None picks one at random)
+# a hit printed as seed 'B-N' is candidate N of base seed B
+base_seed = None
 
-	# dimension of attractor (takes very long to find anything if > 10)
-	dimension = 3
+# smallest Lyapunov exponent (bits/iteration) accepted during search
+# rejects limit cycles and quasi-periodic orbits before rendering
+lyapunov_min = 0.005
 
-	coeffs, seed = search_attractors(search_iterates, dimension)
-	itdata, error = compute_attractors(coeffs, render_iterates, render_check_ratio, dimension)
+# write the iteration data of every attractor to a trajectory store
+# (see py/trajectory.py) and render from it, so it can be rendered again later
+save_trajectories = False
 
-	# optional save of iteration data (for later processing)
-	# np.save(f'd_{dimension}_{seed}_arr', itdata)
+# trajectory stores to render again instead of searching
+# e.g. ['render/D3-123-45.traj']
+trajectory_files = []
 
-	if not error:
+# dimension of attractor (takes very long to find anything if > 10)
+dimension = 3
 
-		render1(
-			itdata[10000:, dimension - 3], 
-			itdata[10000:, dimension - 2], 
-			itdata[10000:, dimension - 1], 
-			coeffs, dimension, seed, 'xyz-v1', alpha = 0.0065)
-		
-		render2(
-			itdata[10000:, dimension - 3], 
-			itdata[10000:, dimension - 2], 
-			itdata[10000:, dimension - 1], 
-			coeffs, dimension, seed, 'xyz-v2', alpha = alpha)
-
-	print(f'Total time: {time.time()-start:.2f} seconds')
+# alpha value of the pixels (adjust to render_iterates)
+# too low may result in overly dark images
+# too high may result in over-saturated images
+# it is useful to render 1 or 2 attractors and adjust based on results
+# can also set manually in tone_maps below
+alpha = 0.01 * 50000000/render_iterates
 
+# images saved for every attractor as (tag, alpha, tone map), see py/tonemap.py
+# 'clip' is render_v1 and 'feedback' approximates render_v2 in closed form
+# pixels are accumulated once for all of them
+tone_maps = [('xyz-v1', 0.0065, 'clip'), ('xyz-v2', alpha, 'feedback')]
+gamma = 1.0
+
+# directory to cache the accumulated pixels in, e.g. 'accumulations' (None disables the cache)
+# with a fixed base_seed alpha and tone maps can then be changed and rerun
+# without iterating or scattering again
+accumulation_cache = None
+
+# image resolution
+xres, yres = 3200, 1800
+
+# also render 'xyz-v2' with render_v2, which damps every point by its pixel
+# as it is added, instead of the closed form of the 'feedback' tone map
+# (needs renderer_v2 built, see setup_renderer_v2.py); it iterates and
+# scatters the points again even when the accumulation is cached
+exact_v2 = False
+
+if exact_v2:
+	from render_v2 import render_attractors as render2, render_store as render2_store
+
+def save_tone_maps(raw, seed):
+	for tag, tag_alpha, mode in tone_maps:
+		# render_v2 writes the exact image under the same tag
+		if exact_v2 and mode == 'feedback':
+			continue
+		fname = f'render/D{dimension}-{seed}-{tag}.png'
+		plt.imsave(fname, tone_map(raw, tag_alpha, mode, gamma), dpi=300)
+		print('Saved ' + fname)
+
+def raw_cache_path(seed, iterations, transient):
+	return cache_path(seed, iterations, 'xyz', xres, yres, {'transient': transient}, accumulation_cache)
+
+start = time.time()
+
+for path in trajectory_files:
+	store = open_trajectory(path)
+	raw_path = raw_cache_path(f'D{store.dimension}-{store.seed}', store.transient + len(store), store.transient)
+	raw = load_accumulation(raw_path)
+	if raw is None:
+		raw = accumulate_store(store, xres, yres)
+		save_accumulation(raw_path, raw)
+	save_tone_maps(raw, store.seed)
+	if exact_v2:
+		render2_store(store, 'xyz-v2', alpha = alpha, xres = xres, yres = yres)
+
+if trajectory_files:
+	sys.exit()
+
+# closing the stream shuts down its process pool once enough attractors are found
+with contextlib.closing(search_stream(search_iterates, dimension, search_workers, base_seed, lyapunov_min)) as found:
+
+	for coeffs, seed in itertools.islice(found, n_attractors):
+
+		raw_path = raw_cache_path(f'D{dimension}-{seed}', render_iterates, 10000)
+		raw = load_accumulation(raw_path)
+
+		if raw is None or exact_v2:
+
+			itdata, error = compute_attractors(coeffs, render_iterates, render_check_ratio, dimension)
+
+			if error:
+				start = time.time()
+				continue
+
+			if save_trajectories:
+
+				# the store keeps the points on disk, so itdata can be released before rendering
+				path = f'render/D{dimension}-{seed}.traj'
+				with TrajectoryWriter(path, coeffs, dimension, seed, transient = 10000) as writer:
+					writer.append(itdata[10000:])
+				del itdata
+				print('Saved ' + path)
+
+				store = open_trajectory(path)
+				if raw is None:
+					raw = accumulate_store(store, xres, yres)
+					save_accumulation(raw_path, raw)
+				if exact_v2:
+					render2_store(store, 'xyz-v2', alpha = alpha, xres = xres, yres = yres)
+
+			else:
+
+				xyz = (itdata[10000:, dimension - 3], 
+					itdata[10000:, dimension - 2], 
+					itdata[10000:, dimension - 1])
+
+				if raw is None:
+					raw = accumulate_attractor(*xyz, xres, yres)
+					save_accumulation(raw_path, raw)
+				if exact_v2:
+					render2(*xyz, coeffs, dimension, seed, 'xyz-v2', alpha = alpha, xres = xres, yres = yres)
+
+		save_tone_maps(raw, seed)
+
+		print(f'Total time: {time.time()-start:.2f} seconds')
+		start = time.time()
 
 # add main function here -- 
\ No newline at end of file
@@ -1,7 +1,7 @@
 import numpy as np 
 import matplotlib.pyplot as plt
 from functions import *
-from renderer_v1 import render_pixels
+from renderer_v1 import render_pixels_parallel
 import time 
 
 def render_attractors(xl, yl, zl, coeff, dimension, seed, tag, alpha = 0.0075, xres = 3200, yres = 1800):
@@ -24,7 +24,7 @@ def render_attractors(xl, yl, zl, coeff, dimension, seed, tag, alpha = 0.0075, x
 		dzs = get_dx(zl)
 
 		print(f'Calculated difference arrays {time.time()-start:.1f} seconds')
-		render = np.asarray(render_pixels(xres, yres, 
+		render = np.asarray(render_pixels_parallel(xres, yres, 
 			xa[1:], ya[1:], za[1:],
 			dxs, dys, dzs, 
 			xrng, xmin, yrng, ymin, zrng, zmin,
@@ -41,3 +41,67 @@ def render_attractors(xl, yl, zl, coeff, dimension, seed, tag, alpha = 0.0075, x
 		plt.imsave(fname, render, dpi=300)
 		print('Saved ' + fname)
 		print(f'{time.time()-start:.1f} seconds')
+
+def accumulate_points(xa, ya, za, bounds, out):
+	""" add points to a raw buffer (yres x xres x 4): colour sums with alpha = 1, then counts """
+
+	xmin, ymin, xrng, yrng, xdr, ydr, zmin, zrng = bounds
+	yres, xres, _ = out.shape
+
+	render_pixels_parallel(xres, yres,
+		xa[1:], ya[1:], za[1:],
+		np.abs(np.diff(xa)), np.abs(np.diff(ya)), np.abs(np.diff(za)),
+		xrng, xmin, yrng, ymin, zrng, zmin,
+		xdr, ydr, 1.0, out=out[:, :, :3])
+
+	J = ((xa[1:]-xmin)/xrng * (xres-1)).astype(int)
+	I = ((ya[1:]-ymin)/yrng * (yres-1)).astype(int)
+	out[:, :, 3] += np.bincount(I * xres + J, minlength=xres * yres).reshape(yres, xres)
+
+def accumulate_attractor(xl, yl, zl, xres = 3200, yres = 1800):
+	""" raw buffer of an orbit held in memory, for tone mapping (see py/tonemap.py) """
+
+	xa = np.ascontiguousarray(xl)
+	ya = np.ascontiguousarray(yl)
+	za = np.ascontiguousarray(zl)
+
+	xmin, ymin, xrng, yrng, xdr, ydr = set_aspect(xa, ya, xres, yres, debug=True)
+	zmin, zrng = get_minmax_rng(za)
+
+	raw = np.zeros((yres, xres, 4))
+	if not np.isnan(xrng):
+		accumulate_points(xa, ya, za, (xmin, ymin, xrng, yrng, xdr, ydr, zmin, zrng), raw)
+	return raw
+
+def accumulate_store(store, xres = 3200, yres = 1800, chunk = 10000000):
+	""" raw buffer of a trajectory store, reading chunk points at a time """
+
+	d = store.dimension
+	lo, hi = store.min[d-3:], store.max[d-3:]
+
+	xmin, ymin, xrng, yrng, xdr, ydr = fit_aspect(lo[0], hi[0] - lo[0], lo[1], hi[1] - lo[1],
+		xres, yres, debug=True)
+	bounds = (xmin, ymin, xrng, yrng, xdr, ydr, lo[2], hi[2] - lo[2])
+
+	raw = np.zeros((yres, xres, 4))
+	if not np.isnan(xrng):
+		# chunks overlap by one point so every difference is counted once
+		for points in store.chunks(chunk, overlap=1):
+			xa, ya, za = (np.ascontiguousarray(points[:, k]) for k in range(d-3, d))
+			accumulate_points(xa, ya, za, bounds, raw)
+	return raw
+
+def render_store(store, tag, alpha = 0.0075, xres = 3200, yres = 1800, chunk = 10000000):
+	""" render_attractors from a trajectory store, reading chunk points at a time """
+
+	start = time.time()
+	print('Calculating pixel values')
+	render = alpha * accumulate_store(store, xres, yres, chunk)[:, :, :3]
+	print(f'Calculated pixel values {time.time()-start:.1f} seconds')
+
+	np.clip(render, None, 1, out=render)
+
+	fname = f'render/D{store.dimension}-{store.seed}-{tag}.png'
+	plt.imsave(fname, render, dpi=300)
+	print('Saved ' + fname)
+	print(f'{time.time()-start:.1f} seconds')
@@ -38,3 +38,41 @@ def render_attractors(xl, yl, zl, coeff, dimension, seed, tag, alpha = 0.0075, x
 		plt.imsave(fname, render, dpi=300)
 		print('Saved ' + fname)
 		print(f'{time.time()-start:.1f} seconds')
+
+def render_store(store, tag, alpha = 0.0075, xres = 3200, yres = 1800, chunk = 10000000):
+	""" render_attractors from a trajectory store, reading chunk points at a time """
+
+	d = store.dimension
+	lo, hi = store.min[d-3:], store.max[d-3:]
+
+	xmin, ymin, xrng, yrng, xdr, ydr = fit_aspect(lo[0], hi[0] - lo[0], lo[1], hi[1] - lo[1],
+		xres, yres, debug=True)
+	zmin, zrng = lo[2], hi[2] - lo[2]
+
+	if not np.isnan(xrng):
+
+		print('Calculating pixel values')
+		start = time.time()
+
+		render = np.zeros((yres, xres, 3))
+
+		# chunks overlap by one point so every difference is counted once
+		for points in store.chunks(chunk, overlap=1):
+			xa, ya, za = (np.ascontiguousarray(points[:, k]) for k in range(d-3, d))
+			render_pixels(xres, yres,
+				xa[1:], ya[1:], za[1:],
+				np.abs(np.diff(xa)), np.abs(np.diff(ya)), np.abs(np.diff(za)),
+				xrng, xmin, yrng, ymin, zrng, zmin,
+				alpha, out=render, steps=store.steps[d-3:])
+
+		print(f'Calculated pixel values {time.time()-start:.1f} seconds')
+
+		for k in range(3):
+			render[:,:,k] = np.interp(render[:,:,k], (render[:,:,k].min(), render[:,:,k].max()), (0, 1))
+
+		print(f'Interpolated color range {time.time()-start:.1f} seconds')
+
+		fname = f'render/D{d}-{store.seed}-{tag}.png'
+		plt.imsave(fname, render, dpi=300)
+		print('Saved ' + fname)
+		print(f'{time.time()-start:.1f} seconds')
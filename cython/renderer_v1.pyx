@@ -1,4 +1,6 @@
 import numpy as np 
+from cython.parallel import prange
+cimport openmp
 
 def render_pixels(int xres, int yres, 
 	double[:] xa, double[:] ya, double[:] za, 
@@ -32,4 +34,45 @@ def render_pixels(int xres, int yres,
 		render[I, J, 1] += (1-dy/mdy) * alpha * z_alpha
 		render[I, J, 2] += (1-dz/mdz) * alpha * z_alpha
 
-	return render
\ No newline at end of file
+	return render
+
+def render_pixels_parallel(int xres, int yres, 
+	double[:] xa, double[:] ya, double[:] za, 
+	double[:] dxs, double[:] dys, double[:] dzs,
+	double xrng, double xmin, double yrng, double ymin, 
+	double zrng, double zmin, double mdx, double mdy, 
+	double alpha, int n_threads=0, out=None):
+	"""
+	same as render_pixels, split into bands of image rows with one band per
+	thread. Each thread scans every point but only writes its own rows, so
+	no buffers are shared and the result is bit-identical to render_pixels.
+	Points are added to out if given, so a long orbit can be rendered in chunks
+	"""
+
+	cdef double[:,:,:] render = np.zeros((yres, xres, 3)) if out is None else out
+	cdef int length = np.size(xa)
+	cdef int n_bands = n_threads if n_threads > 0 else openmp.omp_get_max_threads()
+	cdef int band, row0, row1, i, I, J
+	cdef double z_alpha
+	cdef double mdz = zrng
+
+	for band in prange(n_bands, nogil=True, num_threads=n_bands, schedule='static', chunksize=1):
+
+		row0 = yres * band // n_bands
+		row1 = yres * (band + 1) // n_bands
+
+		for i in range(length):
+
+			I = <int>((ya[i]-ymin)/yrng * (yres-1))
+			if I < row0 or I >= row1:
+				continue
+
+			J = <int>((xa[i]-xmin)/xrng * (xres-1))
+
+			z_alpha = 0.25 + 0.75 * (za[i]-zmin)/zrng
+
+			render[I, J, 0] += (1-dxs[i]/mdx) * alpha * z_alpha
+			render[I, J, 1] += (1-dys[i]/mdy) * alpha * z_alpha
+			render[I, J, 2] += (1-dzs[i]/mdz) * alpha * z_alpha
+
+	return render
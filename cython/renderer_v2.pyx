@@ -9,16 +9,18 @@ def render_pixels(int xres, int yres,
 	double[:] xa, double[:] ya, double[:] za, 
 	double[:] dxs, double[:] dys, double[:] dzs,
 	double xrng, double xmin, double yrng, double ymin, 
-	double zrng, double zmin, double alpha):
+	double zrng, double zmin, double alpha, out=None, steps=None):
+	# out continues an earlier render and steps overrides the largest differences,
+	# so that a long orbit can be rendered in chunks
 
-	cdef double[:,:,:] render = np.zeros((yres, xres, 3))
+	cdef double[:,:,:] render = np.zeros((yres, xres, 3)) if out is None else out
 	cdef int length = np.size(xa) # len(xa)
 	cdef int I
 	cdef int J
 	cdef double zalpha = 0
-	cdef double mdx = max(dxs)
-	cdef double mdy = max(dys)
-	cdef double mdz = max(dzs)
+	cdef double mdx = max(dxs) if steps is None else steps[0]
+	cdef double mdy = max(dys) if steps is None else steps[1]
+	cdef double mdz = max(dzs) if steps is None else steps[2]
 
 	for i in range(length):
 
@@ -1,42 +1,84 @@
-from functions import pixel_density
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import time 
+import time
 
 # this should be compiled first
-from iterator_cubic_8d import iteration_cubic_8d
+from iterator_cubic_8d import density_cubic_8d, lyapunov_cubic_8d
 
-def search_attractors(search_iterates, dimension):
+def candidate_coeffs(base_seed, first, count, dimension):
+	""" coefficients of candidates first..first+count-1 of the counter-based search, from one generator
 
-	start = time.time()
-
-	found = False
+	every candidate takes a whole number of Philox counter blocks (4 doubles each),
+	so a batch is one draw from a generator advanced to its first candidate and
+	any candidate can be regenerated alone
+	"""
 
 	d = dimension
 
 	ncoeffs = int(d + 11/6 * d**2 + d**3 + d**4/6)
+	blocks = -(-ncoeffs // 4)
+
+	bit_generator = np.random.Philox(key=base_seed).advance(blocks * int(first))
+	draws = np.random.Generator(bit_generator).random((count, 4 * blocks))[:, :ncoeffs]
+
+	return (np.floor(21 * draws) - 10)/(10 + 2 * dimension)
+
+def candidate_coeff(base_seed, candidate, dimension):
+	""" regenerate the coefficients of a candidate from its counter-based seed """
+
+	return candidate_coeffs(base_seed, candidate, 1, dimension)[0]
+
+def test_candidates(base_seed, first, count, search_iterates, dimension, lyapunov_min, min_fill=2.0):
+	""" return the candidates of first..first+count-1 that stay bounded, fill enough pixels and are chaotic """
+
+	hits = []
+
+	for cid, coeffs in enumerate(candidate_coeffs(base_seed, first, count, dimension), first):
+
+		if density_cubic_8d(search_iterates, coeffs, dimension, min_fill=min_fill) <= min_fill:
+			continue
 
+		exponent = lyapunov_cubic_8d(search_iterates, coeffs[None, :], dimension, search_iterates // 10)[0]
+
+		if exponent > lyapunov_min:
+			hits.append(cid)
+
+	return hits
+
+def search_stream(search_iterates, dimension, workers=None, base_seed=None, lyapunov_min=0.005, chunk=256, batch=16):
+	""" yield (coeffs, seed) for every attractor found, testing batches of candidates on a process pool
+
+	close the generator when done with it, so the pool is shut down
+	"""
+
+	start = time.time()
+
+	if base_seed is None:
+		base_seed = np.random.randint(1, 2e9)
+
+	d = dimension
+	candidate = 0
 
-	seed = 1750718977 
-	# np.random.randint(1, 2e9)
-	# np.random.seed()
+	with ProcessPoolExecutor(workers) as pool:
+		while True:
+			firsts = range(candidate, candidate + chunk, batch)
+			n = len(firsts)
+			found = pool.map(test_candidates,
+				[base_seed] * n, firsts, [batch] * n,
+				[search_iterates] * n, [dimension] * n, [lyapunov_min] * n)
 
-	while not found:
-				
-		coeffs = np.random.randint(-10, 11, ncoeffs)/(10 + 2 * dimension)
-		itdata = np.asarray(iteration_cubic_8d(search_iterates, coeffs, dimension))
+			for hits in found:
+				for cid in hits:
+					seed = f'{base_seed}-{cid}'
+					print(f'Found attractor | D: {d} | Seed: {seed} | {time.time()-start:.2f} seconds')
+					yield candidate_coeff(base_seed, cid, dimension), seed
 
-		test = itdata[-1,-1]
+			candidate += chunk
 
-		if np.isnan(test) or np.isinf(test):
-			out_of_bounds = True
-		else:
-			out_of_bounds = False
+def search_attractors(search_iterates, dimension, workers=None, base_seed=None, lyapunov_min=0.005):
 
-		if not out_of_bounds:
-			xa = itdata[:,0]
-			ya = itdata[:,1]
-			if pixel_density(xa,ya):
-				print(f'Found attractor | D: {d} | Seed: {seed} | {time.time()-start:.2f} seconds')
-				found = True
-			
-	return coeffs, seed
+	stream = search_stream(search_iterates, dimension, workers, base_seed, lyapunov_min)
+	try:
+		return next(stream)
+	finally:
+		stream.close()
@@ -1,7 +1,10 @@
-from setuptools import setup
+from setuptools import setup, Extension
 from Cython.Build import cythonize
 import numpy
 
 # this file sets up the cython iteration module
 
-setup(name="iterator_cubic_8d", ext_modules=cythonize('iterator_cubic_8d.pyx'),include_dirs=[numpy.get_include()])
\ No newline at end of file
+ext = Extension('iterator_cubic_8d', ['iterator_cubic_8d.pyx'],
+	extra_compile_args=['-Ofast', '-funsafe-math-optimizations'])
+
+setup(name="iterator_cubic_8d", ext_modules=cythonize(ext),include_dirs=[numpy.get_include()])
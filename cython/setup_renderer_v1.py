@@ -1,6 +1,10 @@
-from setuptools import setup
+from setuptools import setup, Extension
 from Cython.Build import cythonize
 
 # this file sets up the render module (version 1)
+# render_pixels_parallel needs OpenMP
 
-setup(name="renderer_v1", ext_modules=cythonize('renderer_v1.pyx', compiler_directives={'language_level' : "3"}),)
\ No newline at end of file
+ext = Extension('renderer_v1', ['renderer_v1.pyx'],
+	extra_compile_args=['-fopenmp'], extra_link_args=['-fopenmp'])
+
+setup(name="renderer_v1", ext_modules=cythonize(ext, compiler_directives={'language_level' : "3"}),)
@@ -1,5 +1,19 @@
 #include <stdlib.h>
 #include <stdio.h>
+#include <stdint.h>
+#include <string.h>
+#include <math.h>
+#include <pthread.h>
+
+/*
+ * Element types of the accumulation buffers (see add_point). Fixed point
+ * stores each weight rounded to FIXED_BITS fractional bits in a uint32 and
+ * saturates instead of wrapping; the count channel is a plain integer.
+ */
+#define FORMAT_DOUBLE 0
+#define FORMAT_FLOAT 1
+#define FORMAT_FIXED 2
+#define FIXED_BITS 12
 
 double* iterator(double* start, double* coeffs, int repeat, double radius, double* out) {
 	double x = start[0], y = start[1], z = start[2];
@@ -51,3 +65,890 @@ double* sum_alpha(int yres, int xres, int len, int* Is, int* Js, double* rx, dou
 	}
 	return out;
 }
+
+static void cubic_step(double *coeffs, double *x, double *y, double *z) {
+	double p[3];
+	for (int i = 0; i < 3; i++) {
+		double *c = coeffs + 20 * i;
+		p[i] =  c[0];
+		p[i] += c[1] * *x;
+		p[i] += c[2] * *y;
+		p[i] += c[3] * *z;
+		p[i] += c[4] * *x * *y;
+		p[i] += c[5] * *x * *z;
+		p[i] += c[6] * *y * *z;
+		p[i] += c[7] * *x * *x;
+		p[i] += c[8] * *y * *y;
+		p[i] += c[9] * *z * *z;
+
+		p[i] += c[10] * *x * *y * *z;
+		p[i] += c[11] * *x * *x * *y;
+		p[i] += c[12] * *x * *x * *z;
+		p[i] += c[13] * *y * *y * *x;
+		p[i] += c[14] * *y * *y * *z;
+		p[i] += c[15] * *z * *z * *x;
+		p[i] += c[16] * *z * *z * *y;
+
+		p[i] += c[17] * *x * *x * *x;
+		p[i] += c[18] * *y * *y * *y;
+		p[i] += c[19] * *z * *z * *z;
+	}
+	*x = p[0], *y = p[1], *z = p[2];
+}
+
+/*
+ * Percentage of an xres x yres grid filled by the first `repeat` points of the
+ * orbit starting at the origin, -1 if the orbit leaves `radius`, or -2 if the
+ * bitmap could not be allocated.
+ *
+ * The bounds (aspect corrected with a 10% margin, as set_aspect does) are
+ * estimated from the first `nbounds` points; points falling outside them are
+ * not counted. The orbit is then re-iterated into an occupancy bitmap, stopping
+ * as soon as the outcome is decided: more than `min_fill` percent is set, or
+ * the remaining points can no longer reach it. The returned fill is then the
+ * partial count at that point, a lower bound; a negative min_fill counts the
+ * whole orbit.
+ */
+double fill_density(double *coeffs, int repeat, int nbounds, double radius, int xres, int yres, double min_fill) {
+	double x = 0, y = 0, z = 0;
+	double xmin = 0, xmax = 0, ymin = 0, ymax = 0;
+
+	if (nbounds <= 0 || nbounds > repeat)
+		nbounds = repeat;
+
+	for (int run = 0; run < repeat; run++) {
+		cubic_step(coeffs, &x, &y, &z);
+		if (radius * radius < x*x + y*y + z*z)
+			return -1;
+
+		if (run == 0) {
+			xmin = xmax = x;
+			ymin = ymax = y;
+		} else if (run < nbounds) {
+			if (x < xmin) xmin = x;
+			if (x > xmax) xmax = x;
+			if (y < ymin) ymin = y;
+			if (y > ymax) ymax = y;
+		}
+	}
+
+	double xrng = xmax - xmin, yrng = ymax - ymin;
+	if (!(xrng > 0 && yrng > 0))
+		return 0;
+
+	double xmid = xmin + xrng / 2, ymid = ymin + yrng / 2;
+	if (xrng / yrng < (double)xres / yres)
+		xrng = (double)xres / yres * yrng;
+	else
+		yrng = (double)yres / xres * xrng;
+	xrng *= 1.1;
+	yrng *= 1.1;
+	xmin = xmid - xrng / 2;
+	ymin = ymid - yrng / 2;
+
+	int size = xres * yres;
+	int needed = (int)(min_fill / 100 * size) + 1;
+	int filled = 0;
+	unsigned char *bitmap = calloc((size + 7) / 8, 1);
+	if (bitmap == NULL)
+		return -2;
+
+	x = y = z = 0;
+	for (int run = 0; run < repeat; run++) {
+		cubic_step(coeffs, &x, &y, &z);
+
+		int J = (int)((x - xmin) * (xres - 1) / xrng);
+		int I = (int)((y - ymin) * (yres - 1) / yrng);
+		if (0 <= J && J < xres && 0 <= I && I < yres) {
+			int pos = xres * I + J;
+			if (!(bitmap[pos >> 3] & (1 << (pos & 7)))) {
+				bitmap[pos >> 3] |= 1 << (pos & 7);
+				filled++;
+			}
+		}
+
+		if (min_fill >= 0 && (filled >= needed || filled + (repeat - run - 1) < needed))
+			break;
+	}
+
+	free(bitmap);
+	return 100.0 * filled / size;
+}
+
+/*
+ * fill_density of each of the n coefficient sets in coeffs (n x 60), written
+ * to out, so a batch of candidates is tested in a single call. Returns 0, or
+ * -1 as soon as a bitmap could not be allocated.
+ */
+int fill_densities(double *coeffs, int n, int repeat, int nbounds, double radius, int xres, int yres, double min_fill, double *out) {
+	for (int c = 0; c < n; c++) {
+		out[c] = fill_density(coeffs + 60 * c, repeat, nbounds, radius, xres, yres, min_fill);
+		if (out[c] == -2)
+			return -1;
+	}
+	return 0;
+}
+
+static inline void step_colour(double *p, double *prev, double *steps, double alpha, double *colour) {
+	for (int k = 0; k < 3; k++) {
+		colour[k] = 1 - fabs(p[k] - prev[k]) / steps[k];
+		colour[k] = colour[k] > 0 ? alpha * colour[k] : 0;
+	}
+}
+
+/*
+ * Pixel (I, J) of p in view v and its weights w; returns the offset of the
+ * pixel in out, or -1 if it falls outside the view or the rows row0..row1-1.
+ */
+static inline long view_pixel(double *p, double *colour, int v, int *axes, double *bounds, int xres, int yres, int channels, int row0, int row1, int *I, int *J, double *w) {
+	double a_min = 0.25;
+	int *ax = axes + 3 * v;
+	double *b = bounds + 6 * v;
+
+	*J = (int)((p[ax[0]] - b[0]) * (xres - 1) / b[1]);
+	*I = (int)((p[ax[1]] - b[2]) * (yres - 1) / b[3]);
+	if (*J < 0 || *J >= xres || *I < row0 || *I >= row1)
+		return -1;
+
+	double zscaled = (p[ax[2]] - b[4]) * (1 - a_min) / b[5] + a_min;
+	zscaled = zscaled < a_min ? a_min : (zscaled > 1 ? 1 : zscaled);
+
+	w[0] = colour[ax[0]] * zscaled, w[1] = colour[ax[1]] * zscaled, w[2] = colour[ax[2]] * zscaled;
+	return ((long)v * yres * xres + (long)xres * *I + *J) * channels;
+}
+
+static inline void add_weights(void *out, size_t offset, double *w, int channels, int format) {
+	if (format == FORMAT_FLOAT) {
+		float *pixel = (float *)out + offset;
+		pixel[0] += w[0], pixel[1] += w[1], pixel[2] += w[2];
+		if (channels == 4)
+			pixel[3] += 1;
+	} else if (format == FORMAT_FIXED) {
+		uint32_t *pixel = (uint32_t *)out + offset;
+		for (int k = 0; k < 3; k++) {
+			uint32_t q = (uint32_t)(w[k] * (1 << FIXED_BITS) + 0.5);
+			pixel[k] = pixel[k] > UINT32_MAX - q ? UINT32_MAX : pixel[k] + q;
+		}
+		if (channels == 4 && pixel[3] < UINT32_MAX)
+			pixel[3] += 1;
+	} else {
+		double *pixel = (double *)out + offset;
+		pixel[0] += w[0], pixel[1] += w[1], pixel[2] += w[2];
+		if (channels == 4)
+			pixel[3] += 1;
+	}
+}
+
+/*
+ * Add point p (previous point prev) to each of the nviews yres x xres x channels
+ * images stored back to back in out. With 4 channels the last one counts the
+ * points that landed in each pixel. The elements of out are doubles, floats or
+ * fixed point uint32 depending on format. View v projects onto axes[3v..3v+2]
+ * (horizontal, vertical, depth) with bounds[6v..6v+5] holding
+ * {xmin, xrng, ymin, yrng, zmin, zrng}. steps holds the largest step along
+ * x, y and z; the step colours are shared by all views and clamped at zero.
+ * Only image rows row0 <= I < row1 are written.
+ */
+static void add_point(double *p, double *prev, int nviews, int *axes, double *bounds, double *steps, double alpha, int xres, int yres, int channels, int format, int row0, int row1, void *out) {
+	double colour[3], w[3];
+	int I, J;
+
+	step_colour(p, prev, steps, alpha, colour);
+	for (int v = 0; v < nviews; v++) {
+		long offset = view_pixel(p, colour, v, axes, bounds, xres, yres, channels, row0, row1, &I, &J, w);
+		if (offset >= 0)
+			add_weights(out, offset, w, channels, format);
+	}
+}
+
+/*
+ * Iterate `repeat` steps from state (updated in place) and add every point
+ * straight into all views (see add_point), without storing the orbit.
+ * Bounds and steps are estimated beforehand; points outside them are dropped.
+ */
+void accumulate(double *state, double *coeffs, int repeat, int nviews, int *axes, double *bounds, double *steps, double alpha, int xres, int yres, int channels, int format, void *out) {
+	double p[3] = {state[0], state[1], state[2]};
+	double prev[3];
+
+	for (int run = 0; run < repeat; run++) {
+		prev[0] = p[0], prev[1] = p[1], prev[2] = p[2];
+		cubic_step(coeffs, &p[0], &p[1], &p[2]);
+		add_point(p, prev, nviews, axes, bounds, steps, alpha, xres, yres, channels, format, 0, yres, out);
+	}
+
+	state[0] = p[0], state[1] = p[1], state[2] = p[2];
+}
+
+/* add the stored positions (len x 3) to all views in a single pass */
+void scatter_views(double *positions, int len, int nviews, int *axes, double *bounds, double *steps, double alpha, int xres, int yres, int channels, int format, void *out) {
+	for (int i = 1; i < len; i++)
+		add_point(positions + 3 * i, positions + 3 * (i - 1), nviews, axes, bounds, steps, alpha, xres, yres, channels, format, 0, yres, out);
+}
+
+/*
+ * Threaded scatters. The image is split into horizontal bands of rows, one per
+ * thread, and every thread only writes the pixels of its own band. No pixel is
+ * shared between threads and each pixel receives its points in the original
+ * order, so results are bit-identical to the single-threaded versions and no
+ * private buffers or reduction are needed. run_bands gives every thread the
+ * whole point stream; the split scatters below also split the points.
+ */
+struct scatter_band {
+	int row0, row1;
+	int strip0, strip1;
+	int norbits, stride;
+	int len, xres, yres, channels, format;
+	int *Is, *Js;
+	double *rx, *ry, *rz;
+	double *positions;
+	int nviews, *axes;
+	double *bounds, *steps, alpha;
+	struct tiled_point *records;
+	void *out;
+	int status;             /* set to -1 by a worker that could not allocate its buffers */
+};
+
+static int run_bands(struct scatter_band *proto, int nthreads, void *(*worker)(void *)) {
+	/* the bands split the rows of the strip, or of the whole image if no strip is set */
+	int first = proto->strip1 ? proto->strip0 : 0;
+	int rows = (proto->strip1 ? proto->strip1 : proto->yres) - first;
+
+	if (nthreads < 1)
+		nthreads = 1;
+	if (nthreads > rows)
+		nthreads = rows;
+
+	pthread_t *threads = malloc(nthreads * sizeof(pthread_t));
+	struct scatter_band *bands = malloc(nthreads * sizeof(struct scatter_band));
+	if (threads == NULL || bands == NULL) {
+		free(threads);
+		free(bands);
+		return -1;
+	}
+
+	for (int t = 0; t < nthreads; t++) {
+		bands[t] = *proto;
+		bands[t].row0 = first + rows * t / nthreads;
+		bands[t].row1 = first + rows * (t + 1) / nthreads;
+		pthread_create(&threads[t], NULL, worker, &bands[t]);
+	}
+	int status = 0;
+	for (int t = 0; t < nthreads; t++) {
+		pthread_join(threads[t], NULL);
+		if (bands[t].status < 0)
+			status = -1;
+	}
+
+	free(threads);
+	free(bands);
+	return status;
+}
+
+/*
+ * Split scatters. Under run_bands every thread projects all the points to
+ * find those of its band, so adding threads adds work. Here the points are
+ * also split, a chunk at a time, in two phases. First every thread projects
+ * its own share of the chunk into records (pixel offset and weights),
+ * counting-sorted by band, then view, then (for the tiled scatter) tile.
+ * Then every thread adds the records of its band, key by key, taking the
+ * shares in order. Every point is projected by a single thread, so each
+ * thread does 1/nthreads of the work. The sort is stable, so every pixel still
+ * receives its points in the original order.
+ *
+ * Tiled scatter. Consecutive points of an orbit land on unrelated pixels, so
+ * at high resolutions nearly every addition misses the cache and the TLB.
+ * Sorting the records of a band by TILE x TILE tile as well keeps the pixels
+ * being written in L2; its chunks are larger so the tiles get more points.
+ * Results equal scatter_views (bit for bit in float and fixed buffers; -Ofast
+ * may round double weights differently in the last place).
+ *
+ * All return 0, or -1 if a buffer could not be allocated, leaving out partly
+ * filled.
+ */
+#define TILE 128
+#define TILE_CHUNK (1 << 20)
+#define SPLIT_CHUNK (1 << 18)
+
+struct tiled_point {
+	size_t offset;
+	double w[3];
+};
+
+struct split {
+	struct scatter_band *b;         /* the scatter, shared by all threads */
+	int nthreads, tiled;
+	int tiles_x, tiles_y;           /* tiles of a band in a view, 1 x 1 if not tiled */
+	int nkeys;                      /* keys of a band, nviews x tiles_y x tiles_x */
+	int *row_keys;                  /* first key of every image row in view 0 */
+	int first, last;                /* points of the current chunk */
+	struct split_share *shares;
+};
+
+struct split_share {
+	struct split *s;
+	int t;                          /* share of the points, then band of the rows */
+	int *starts;                    /* where the records of every key begin, nthreads x nkeys + 1 */
+	struct tiled_point *records;
+	int capacity;
+	int status;
+};
+
+/* key of a record in row I, column J of view v: its band, then view, then tile within the band */
+static inline int split_key(struct split *s, int v, int I, int J) {
+	return s->row_keys[I] + v * s->tiles_y * s->tiles_x + (s->tiled ? J / TILE : 0);
+}
+
+/* record r of point i in view v and its key, or -1 if the point is not drawn there */
+static inline int split_record(struct split *s, int i, int v, double *colour, struct tiled_point *r) {
+	struct scatter_band *b = s->b;
+	int I, J;
+
+	if (b->Is) {
+		I = b->Is[i], J = b->Js[i];
+		if (I < 0 || I >= b->yres)
+			return -1;
+		r->offset = ((size_t)b->xres * I + J) * 3;
+		r->w[0] = b->rx[i], r->w[1] = b->ry[i], r->w[2] = b->rz[i];
+	} else {
+		long offset = view_pixel(b->positions + 3 * i, colour, v, b->axes, b->bounds, b->xres, b->yres, b->channels, 0, b->yres, &I, &J, r->w);
+		if (offset < 0)
+			return -1;
+		r->offset = offset;
+	}
+	return split_key(s, v, I, J);
+}
+
+static void *split_bin(void *arg) {
+	struct split_share *sh = arg;
+	struct split *s = sh->s;
+	struct scatter_band *b = s->b;
+	int first = s->first + (long)(s->last - s->first) * sh->t / s->nthreads;
+	int last = s->first + (long)(s->last - s->first) * (sh->t + 1) / s->nthreads;
+	int nkeys = s->nthreads * s->nkeys;
+	double colour[3] = {0, 0, 0};
+	struct tiled_point r;
+	int n = 0;
+
+	/* count the records of every key, then turn the counts into key starts */
+	memset(sh->starts, 0, (nkeys + 1) * sizeof(int));
+	for (int i = first; i < last; i++) {
+		if (b->positions)
+			step_colour(b->positions + 3 * i, b->positions + 3 * (i - 1), b->steps, b->alpha, colour);
+		for (int v = 0; v < b->nviews; v++) {
+			int key = split_record(s, i, v, colour, &r);
+			if (key >= 0) {
+				sh->starts[key + 1]++;
+				n++;
+			}
+		}
+	}
+	for (int k = 0; k < nkeys; k++)
+		sh->starts[k + 1] += sh->starts[k];
+
+	if (n > sh->capacity) {
+		free(sh->records);
+		sh->records = malloc(n * sizeof(struct tiled_point));
+		sh->capacity = sh->records ? n : 0;
+		if (sh->records == NULL) {
+			sh->status = -1;
+			return NULL;
+		}
+	}
+
+	/* place the records in key order, keeping their order within a key */
+	for (int i = first; i < last; i++) {
+		if (b->positions)
+			step_colour(b->positions + 3 * i, b->positions + 3 * (i - 1), b->steps, b->alpha, colour);
+		for (int v = 0; v < b->nviews; v++) {
+			int key = split_record(s, i, v, colour, &r);
+			if (key >= 0)
+				sh->records[sh->starts[key]++] = r;
+		}
+	}
+
+	/* placing the records moved every start on to the start of the next key */
+	memmove(sh->starts + 1, sh->starts, nkeys * sizeof(int));
+	sh->starts[0] = 0;
+	return NULL;
+}
+
+static void *split_add(void *arg) {
+	struct split_share *sh = arg;
+	struct split *s = sh->s;
+	struct scatter_band *b = s->b;
+
+	for (int k = sh->t * s->nkeys; k < (sh->t + 1) * s->nkeys; k++)
+		for (int u = 0; u < s->nthreads; u++) {
+			struct split_share *from = s->shares + u;
+			for (int r = from->starts[k]; r < from->starts[k + 1]; r++)
+				add_weights(b->out, from->records[r].offset, from->records[r].w, b->channels, b->format);
+		}
+	return NULL;
+}
+
+/* add points first..len-1 of the scatter in proto, chunk at a time, as described above */
+static int run_split(struct scatter_band *proto, int first, int nthreads, int tiled, int chunk) {
+	struct split s = {.b = proto, .tiled = tiled, .tiles_x = 1, .tiles_y = 1};
+	int status = 0;
+
+	if (nthreads < 1)
+		nthreads = 1;
+	if (nthreads > proto->yres)
+		nthreads = proto->yres;
+	s.nthreads = nthreads;
+	if (tiled) {
+		/* a band of at most `rows` rows touches at most this many rows of tiles */
+		int rows = (proto->yres + nthreads - 1) / nthreads;
+		s.tiles_x = (proto->xres + TILE - 1) / TILE;
+		s.tiles_y = (rows - 1) / TILE + 2;
+	}
+	s.nkeys = proto->nviews * s.tiles_y * s.tiles_x;
+
+	size_t nstarts = (size_t)nthreads * s.nkeys + 1;
+	pthread_t *threads = malloc(nthreads * sizeof(pthread_t));
+	int *starts = malloc(nthreads * nstarts * sizeof(int));
+	s.row_keys = malloc(proto->yres * sizeof(int));
+	s.shares = calloc(nthreads, sizeof(struct split_share));
+	if (threads == NULL || starts == NULL || s.row_keys == NULL || s.shares == NULL) {
+		free(threads);
+		free(starts);
+		free(s.row_keys);
+		free(s.shares);
+		return -1;
+	}
+
+	/* the bands split the rows as run_bands does */
+	for (int t = 0; t < nthreads; t++) {
+		int row0 = (long)proto->yres * t / nthreads;
+		int row1 = (long)proto->yres * (t + 1) / nthreads;
+		for (int I = row0; I < row1; I++)
+			s.row_keys[I] = t * s.nkeys + (tiled ? (I / TILE - row0 / TILE) * s.tiles_x : 0);
+	}
+	for (int t = 0; t < nthreads; t++) {
+		s.shares[t].s = &s;
+		s.shares[t].t = t;
+		s.shares[t].starts = starts + t * nstarts;
+	}
+
+	for (s.first = first; s.first < proto->len; s.first = s.last) {
+		s.last = proto->len - s.first > chunk ? s.first + chunk : proto->len;
+
+		for (int t = 0; t < nthreads; t++)
+			pthread_create(&threads[t], NULL, split_bin, &s.shares[t]);
+		for (int t = 0; t < nthreads; t++) {
+			pthread_join(threads[t], NULL);
+			if (s.shares[t].status < 0)
+				status = -1;
+		}
+		if (status < 0)
+			break;
+
+		for (int t = 0; t < nthreads; t++)
+			pthread_create(&threads[t], NULL, split_add, &s.shares[t]);
+		for (int t = 0; t < nthreads; t++)
+			pthread_join(threads[t], NULL);
+	}
+
+	for (int t = 0; t < nthreads; t++)
+		free(s.shares[t].records);
+	free(s.shares);
+	free(s.row_keys);
+	free(starts);
+	free(threads);
+	return status;
+}
+
+int sum_alpha_threaded(int yres, int xres, int len, int* Is, int* Js, double* rx, double* ry, double* rz, double* out, int nthreads) {
+	struct scatter_band proto = {
+		.len = len, .xres = xres, .yres = yres, .channels = 3, .format = FORMAT_DOUBLE, .nviews = 1,
+		.Is = Is, .Js = Js, .rx = rx, .ry = ry, .rz = rz, .out = out
+	};
+	return run_split(&proto, 0, nthreads, 0, SPLIT_CHUNK);
+}
+
+int scatter_views_threaded(double *positions, int len, int nviews, int *axes, double *bounds, double *steps, double alpha, int xres, int yres, int channels, int format, void *out, int nthreads) {
+	struct scatter_band proto = {
+		.len = len, .xres = xres, .yres = yres, .channels = channels, .format = format, .positions = positions,
+		.nviews = nviews, .axes = axes, .bounds = bounds, .steps = steps, .alpha = alpha, .out = out
+	};
+	return run_split(&proto, 1, nthreads, 0, SPLIT_CHUNK);
+}
+
+int scatter_views_tiled(double *positions, int len, int nviews, int *axes, double *bounds, double *steps, double alpha, int xres, int yres, int channels, int format, void *out, int nthreads) {
+	struct scatter_band proto = {
+		.len = len, .xres = xres, .yres = yres, .channels = channels, .format = format, .positions = positions,
+		.nviews = nviews, .axes = axes, .bounds = bounds, .steps = steps, .alpha = alpha, .out = out
+	};
+	return run_split(&proto, 1, nthreads, 1, TILE_CHUNK);
+}
+
+/*
+ * Strip scatter, for images larger than memory. out holds only the rows
+ * strip0 <= I < strip1 of every view (nviews x strip1 - strip0 x xres x
+ * channels), so an image can be rendered a strip at a time, each strip from
+ * its own pass over the points. Threads split the rows of the strip.
+ */
+static void *scatter_strip_band(void *arg) {
+	struct scatter_band *b = arg;
+	int rows = b->strip1 - b->strip0;
+	double colour[3], w[3];
+	int I, J;
+
+	for (int i = 1; i < b->len; i++) {
+		double *p = b->positions + 3 * i;
+		step_colour(p, p - 3, b->steps, b->alpha, colour);
+		for (int v = 0; v < b->nviews; v++) {
+			if (view_pixel(p, colour, v, b->axes, b->bounds, b->xres, b->yres, b->channels, b->row0, b->row1, &I, &J, w) < 0)
+				continue;
+			add_weights(b->out, (((long)v * rows + I - b->strip0) * b->xres + J) * b->channels, w, b->channels, b->format);
+		}
+	}
+	return NULL;
+}
+
+void scatter_strip(double *positions, int len, int nviews, int *axes, double *bounds, double *steps, double alpha, int xres, int yres, int channels, int format, void *out, int strip0, int strip1, int nthreads) {
+	struct scatter_band proto = {
+		.len = len, .xres = xres, .yres = yres, .channels = channels, .format = format, .positions = positions,
+		.nviews = nviews, .axes = axes, .bounds = bounds, .steps = steps, .alpha = alpha, .out = out,
+		.strip0 = strip0, .strip1 = strip1
+	};
+	run_bands(&proto, nthreads, scatter_strip_band);
+}
+
+/*
+ * Binned strips, for images larger than memory rendered in a single pass
+ * over the points. bin_strips turns the points after the first into the
+ * pixel offsets and weights of every view they land in (as the tiled scatter
+ * does) and counting-sorts them by strip of `rows` image rows into out, which
+ * has room for (len - 1) * nviews of them. starts (one more than the strips)
+ * receives where every strip begins in out. The sort is stable, so a strip
+ * added from its records by scatter_binned gets the points of every pixel
+ * in their original order, as scatter_strip would.
+ */
+void bin_strips(double *positions, int len, int nviews, int *axes, double *bounds, double *steps, double alpha, int xres, int yres, int channels, int rows, long *starts, struct tiled_point *out) {
+	int nstrips = (yres + rows - 1) / rows;
+	double colour[3], w[3];
+	int I, J;
+
+	memset(starts, 0, (nstrips + 1) * sizeof(long));
+	for (int i = 1; i < len; i++) {
+		double *p = positions + 3 * i;
+		step_colour(p, p - 3, steps, alpha, colour);
+		for (int v = 0; v < nviews; v++)
+			if (view_pixel(p, colour, v, axes, bounds, xres, yres, channels, 0, yres, &I, &J, w) >= 0)
+				starts[I / rows + 1]++;
+	}
+	for (int s = 0; s < nstrips; s++)
+		starts[s + 1] += starts[s];
+
+	for (int i = 1; i < len; i++) {
+		double *p = positions + 3 * i;
+		step_colour(p, p - 3, steps, alpha, colour);
+		for (int v = 0; v < nviews; v++) {
+			long offset = view_pixel(p, colour, v, axes, bounds, xres, yres, channels, 0, yres, &I, &J, w);
+			if (offset < 0)
+				continue;
+			struct tiled_point *q = out + starts[I / rows]++;
+			q->offset = offset;
+			q->w[0] = w[0], q->w[1] = w[1], q->w[2] = w[2];
+		}
+	}
+
+	/* placing the records moved every start on to the start of the next strip */
+	memmove(starts + 1, starts, nstrips * sizeof(long));
+	starts[0] = 0;
+}
+
+static void *scatter_binned_band(void *arg) {
+	struct scatter_band *b = arg;
+	size_t view = (size_t)b->yres * b->xres;
+	int rows = b->strip1 - b->strip0;
+
+	for (int k = 0; k < b->len; k++) {
+		size_t pixel = b->records[k].offset / b->channels;
+		int I = pixel % view / b->xres;
+		if (I < b->row0 || I >= b->row1)
+			continue;
+		size_t v = pixel / view;
+		int J = pixel % b->xres;
+		add_weights(b->out, ((v * rows + I - b->strip0) * b->xres + J) * b->channels, b->records[k].w, b->channels, b->format);
+	}
+	return NULL;
+}
+
+/*
+ * Add len records of bin_strips to out, which holds only the rows strip0 <= I
+ * < strip1 of every view as for scatter_strip. Threads split the rows of the
+ * strip; records of other rows are skipped.
+ */
+void scatter_binned(struct tiled_point *records, int len, int xres, int yres, int channels, int format, void *out, int strip0, int strip1, int nthreads) {
+	struct scatter_band proto = {
+		.len = len, .xres = xres, .yres = yres, .channels = channels, .format = format, .records = records,
+		.out = out, .strip0 = strip0, .strip1 = strip1
+	};
+	run_bands(&proto, nthreads, scatter_binned_band);
+}
+
+/*
+ * Rotated views. Every view has a camera of its own: a 3 x 3 rotation whose
+ * rows are the horizontal, vertical and depth axes of the view, with bounds
+ * and steps (nviews x 6 and nviews x 3) of the rotated points, so depth alpha
+ * and colours follow the view's own axes. The points are taken
+ * ROTATION_BLOCK at a time; each block is rotated into every view in turn and
+ * added to it with the tiled scatter, so the orbit is read once however many
+ * views there are and every view is written tile by tile. Returns 0, or -1 if
+ * a buffer could not be allocated, leaving out partly filled.
+ */
+#define ROTATION_BLOCK (1 << 20)
+
+int scatter_rotated(double *positions, int len, int nviews, double *rotations, double *bounds, double *steps, double alpha, int xres, int yres, int channels, int format, void *out, int nthreads) {
+	int identity[3] = {0, 1, 2};
+	size_t view_size = (size_t)yres * xres * channels * (format == FORMAT_DOUBLE ? sizeof(double) : sizeof(float));
+	int block = len < ROTATION_BLOCK ? len : ROTATION_BLOCK;
+	double *q = malloc(3 * sizeof(double) * (block + 1));
+	if (q == NULL)
+		return -1;
+
+	for (int first = 1; first < len; first += block) {
+		int n = first + block < len ? block : len - first;
+		double *p = positions + 3 * (first - 1);
+
+		for (int v = 0; v < nviews; v++) {
+			double *r = rotations + 9 * v;
+			/* the block and the point before it, in the view's axes */
+			for (int i = 0; i <= n; i++)
+				for (int k = 0; k < 3; k++)
+					q[3 * i + k] = r[3 * k] * p[3 * i] + r[3 * k + 1] * p[3 * i + 1] + r[3 * k + 2] * p[3 * i + 2];
+
+			struct scatter_band proto = {
+				.len = n + 1, .xres = xres, .yres = yres, .channels = channels, .format = format, .positions = q,
+				.nviews = 1, .axes = identity, .bounds = bounds + 6 * v, .steps = steps + 3 * v, .alpha = alpha,
+				.out = (char *)out + v * view_size
+			};
+			if (run_split(&proto, 1, nthreads, 1, TILE_CHUNK) < 0) {
+				free(q);
+				return -1;
+			}
+		}
+	}
+	free(q);
+	return 0;
+}
+
+/*
+ * Multi-orbit accumulation. The orbits starting at states (norbits x 3,
+ * updated in place) are each iterated `repeat` steps and added to the views
+ * as accumulate does, `block` steps at a time. work holds a block of every
+ * orbit (norbits x block + 1 x 3, the first row being the point before it).
+ * For each block the orbits are dealt out to threads, and every thread
+ * advances LANES orbits in lockstep so the map evaluation vectorizes; the
+ * block is then added to the image in horizontal bands of rows, one per
+ * thread, with run_bands.
+ *
+ * No pixel is shared between threads, so no private images are needed and
+ * memory stays at the work buffer whatever the thread count. Every pixel
+ * receives the points of a block orbit by orbit, so the result does not
+ * depend on the number of threads. Returns 0, or -1 if the threads could not
+ * be allocated.
+ */
+#define LANES 4
+
+struct orbit_group {
+	double *states;
+	int first, count;
+	double *coeffs;
+	int steps, block;
+	double *work;
+};
+
+static void *orbit_group_run(void *arg) {
+	struct orbit_group *g = arg;
+
+	for (int o = g->first; o < g->first + g->count; o += LANES) {
+		int lanes = g->first + g->count - o < LANES ? g->first + g->count - o : LANES;
+		double x[LANES], y[LANES], z[LANES];
+
+		for (int l = 0; l < LANES; l++) {
+			int k = l < lanes ? o + l : o;
+			x[l] = g->states[3 * k + 0];
+			y[l] = g->states[3 * k + 1];
+			z[l] = g->states[3 * k + 2];
+		}
+
+		for (int run = 0; run <= g->steps; run++) {
+			if (run > 0)
+				for (int l = 0; l < LANES; l++)
+					cubic_step(g->coeffs, &x[l], &y[l], &z[l]);
+			for (int l = 0; l < lanes; l++) {
+				double *q = g->work + 3 * ((size_t)(o + l) * (g->block + 1) + run);
+				q[0] = x[l], q[1] = y[l], q[2] = z[l];
+			}
+		}
+
+		for (int l = 0; l < lanes; l++) {
+			g->states[3 * (o + l) + 0] = x[l];
+			g->states[3 * (o + l) + 1] = y[l];
+			g->states[3 * (o + l) + 2] = z[l];
+		}
+	}
+	return NULL;
+}
+
+static void *orbit_block_band(void *arg) {
+	struct scatter_band *b = arg;
+	for (int o = 0; o < b->norbits; o++) {
+		double *orbit = b->positions + 3 * (size_t)o * b->stride;
+		for (int i = 1; i < b->len; i++)
+			add_point(orbit + 3 * i, orbit + 3 * (i - 1), b->nviews, b->axes, b->bounds,
+					b->steps, b->alpha, b->xres, b->yres, b->channels, b->format, b->row0, b->row1, b->out);
+	}
+	return NULL;
+}
+
+int accumulate_orbits(double *states, int norbits, double *coeffs, int repeat, int nviews, int *axes, double *bounds, double *steps, double alpha, int xres, int yres, int channels, int format, void *out, double *work, int block, int nthreads) {
+	int workers = nthreads < 1 ? 1 : (nthreads > norbits ? norbits : nthreads);
+	pthread_t *threads = malloc(workers * sizeof(pthread_t));
+	struct orbit_group *groups = malloc(workers * sizeof(struct orbit_group));
+	int status = 0;
+
+	if (threads == NULL || groups == NULL) {
+		free(threads);
+		free(groups);
+		return -1;
+	}
+
+	struct scatter_band proto = {
+		.xres = xres, .yres = yres, .channels = channels, .format = format, .positions = work,
+		.norbits = norbits, .stride = block + 1,
+		.nviews = nviews, .axes = axes, .bounds = bounds, .steps = steps, .alpha = alpha, .out = out
+	};
+
+	for (int done = 0; done < repeat; done += block) {
+		int n = repeat - done < block ? repeat - done : block;
+
+		for (int t = 0; t < workers; t++) {
+			int first = norbits * t / workers;
+			struct orbit_group g = {
+				.states = states, .first = first, .count = norbits * (t + 1) / workers - first,
+				.coeffs = coeffs, .steps = n, .block = block, .work = work
+			};
+			groups[t] = g;
+			pthread_create(&threads[t], NULL, orbit_group_run, &groups[t]);
+		}
+		for (int t = 0; t < workers; t++)
+			pthread_join(threads[t], NULL);
+
+		proto.len = n + 1;
+		if (run_bands(&proto, nthreads, orbit_block_band) < 0) {
+			status = -1;
+			break;
+		}
+	}
+
+	free(groups);
+	free(threads);
+	return status;
+}
+
+/*
+ * Largest Lyapunov exponent (bits per iteration) of each of the n coefficient
+ * sets in coeffs (n x 60), written to out. Sprott's method: a second orbit is
+ * kept at distance d0 from the first, the log of its growth is summed after the
+ * transient, and it is pulled back to distance d0 along the separation after
+ * every step. Orbits leaving `radius` (or collapsing onto each other) get
+ * -HUGE_VAL.
+ */
+void lyapunov(double *coeffs, int n, int repeat, int transient, double radius, double *out) {
+	double d0 = 1e-8;
+
+	for (int c = 0; c < n; c++) {
+		double *cf = coeffs + 60 * c;
+		double x = 0, y = 0, z = 0;
+		double xe = d0, ye = 0, ze = 0;
+		double lsum = 0;
+		out[c] = -HUGE_VAL;
+
+		int run;
+		for (run = 0; run < repeat; run++) {
+			cubic_step(cf, &x, &y, &z);
+			cubic_step(cf, &xe, &ye, &ze);
+			if (radius * radius < x*x + y*y + z*z)
+				break;
+
+			double dx = xe - x, dy = ye - y, dz = ze - z;
+			double d = sqrt(dx*dx + dy*dy + dz*dz);
+			if (d == 0)
+				break;
+			if (run >= transient)
+				lsum += log(d / d0);
+
+			xe = x + d0 * dx / d;
+			ye = y + d0 * dy / d;
+			ze = z + d0 * dz / d;
+		}
+
+		if (run == repeat && repeat > transient)
+			out[c] = 1.4426950408889634 * lsum / (repeat - transient);
+	}
+}
+
+/*
+ * Cubic map in d dimensions on the compact monomial basis: every output is a
+ * weighted sum of the nm = (d+1)(d+2)(d+3)/6 products c_i c_j c_k, i <= j <= k,
+ * of the coordinates c = (1, x_1, ..., x_d), in that loop order (the layout of
+ * the coefficients in cython/search.py). coeffs holds d rows of nm weights.
+ *
+ * The products are built once per step from a running table of pair products,
+ * so each step costs about nm multiplications plus d dot products of length nm.
+ * Writes up to `repeat` points of d coordinates to out and returns how many
+ * were written, or -1 if the work buffers could not be allocated; iteration
+ * stops after the first point outside `radius` (0 disables the check).
+ */
+int n_iterator(double *start, double *coeffs, int d, int repeat, double radius, double *out) {
+	int nm = (d + 1) * (d + 2) * (d + 3) / 6;
+	double *c = malloc((d + 1) * sizeof(double));
+	double *mono = malloc(nm * sizeof(double));
+	if (c == NULL || mono == NULL) {
+		free(c);
+		free(mono);
+		return -1;
+	}
+
+	c[0] = 1;
+	for (int i = 0; i < d; i++)
+		c[i + 1] = start[i];
+
+	int run;
+	for (run = 0; run < repeat; run++) {
+		int n = 0;
+		for (int i = 0; i <= d; i++) {
+			for (int j = i; j <= d; j++) {
+				double cij = c[i] * c[j];
+				for (int k = j; k <= d; k++)
+					mono[n++] = cij * c[k];
+			}
+		}
+
+		double rr = 0;
+		for (int m = 0; m < d; m++) {
+			double *w = coeffs + m * nm;
+			double sum = 0;
+			for (int t = 0; t < nm; t++)
+				sum += w[t] * mono[t];
+			out[d * run + m] = sum;
+			rr += sum * sum;
+		}
+
+		for (int m = 0; m < d; m++)
+			c[m + 1] = out[d * run + m];
+
+		if (radius && radius * radius < rr) {
+			run++;
+			break;
+		}
+	}
+
+	free(c);
+	free(mono);
+	return run;
+}
@@ -0,0 +1,204 @@
+""" render a morph between two attractors by blending their coefficients frame by frame
+
+    python py/animate.py SEED_A SEED_B --frames 240 --resolution 1920x1080 --outdir frames
+    ffmpeg -framerate 30 -pattern_type glob -i "frames/*.png" morph.mp4
+
+every frame is a linear blend (1 - t) * A + t * B of the two coefficient
+vectors. Rendering runs in two passes:
+
+    survey  frame by frame, each orbit starts where the previous frame's ended
+            and only re-settles for SETTLE steps instead of a full transient;
+            SAMPLE points of it give the frame's bounds and largest steps.
+            The frames are split into one run of consecutive frames per
+            worker, and only the first frame of a run starts cold
+    render  every frame iterates on from the state its survey ended in, in
+            parallel, scattered within bounds smoothed over SMOOTH frames so
+            the picture does not jump as the attractor changes
+
+frames whose orbit escapes are skipped, leaving a gap in the numbering
+"""
+import os
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import attractor
+from geometry import fit_aspect, get_dx
+from tonemap import tone_map, TONE_MAPS
+
+FRAMES = 120
+ITERATIONS = int(2e6)           # points scattered per frame
+SAMPLE = int(1e5)               # points per frame in the survey
+SETTLE = 1000                   # steps a warm started orbit takes to settle on the next frame's attractor
+TRANSIENT = int(1e4)            # steps of a cold start from the origin
+SMOOTH = 15                     # frames the bounds are averaged over
+RADIUS = 100                    # orbits leaving this radius have escaped
+
+
+def blend(a, b, frames):
+    """ coefficients of every frame, from a to b """
+    t = np.linspace(0, 1, frames)[:, None]
+    return (1 - t) * a + t * b
+
+
+def settle(coeff, state, steps):
+    """ state after steps from state, or None if the orbit escapes """
+    positions = attractor.iterate(state, coeff, steps, RADIUS)
+    return None if escaped(positions) else positions[-1].copy()
+
+
+def escaped(positions):
+    # an orbit leaving RADIUS stops and pads the rest of its output with RADIUS + 1
+    return not np.isfinite(positions[-1]).all() or np.abs(positions[-1]).max() > RADIUS
+
+
+def survey(coeffs, sample=SAMPLE, settle_steps=SETTLE, transient=TRANSIENT):
+    """ (min, max, steps, state) of consecutive frames, or None for those that escape
+
+    each frame starts from the state the previous one ended in, falling back
+    to a cold start from the origin if it has none or its orbit escapes
+    """
+    frames, state = [], None
+    for coeff in coeffs:
+        start = None if state is None else settle(coeff, state, settle_steps)
+        if start is None:
+            start = settle(coeff, (0, 0, 0), transient)
+
+        positions = None if start is None else attractor.iterate(start, coeff, sample, RADIUS)
+        if positions is None or escaped(positions):
+            frames.append(None)
+            continue
+
+        steps = [get_dx(positions[:, axis])[1] for axis in range(3)]
+        frames.append((positions.min(axis=0), positions.max(axis=0), steps, positions[-1].copy()))
+        state = positions[-1].copy()
+    return frames
+
+
+def smooth(values, window):
+    """ centred moving average over window frames of values (frames x k), ignoring rows of NaN """
+    valid = np.isfinite(values).all(axis=1)
+    kernel = np.ones(window)
+    sums = np.array([np.convolve(np.where(valid, column, 0), kernel, "same") for column in values.T]).T
+    counts = np.convolve(valid.astype(float), kernel, "same")[:, None]
+    return sums / np.maximum(counts, 1)
+
+
+def frame_bounds(lo, hi, axes, xres, yres):
+    """ (xmin, xrng, ymin, yrng, zmin, zrng) of a projection of the box lo..hi """
+    h, v, d = axes
+    xmin, ymin, xrng, yrng = fit_aspect(lo[h], hi[h] - lo[h], lo[v], hi[v] - lo[v], xres, yres)
+    return (xmin, xrng, ymin, yrng, lo[d], hi[d] - lo[d])
+
+
+def render_frame(path, coeff, state, bounds, steps, axes, iterations, alpha, xres, yres):
+    """ iterate on from state and save the frame, returning (seconds, escaped) """
+    start = time.time()
+    positions = attractor.iterate(state, coeff, iterations, RADIUS)
+    if escaped(positions):
+        return time.time() - start, True
+
+    raw = attractor.raw_buffer(1, yres, xres)
+    attractor.scatter_views(positions, [axes], [bounds], steps, raw, 1.0)
+    rgb = tone_map(raw[0], alpha, attractor.TONE_MAP, attractor.GAMMA)
+    Image.fromarray((np.clip(rgb, None, 1) * 255).astype(np.uint8)).save(path, compress_level=1)
+    return time.time() - start, False
+
+
+def animate(a, b, frames=FRAMES, plane="xy", iterations=ITERATIONS, alpha=0.025, xres=1920, yres=1080,
+            outdir="frames", workers=None, sample=SAMPLE, window=SMOOTH):
+    """ render the morph from coefficients a to b into outdir, returning the numbers of the frames saved """
+    if len(a) != len(b):
+        raise ValueError("Cannot blend maps with {} and {} coefficients".format(len(a), len(b)))
+    axes = dict(attractor.PROJECTIONS)[plane]
+    workers = min(workers or os.cpu_count(), frames)
+    coeffs = blend(np.asarray(a), np.asarray(b), frames)
+    os.makedirs(outdir, exist_ok=True)
+
+    with ProcessPoolExecutor(workers, initializer=attractor.init_worker,
+                             initargs=(attractor.worker_settings(workers),)) as pool:
+        start = time.time()
+        runs = np.array_split(np.arange(frames), workers)
+        surveyed = [frame for run in pool.map(survey, [coeffs[run] for run in runs], [sample] * workers)
+                    for frame in run]
+        escapes = [i for i, frame in enumerate(surveyed) if frame is None]
+        print("Surveyed {} frames | {} escaped | {:.2f} sec".format(frames, len(escapes), time.time()-start))
+        if len(escapes) == frames:
+            return []
+
+        # bounds and steps of escaped frames are NaN, so smooth skips them
+        nan = np.full(3, np.nan)
+        lo, hi, steps = (smooth(np.array([nan if frame is None else frame[k] for frame in surveyed]), window)
+                         for k in range(3))
+
+        start = time.time()
+        futures = {}
+        for i, frame in enumerate(surveyed):
+            if frame is None:
+                continue
+            path = os.path.join(outdir, "frame-{:05d}.png".format(i))
+            bounds = frame_bounds(lo[i], hi[i], axes, xres, yres)
+            futures[i] = pool.submit(render_frame, path, coeffs[i], frame[3], bounds, steps[i], axes,
+                                     iterations, alpha, xres, yres)
+
+        saved = []
+        for i, future in futures.items():
+            seconds, escape = future.result()
+            if escape:
+                escapes.append(i)
+                print("Frame {} | Skipped, orbit escaped | {:.2f} sec".format(i, seconds))
+            else:
+                saved.append(i)
+                print("Frame {} | Saved | {:.2f} sec".format(i, seconds))
+
+    end = time.time()
+    print("Saved: {} | Skipped: {} | {:.1f} sec | {:.2f} frames per second".format(
+        len(saved), len(escapes), end-start, len(saved)/(end-start)))
+    if escapes:
+        print("Escaped frames: " + " ".join(str(i) for i in sorted(escapes)))
+    return saved
+
+
+def main():
+    parser = ArgumentParser(description="Renders a morph between two attractors")
+    parser.add_argument("seeds", nargs=2, type=attractor.seed_check, metavar="SEED",
+            help="the first and last attractor, of the same mode")
+    parser.add_argument("--frames", dest="frames", action="store", type=int, default=FRAMES,
+            help="number of frames (default {})".format(FRAMES))
+    parser.add_argument("--iterations", dest="iterations", action="store", type=float, default=ITERATIONS,
+            help="points per frame (default {:.0e})".format(ITERATIONS))
+    parser.add_argument("--sample", dest="sample", action="store", type=float, default=SAMPLE,
+            help="points per frame used to find its bounds (default {:.0e})".format(SAMPLE))
+    parser.add_argument("--smooth", dest="smooth", action="store", type=int, default=SMOOTH,
+            help="frames the bounds are averaged over (default {})".format(SMOOTH))
+    parser.add_argument("--plane", dest="plane", action="store", choices=dict(attractor.PROJECTIONS), default="xy",
+            help="projection to render")
+    parser.add_argument("--resolution", dest="resolution", action="store", type=attractor.resolution,
+            default=(1920, 1080), metavar="WxH", help="frame size as WIDTHxHEIGHT (default 1920x1080)")
+    parser.add_argument("--alpha", dest="alpha", action="store", type=float, default=0.025,
+            help="brightness of a single point")
+    parser.add_argument("--tone-map", dest="tone_map", action="store", choices=TONE_MAPS, default=attractor.TONE_MAP,
+            help="how accumulated pixels are turned into colours")
+    parser.add_argument("--gamma", dest="gamma", action="store", type=float, default=attractor.GAMMA,
+            help="gamma applied after tone mapping")
+    parser.add_argument("--precision", dest="precision", action="store", choices=attractor.PRECISIONS,
+            default=attractor.PRECISION, help="element type of the accumulation buffers")
+    parser.add_argument("--workers", dest="workers", action="store", type=int,
+            help="render on this many processes (default all cores)")
+    parser.add_argument("--outdir", dest="outdir", action="store", default="frames",
+            help="directory to save the frames in (default frames)")
+    args = parser.parse_args()
+
+    if len(args.seeds[0]) != len(args.seeds[1]):
+        parser.error("both seeds must have the same length")
+    attractor.TONE_MAP, attractor.GAMMA, attractor.PRECISION = args.tone_map, args.gamma, args.precision
+    a, b = (attractor.coeff_from_str(seed) for seed in args.seeds)
+    animate(a, b, args.frames, args.plane, int(args.iterations), args.alpha, *args.resolution,
+            outdir=args.outdir, workers=args.workers, sample=int(args.sample), window=args.smooth)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,208 +1,484 @@
 from argparse import ArgumentParser, ArgumentTypeError
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import ExitStack
 from PIL import Image
 import numpy as np
 import ctypes
+import tempfile
 import time
+import sys
+import os
+
+# backends.py imports this module for its ctypes backend, which must be this copy when run as a script
+sys.modules.setdefault("attractor", sys.modules[__name__])
+
+import backends
+import kernels
+import tonemap
+from geometry import fit_aspect, get_minmax_rng, get_dx
+from trajectory import TrajectoryWriter, open_trajectory
+from tonemap import tone_map, decode, cache_path, save_accumulation, load_accumulation, TONE_MAPS
+from tonemap import image_limits, merge_limits, evict
+import strips
 
 MAX_ATTRACTORS = 1              # number of attractors to search for
- 
+BATCH_SIZE = 1024               # candidates evaluated together in batched search
+THREADS = os.cpu_count()        # threads used to accumulate pixels
+OUTDIR = "."                    # directory the images are saved in
+
 T_SEARCH = 2000                 # number of iterations to perform during search
 T_RENDER = int(10e6)            # number of iterations to perform during render
 T_IDX = int(0.01 * T_RENDER)    # first index after transient
+T_PREFIX = int(1e6)             # iterations used to estimate bounds when streaming
+STREAM_CHUNK = int(1e6)         # iterations per chunk when streaming
+LYAPUNOV_MIN = 0.005           # smallest Lyapunov exponent (bits/iteration) accepted as chaotic
+N_ORBITS = 64                   # independent orbits iterated concurrently in multi-orbit mode
+ORBIT_BLOCK = 4096              # steps every orbit advances between scatters in multi-orbit mode
+CHECKPOINT_INTERVAL = 600       # seconds between checkpoints of a long render
+MEMORY_BUDGET = 1024            # MB of memory used by out-of-core renders
+SPILL_BLOCK = 1 << 16           # points binned by strip at a time by out-of-core renders
+MAX_STRIPS = 512                # strips of an out-of-core render, each binned into a file kept open
+TURNTABLE_VIEWS = 72            # cameras of a turntable render, 5 degrees apart
  
 MODE = "Cubic"
+PRECISION = "double"            # element type of accumulation buffers (see PRECISIONS)
+SCATTER = "direct"              # how stored orbits are added to the image (see SCATTERS)
+TONE_MAP = "clip"               # how accumulated pixels become colours (see tonemap.py)
+GAMMA = 1.0
+MODES = {"Quadratic": 2, "Cubic": 3, "Quartic": 4}   # polynomial order of each mode
+
+SCATTERS = ("direct", "tiled")  # point by point, or sorted by image tile (faster for large images)
+
+# accumulation buffer element types and their format codes in helper.c
+# float halves the memory of double and is exact for pixel counts up to 2**24;
+# fixed stores weights with tonemap.FIXED_BITS fractional bits in a uint32,
+# also half of double, with an error below 2**-13 per point and saturating at
+# 2**20 points of full weight per pixel
+PRECISIONS = {"double": (np.float64, 0), "float": (np.float32, 1), "fixed": (np.uint32, 2)}
+
+# (plane, (horizontal, vertical, depth)) axes of each rendered projection
+PROJECTIONS = [("xy", (0, 1, 2)), ("xz", (0, 2, 1)), ("yz", (1, 2, 0))]
 
 
 """ import external C helper functions """
-dll = ctypes.cdll.LoadLibrary("./helper.so")
-c_iterator = dll.iterator
-c_sum_alpha = dll.sum_alpha
+# helper.so is built in the repository root (make), so it is found from any working directory
+dll = ctypes.cdll.LoadLibrary(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "helper.so"))
+
+# signatures are declared once at load. ndpointer arguments pass contiguous arrays
+# of the right type straight through (and reject anything else), so a call copies
+# nothing that is already float64/int32 and contiguous
+DOUBLES = np.ctypeslib.ndpointer(np.float64, flags="C_CONTIGUOUS")
+INTS = np.ctypeslib.ndpointer(np.int32, flags="C_CONTIGUOUS")
+LONGS = np.ctypeslib.ndpointer(np.int64, flags="C_CONTIGUOUS")
+# pixel offset and weights of a point in a view, struct tiled_point of helper.c
+RECORD = np.dtype([("offset", np.uint64), ("weights", np.float64, 3)])
+RECORDS = np.ctypeslib.ndpointer(RECORD, flags="C_CONTIGUOUS")
+c_int, c_double, c_void_p = ctypes.c_int, ctypes.c_double, ctypes.c_void_p
+
+def c_function(name, restype, *argtypes):
+    function = getattr(dll, name)
+    function.restype = restype
+    function.argtypes = argtypes
+    return function
+
+VIEWS = (c_int, INTS, DOUBLES, DOUBLES, c_double, c_int, c_int, c_int, c_int, c_void_p)
+c_iterator = c_function("iterator", None, DOUBLES, DOUBLES, c_int, c_double, DOUBLES)
+c_sum_alpha = c_function("sum_alpha_threaded", c_int, c_int, c_int, c_int, INTS, INTS,
+                         DOUBLES, DOUBLES, DOUBLES, DOUBLES, c_int)
+c_fill_density = c_function("fill_density", c_double, DOUBLES, c_int, c_int, c_double, c_int, c_int, c_double)
+c_fill_densities = c_function("fill_densities", c_int, DOUBLES, c_int, c_int, c_int, c_double, c_int, c_int, c_double,
+                              DOUBLES)
+c_accumulate = c_function("accumulate", None, DOUBLES, DOUBLES, c_int, *VIEWS)
+c_scatter_views = c_function("scatter_views_threaded", c_int, DOUBLES, c_int, *VIEWS, c_int)
+c_scatter_tiled = c_function("scatter_views_tiled", c_int, DOUBLES, c_int, *VIEWS, c_int)
+c_scatter_strip = c_function("scatter_strip", None, DOUBLES, c_int, *VIEWS, c_int, c_int, c_int)
+c_bin_strips = c_function("bin_strips", None, DOUBLES, c_int, c_int, INTS, DOUBLES, DOUBLES, c_double,
+                          c_int, c_int, c_int, c_int, LONGS, RECORDS)
+c_scatter_binned = c_function("scatter_binned", None, RECORDS, c_int, c_int, c_int, c_int, c_int, c_void_p,
+                              c_int, c_int, c_int)
+c_scatter_rotated = c_function("scatter_rotated", c_int, DOUBLES, c_int, c_int, DOUBLES, DOUBLES, DOUBLES, c_double,
+                               c_int, c_int, c_int, c_int, c_void_p, c_int)
+c_accumulate_orbits = c_function("accumulate_orbits", c_int, DOUBLES, c_int, DOUBLES, c_int, *VIEWS,
+                                 DOUBLES, c_int, c_int)
+c_lyapunov = c_function("lyapunov", None, DOUBLES, c_int, c_int, c_int, c_double, DOUBLES)
+
+def as_doubles(arr):
+    """ arr as a contiguous float64 array, copied only if it is not one already """
+    return np.ascontiguousarray(arr, dtype=np.float64)
+
+def as_ints(arr):
+    """ arr as a contiguous int32 array, copied only if it is not one already """
+    return np.ascontiguousarray(arr, dtype=np.int32)
+
+def buffer_address(out):
+    """ address of an output buffer, which C writes in place and so must not be a copy """
+    if not out.flags.c_contiguous or not out.flags.writeable:
+        raise ValueError("Output buffers must be writeable and C contiguous")
+    return out.ctypes.data
+
+def iterate(start, coeff, repeat, radius=0, out=None):
+    """ positions visited from start as a (repeat x 3) array, written into out if given
+
+    an orbit leaving radius stops early, leaving the rest of out untouched
+    (zeros when out is allocated here) except for a last value of radius + 1
+    """
+    if out is None:
+        out = np.zeros((repeat, 3))
+    elif out.shape != (repeat, 3):
+        raise ValueError("Expected an output of shape ({}, 3), got {}".format(repeat, out.shape))
+    buffer_address(out)
+
+    if len(coeff) != 60:
+        return kernel_iterate(start, coeff, repeat, radius, out)
+
+    c_iterator(as_doubles(start), as_doubles(coeff), repeat, radius, out)
+    return out
 
 def iterator(x, y, z, coeff, repeat, radius=0):
-    """ compute an array of positions visited by recurrence relation """
-    c_iterator.restype = ctypes.POINTER(ctypes.c_double * (3 * repeat))
-
-    start = to_double_ctype(np.array([x, y, z]))
-    coeff = to_double_ctype(coeff)
-    out = to_double_ctype(np.zeros(3 * repeat))
-
-    res = c_iterator(start, coeff, repeat, ctypes.c_double(radius), out).contents
-    return np.array(res).reshape((repeat, 3)).T
-
-def sum_alpha(yres, xres, Is, Js, rx, ry, rz):
-    """ compute the sum of zalpha values at each pixel """
-    c_sum_alpha.restype = ctypes.POINTER(ctypes.c_double * (yres * xres * 3))
-    size = len(Is)
-    
-    out = to_double_ctype(np.zeros(yres * xres * 3))
-    Is, Js = to_int_ctype(Is), to_int_ctype(Js)
-    rx = to_double_ctype(rx)
-    ry = to_double_ctype(ry)
-    rz = to_double_ctype(rz)
-
-    res = c_sum_alpha(yres, xres, size, Is, Js, rx, ry, rz, out).contents
-    return np.array(res).reshape((yres, xres, 3))
-
-def to_double_ctype(arr):
-    """ convert arr to a ctype array of doubles """
-    arr_type = ctypes.POINTER(ctypes.c_double * len(arr))
-    return arr.astype(np.float64).ctypes.data_as(arr_type)
-
-def to_int_ctype(arr):
-    """ convert arr to a ctype array of ints """
-    arr_type = ctypes.POINTER(ctypes.c_int32 * len(arr))
-    return arr.astype(np.int32).ctypes.data_as(arr_type)
+    """ compute an array of positions visited by recurrence relation, as rows x, y, z (a view) """
+    return iterate((x, y, z), coeff, repeat, radius).T
 
-def coeff_to_string(coeff):
-    """convert coefficients to alphabetical values (see Sprott)"""
-    att_string = "".join([chr(int((c + 7.7)*10)) for c in coeff])
-    return att_string
- 
-def pixel_density(xdata, ydata, coeff, xres=320, yres=180):
-    """ check for density of points in image """
- 
-    xmin, ymin, xrng, yrng = set_aspect(xdata, ydata, xres, yres)
-    render = np.zeros((yres, xres))
- 
-    try:
-        for x, y in zip(xdata, ydata):
-            J = get_index(x, xmin, xrng, xres)
-            I = get_index(y, ymin, yrng, yres)
-            render[I, J] += 1
-    except ValueError:
-        print("Invalid value (pixel density)")
-        return False
- 
-    return check_density(render, coeff)
-
-def check_density(render, coeff, min_fill=1.5):
-    """ check if pixel density exceeds threshold """
-    filled_pixels = np.count_nonzero(render)
-    fill_percentage = 100 * filled_pixels/np.size(render)
-   
-    if fill_percentage > min_fill:
-        print(coeff_to_string(coeff))
-        print("Non-zero points: {} ({:.2f}%)".format(filled_pixels, fill_percentage))
-        print("")
-        return True
-   
-    return False
-
-def set_aspect(xdata, ydata, width, height, debug=False, margin=1.1):
-    """ get boundaries for given aspect ratio w/h """
-    xmin, xrng = get_minmax_rng(xdata)
-    ymin, yrng = get_minmax_rng(ydata)
- 
-    if debug:
-        print("Data range | X: {:.2f} | Y: {:.2f} | Intrinsic aspect ratio: {:.2f}".format(xrng, yrng, xrng/yrng))
-   
-    xmid = xmin + xrng/2
-    ymid = ymin + yrng/2
- 
-    if xrng/yrng < width/height:
-        xrng = width/height * yrng
-    else:
-        yrng = height/width * xrng
- 
-    xrng *= margin
-    yrng *= margin
- 
-    xmin = xmid - xrng/2.
-    ymin = ymid - yrng/2
-    if debug:
-        print("Rescaled data range | X: {:.2f} | Y: {:.2f} | New aspect ratio: {:.2f}".format(xrng, yrng, xrng/yrng))
- 
-    return xmin, ymin, xrng, yrng
+def kernel_iterate(start, coeff, repeat, radius, out):
+    """ iterate for maps of any order into out, padding escaped orbits like helper.c """
+    order = next(order for order in MODES.values() if 3 * len(kernels.monomials(order, 3)) == len(coeff))
+    steps = len(kernels.load_kernel(order, 3)(start, coeff, repeat, radius, out=out))
+    out[steps:] = radius + 1
+    return out
 
-def get_minmax_rng(data):
-    max_val = data.max()
-    min_val = data.min()
-    data_range = max_val - min_val
- 
-    return min_val, data_range
+def sum_alpha(yres, xres, Is, Js, rx, ry, rz, threads=None, out=None):
+    """ compute the sum of zalpha values at each pixel, each thread taking a share of the points and a band of rows """
+    if out is None:
+        out = np.zeros((yres, xres, 3))
+    buffer_address(out)
 
-def get_index(x, xmin, xrng, xres):
-    """ map coordinate to array index """
-    return int((x-xmin) * (xres-1) / xrng)
- 
-def get_dx(xdata):
-    dx = abs(xdata - np.roll(xdata, 1))[1:]
-    mdx = np.amax(dx)
-    return dx, mdx
- 
-def zalpha(z, zmin, zrng, a_min=0):
-    """ return alpha based on z depth """
-    alpha = a_min + (1-a_min)*(z-zmin)/zrng
-    return alpha
+    if c_sum_alpha(yres, xres, len(Is), as_ints(Is), as_ints(Js),
+                   as_doubles(rx), as_doubles(ry), as_doubles(rz), out, threads or THREADS) < 0:
+        raise MemoryError("Could not allocate the buffers of sum_alpha")
+    return out
 
-def save_image(xdata, ydata, zdata, coeff, plane, alpha=0.025, xres=3200, yres=1800):
- 
-    start = time.time()
-    xmin, ymin, xrng, yrng = set_aspect(xdata, ydata, xres, yres, debug=True)
-    zmin, zrng = get_minmax_rng(zdata)
+def fill_density(coeff, repeat, radius, min_fill=1.5, xres=320, yres=180, nbounds=0):
+    """ percentage of pixels filled by the orbit (-1 if it escapes), computed in C
 
-    dxs, mdx = get_dx(xdata)
-    dys, mdy = get_dx(ydata)
-    dzs, mdz = get_dx(zdata)
- 
-    print("Calculating pixel values")
-        
-    xscaled = (xdata[1:]-xmin) * (xres-1) / xrng
-    yscaled = (ydata[1:]-ymin) * (yres-1) / yrng
+    bounds come from the first nbounds points (all of them if 0) and the count
+    stops early once the result relative to min_fill is decided, so it is only
+    a lower bound; with min_fill None the whole orbit is counted
+    """
+    min_fill = -1 if min_fill is None else min_fill
+    fill = c_fill_density(as_doubles(coeff), repeat, nbounds, radius, xres, yres, min_fill)
+    if fill == -2:
+        raise MemoryError("Could not allocate the bitmap of fill_density")
+    return fill
+
+def fill_densities(coeffs, repeat, radius, min_fill=1.5, xres=320, yres=180, nbounds=0):
+    """ fill_density of every row of coeffs (n x 60), in a single call """
+    min_fill = -1 if min_fill is None else min_fill
+    coeffs = as_doubles(coeffs).reshape(-1, 60)
+    out = np.zeros(len(coeffs))
+    if c_fill_densities(coeffs, len(coeffs), repeat, nbounds, radius, xres, yres, min_fill, out) < 0:
+        raise MemoryError("Could not allocate the bitmap of fill_densities")
+    return out
+
+def lyapunov(coeffs, repeat=T_SEARCH, transient=T_SEARCH//10, radius=10):
+    """ largest Lyapunov exponent (bits/iteration) of every row of coeffs, -inf if it escapes """
+    coeffs = as_doubles(coeffs).reshape(-1, 60)
+    out = np.zeros(len(coeffs))
+    c_lyapunov(coeffs, len(coeffs), repeat, transient, radius, out)
+    return out
+
+def cubic_only(coeff, name):
+    """ raise unless coeff is a cubic map, the only one helper.c iterates while scattering """
+    if len(coeff) != 60:
+        raise ValueError("{} only supports the cubic map (60 coefficients), got {}".format(name, len(coeff)))
+
+def view_arguments(axes, bounds, steps, out, alpha):
+    """ the arguments describing the views of out, shared by the scatter functions """
+    nviews, yres, xres, channels = out.shape
+    return (nviews, as_ints(np.ravel(axes)), as_doubles(np.ravel(bounds)), as_doubles(steps),
+            alpha, xres, yres, channels, buffer_format(out), buffer_address(out))
+
+def accumulate(state, coeff, repeat, axes, bounds, steps, out, alpha):
+    """ iterate from state (updated in place) and add the points into every view of out """
+    cubic_only(coeff, "accumulate")
+    buffer_address(state)
+    c_accumulate(state, as_doubles(coeff), repeat, *view_arguments(axes, bounds, steps, out, alpha))
+
+def scatter_views(positions, axes, bounds, steps, out, alpha, threads=None, scatter=None):
+    """ add stored positions (n x 3) into every view of out in a single pass
 
-    clip = np.logical_and(xscaled < xres, yscaled < yres)
-    xscaled = xscaled.astype(int)[clip]
-    yscaled = yscaled.astype(int)[clip]
-    
-    a_min = 0.25
-    zscaled = (zdata[1:]-zmin) * (1-a_min) / zrng + a_min
+    the tiled scatter sorts the points by image tile first, which pays off
+    once the image no longer fits in cache; both fill the same buffer
+    """
+    scatter = c_scatter_tiled if (scatter or SCATTER) == "tiled" else c_scatter_views
+    if scatter(as_doubles(positions), len(positions),
+               *view_arguments(axes, bounds, steps, out, alpha), threads or THREADS) < 0:
+        raise MemoryError("Could not allocate the buffers of scatter_views")
 
-    xpix = (1-dxs/mdx)*alpha*zscaled[clip]
-    ypix = (1-dys/mdy)*alpha*zscaled[clip]
-    zpix = (1-dzs/mdz)*alpha*zscaled[clip]
+def scatter_strip(positions, axes, bounds, steps, out, alpha, row0, yres, threads=None):
+    """ add stored positions (n x 3) into out, which holds the rows from row0 on of every view of a yres high image """
+    nviews, rows, xres, channels = out.shape
+    c_scatter_strip(as_doubles(positions), len(positions), nviews, as_ints(np.ravel(axes)),
+                    as_doubles(np.ravel(bounds)), as_doubles(steps), alpha, xres, yres, channels,
+                    buffer_format(out), buffer_address(out), row0, row0 + rows, threads or THREADS)
 
-    render = sum_alpha(yres, xres, yscaled, xscaled, xpix, ypix, zpix)
+def bin_strips(positions, axes, bounds, steps, alpha, xres, yres, rows, out):
+    """ pixel records (see RECORD) of positions (n x 3) in every view, sorted into strips of rows image rows
+
+    out holds (n - 1) records per view; returns the records written to it and
+    the start of every strip among them, with the end of the last strip
+    """
+    nviews = len(axes)
+    starts = np.empty(-(-yres // rows) + 1, dtype=np.int64)
+    c_bin_strips(as_doubles(positions), len(positions), nviews, as_ints(np.ravel(axes)),
+                 as_doubles(np.ravel(bounds)), as_doubles(steps), alpha, xres, yres, 4, rows, starts, out)
+    return out[:starts[-1]], starts
+
+def scatter_binned(records, out, row0, yres, threads=None):
+    """ add records of bin_strips into out, which holds the rows from row0 on of every view of a yres high image """
+    nviews, rows, xres, channels = out.shape
+    c_scatter_binned(records, len(records), xres, yres, channels, buffer_format(out), buffer_address(out),
+                     row0, row0 + rows, threads or THREADS)
+
+def scatter_rotated(positions, rotations, bounds, steps, out, alpha, threads=None):
+    """ add stored positions (n x 3) into every view of out, each seen through its own camera (3 x 3)
+
+    bounds and steps of every view are those of the rotated points (see rotated_bounds)
+    """
+    nviews, yres, xres, channels = out.shape
+    if c_scatter_rotated(as_doubles(positions), len(positions), nviews, as_doubles(np.ravel(rotations)),
+                         as_doubles(np.ravel(bounds)), as_doubles(np.ravel(steps)), alpha, xres, yres, channels,
+                         buffer_format(out), buffer_address(out), threads or THREADS) < 0:
+        raise MemoryError("Could not allocate the buffers of scatter_rotated")
+
+def orbit_work(n_orbits, block=ORBIT_BLOCK):
+    """ work buffer of accumulate_orbits, holding a block of steps of every orbit """
+    return np.empty((n_orbits, block + 1, 3))
+
+def accumulate_orbits(states, coeff, repeat, axes, bounds, steps, out, alpha, work=None, threads=None):
+    """ iterate every orbit in states (k x 3, updated in place) concurrently into out
+
+    the orbits advance a block at a time into work (see orbit_work), allocated
+    here unless given, so a render can allocate it once for all its calls
+    """
+    cubic_only(coeff, "accumulate_orbits")
+    buffer_address(states)
+    if work is None:
+        work = orbit_work(len(states))
+    elif work.ndim != 3 or work.shape[0] != len(states) or work.shape[2] != 3:
+        raise ValueError("Expected a work buffer of shape ({}, block + 1, 3), got {}".format(len(states), work.shape))
+    buffer_address(work)
+
+    if c_accumulate_orbits(states, len(states), as_doubles(coeff), repeat,
+                           *view_arguments(axes, bounds, steps, out, alpha), work, work.shape[1] - 1,
+                           threads or THREADS) < 0:
+        raise MemoryError("Could not allocate the threads of accumulate_orbits")
+
+def buffer_format(out):
+    """ helper.c format code of an accumulation buffer """
+    for dtype, code in PRECISIONS.values():
+        if out.dtype == dtype:
+            return code
+    raise ValueError("Unsupported accumulation buffer type {}".format(out.dtype))
+
+def raw_buffer(nviews, yres, xres):
+    """ zeroed raw accumulation buffers of every view, in the current PRECISION """
+    return np.zeros((nviews, yres, xres, 4), dtype=PRECISIONS[PRECISION][0])
+
+def coeff_to_string(coeff):
+    """convert coefficients to alphabetical values (see Sprott)"""
+    att_string = "".join([chr(int((c + 7.7)*10)) for c in coeff])
+    return att_string
+ 
+def save_render(render, coeff, plane):
     render = np.clip(render, None, 1)
+    fname = render_path(coeff_to_string(coeff), plane)
 
-    fname = "{}-{}K-{}.png".format(coeff_to_string(coeff), T_RENDER//1000, plane)
-    
     Image.fromarray((render * 255).astype(np.uint8)).save(fname, compress_level=1)
-    end = time.time()
     print("Saved " + fname)
-    print("{:.2f} sec".format(end-start))
 
 
+def render_path(seed, plane):
+    """ image of one projection of seed saved by save_render """
+    return os.path.join(OUTDIR, "{}-{}K-{}.png".format(seed, T_RENDER//1000, plane))
+
 def coeff_from_str(word):
     """convert alphabetical values to coefficients"""
     return np.array([(ord(c)-ord("A")-12)/10 for c in word.upper()])
 
-def search_attractors(max_attractors):
+def search_attractors(max_attractors, min_fill=1.5, lyapunov_min=LYAPUNOV_MIN):
     print("Searching for attractors | Mode: {}".format(MODE))
 
+    n_coeffs = 3 * len(kernels.monomials(MODES[MODE], 3))
     att_coeffs = []
-    n_attractors = 0
-    while n_attractors < max_attractors:
+    while len(att_coeffs) < max_attractors:
         # pick random coefficients in the range (-1.2,1.2)
-        if MODE == "Cubic":
-            coeff = np.random.randint(-12, 13, 60)/10
-            n_coeff = 20
-        else:
-            raise ValueError("Only 'Cubic' mode is currently supported")
+        coeff = np.random.randint(-12, 13, n_coeffs)/10
+        for _, fill_percentage, exponent in backends.search(coeff, min_fill, lyapunov_min):
+            print(coeff_to_string(coeff))
+            print("Fill: {:.2f}% | Lyapunov exponent: {:.3f}".format(fill_percentage, exponent))
+            print("")
+            att_coeffs.append(coeff)
+    print("")
+    return att_coeffs
 
-        x, y, z = 0, 0, 0
-        xl, yl, zl = iterator(x, y, z, coeff, T_SEARCH, 10)
-        
-        if zl[-1] <= 10:
-            if pixel_density(xl, yl, coeff):
-                att_coeffs.append(coeff)
-                n_attractors += 1
+def search_attractors_batched(max_attractors, batch_size=BATCH_SIZE, min_fill=1.5, lyapunov_min=LYAPUNOV_MIN):
+    print("Searching for attractors | Mode: {} | Batch size: {}".format(MODE, batch_size))
+
+    n_coeffs = 3 * len(kernels.monomials(MODES[MODE], 3))
+    att_coeffs = []
+    n_tested = 0
+    start = time.time()
+    while len(att_coeffs) < max_attractors:
+        coeffs = np.random.randint(-12, 13, (batch_size, n_coeffs))/10
+        n_tested += batch_size
+
+        for idx, fill_percentage, exponent in backends.search(coeffs, min_fill, lyapunov_min):
+            if len(att_coeffs) < max_attractors:
+                print(coeff_to_string(coeffs[idx]))
+                print("Fill: {:.2f}% | Lyapunov exponent: {:.3f}".format(fill_percentage, exponent))
+                print("")
+                att_coeffs.append(coeffs[idx])
+
+    end = time.time()
+    print("Tested {} candidates | {:.0f} candidates per second".format(n_tested, n_tested/(end-start)))
     print("")
     return att_coeffs
 
-def plot_attractors(att_coeffs):
+def candidate_coeffs(base_seed, first, count):
+    """ coefficients of candidates first..first+count-1 of the counter-based search, from one generator
+
+    candidate k takes doubles 60k..60k+59 of the Philox stream keyed by base_seed,
+    15 counter blocks of 4 doubles, so a batch is one draw from a generator
+    advanced to its first candidate and any candidate can be regenerated alone
+    """
+    bit_generator = np.random.Philox(key=base_seed).advance(15 * int(first))
+    draws = np.random.Generator(bit_generator).random((count, 60))
+    return (np.floor(25 * draws) - 12)/10
+
+def candidate_coeff(base_seed, candidate):
+    """ regenerate the coefficients of a candidate from its counter-based seed """
+    return candidate_coeffs(base_seed, candidate, 1)[0]
+
+def search_batch(base_seed, first, batch_size, min_fill=1.5, lyapunov_min=LYAPUNOV_MIN):
+    """ test candidates first..first+batch_size-1 with backends.search, return (candidate, fill, exponent) of hits """
+    coeffs = candidate_coeffs(base_seed, first, batch_size)
+    return [(first + idx, fill, l) for idx, fill, l in backends.search(coeffs, min_fill, lyapunov_min)]
+
+def search_parallel(max_attractors, workers=None, base_seed=None, batch_size=BATCH_SIZE, lyapunov_min=LYAPUNOV_MIN):
+    """ search on a pool of worker processes, yielding (candidate, coeff) as found """
+    workers = workers or os.cpu_count()
+    if base_seed is None:
+        base_seed = np.random.randint(1, 2**31)
+    print("Searching for attractors | Mode: {} | Workers: {} | Base seed: {}".format(MODE, workers, base_seed))
+    if MODE != "Cubic":
+        raise ValueError("Only 'Cubic' mode is currently supported")
+
+    n_found = 0
+    next_first = 0
+    start = time.time()
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        while n_found < max_attractors:
+            # keep a bounded number of batches in flight so hits stream back early
+            while len(pending) < 2 * workers:
+                pending.add(pool.submit(search_batch, base_seed, next_first, batch_size,
+                                        lyapunov_min=lyapunov_min))
+                next_first += batch_size
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for candidate, fill_percentage, exponent in future.result():
+                    if n_found == max_attractors:
+                        break
+                    coeff = candidate_coeff(base_seed, candidate)
+                    print("{} | Candidate: {} | Fill: {:.2f}% | Lyapunov exponent: {:.3f} | {:.2f} sec".format(
+                        coeff_to_string(coeff), candidate, fill_percentage, exponent, time.time()-start))
+                    n_found += 1
+                    yield candidate, coeff
+
+        for future in pending:
+            future.cancel()
+
+    end = time.time()
+    print("Tested ~{} candidates | {:.0f} candidates per second".format(next_first, next_first/(end-start)))
+    print("")
+
+def write_trajectory(coeff, path, seed=""):
+    """ iterate T_RENDER steps into a trajectory store at path, a chunk at a time """
+    xl, yl, zl = iterator(0, 0, 0, coeff, T_IDX)
+    state = (xl[-1], yl[-1], zl[-1])
+    if not np.isfinite(sum(state)):
+        return None
+
+    chunk = np.empty((min(STREAM_CHUNK, T_RENDER - T_IDX), 3))
+    with TrajectoryWriter(path, coeff, 3, seed or coeff_to_string(coeff), T_IDX) as writer:
+        done = 0
+        while done < T_RENDER - T_IDX:
+            repeat = min(STREAM_CHUNK, T_RENDER - T_IDX - done)
+            positions = iterate(state, coeff, repeat, out=chunk[:repeat])
+            writer.append(positions)
+            state = positions[-1].copy()
+            done += repeat
+    return open_trajectory(path)
+
+def render_trajectory(store, projections=PROJECTIONS, alpha=0.025, xres=3200, yres=1800, budget=None):
+    """ render every projection of a trajectory store, reading its points lazily a chunk at a time
+
+    with a memory budget (MB) the image is rendered out of core, see render_out_of_core
+    """
+    start = time.time()
+    ranges = list(zip(store.min, store.max - store.min))
+    bounds = projection_bounds(ranges, projections, xres, yres)
+    axes = [axes for plane, axes in projections]
+
+    key = render_key("trajectory", store.transient)
+    if budget:
+        render_out_of_core(lambda: store.chunks(STREAM_CHUNK, overlap=1), store.coeffs, store.seed,
+                           store.transient + len(store), key, bounds, store.steps, projections, alpha, xres, yres,
+                           budget)
+        end = time.time()
+        print("{:.2f} sec | {:.0f} points per second".format(end-start, len(store)/(end-start)))
+        return
+
+    raw = cached_views(store.seed, store.transient + len(store), key, projections, xres, yres)
+    if raw is None:
+        print("Calculating pixel values")
+        raw = raw_buffer(len(projections), yres, xres)
+        # consecutive chunks share a point so the step between them is drawn once
+        for chunk in store.chunks(STREAM_CHUNK, overlap=1):
+            scatter_views(chunk, axes, bounds, store.steps, raw, 1.0)
+
+    save_views(raw, store.coeffs, projections, alpha, key, store.seed, store.transient + len(store), xres, yres)
+
+    end = time.time()
+    print("{:.2f} sec | {:.0f} points per second".format(end-start, len(store)/(end-start)))
+
+def plot_attractors_stored(att_coeffs, directory, alpha=0.025, xres=3200, yres=1800, budget=None):
+    """ iterate each attractor into a trajectory store in directory, then render from the store """
+    os.makedirs(directory, exist_ok=True)
+    for i, coeff in enumerate(att_coeffs, 1):
+        seed = coeff_to_string(coeff)
+        print("\nAttractor: {} | {}/{}".format(seed, i, len(att_coeffs)))
+        path = os.path.join(directory, "{}-{}K.traj".format(seed, T_RENDER // 1000))
+
+        start = time.time()
+        store = write_trajectory(coeff, path, seed)
+        if store is None:
+            print("Error during calculation")
+            continue
+        end = time.time()
+        print("Saved {} | {:.1f} sec".format(path, end-start))
+
+        render_trajectory(store, alpha=alpha, xres=xres, yres=yres, budget=budget)
+
+def plot_attractors(att_coeffs, alpha=0.025, xres=3200, yres=1800):
     for i, coeff in enumerate(att_coeffs, 1):
      
         print("\nAttractor: {} | {}/{}".format(coeff_to_string(coeff), i, len(att_coeffs)))
+        raw = cached_views(coeff_to_string(coeff), T_RENDER, render_key("stored"), PROJECTIONS, xres, yres)
+        if raw is not None:
+            save_views(raw, coeff, PROJECTIONS, alpha, render_key("stored"), xres=xres, yres=yres)
+            continue
+
         print("Iterating {} steps".format(T_RENDER))
         start = time.time()
         
@@ -210,36 +486,693 @@ def plot_attractors(att_coeffs):
         xl, yl, zl = iterator(x, y, z, coeff, T_IDX)
         x, y, z = xl[-1], yl[-1], zl[-1]
         
-        if np.isnan(x+y+z):
+        if not np.isfinite(x+y+z):
             print("Error during calculation")
             continue
 
-        xl, yl, zl = iterator(x, y, z, coeff, T_RENDER - T_IDX)
+        positions = backends.iterate((x, y, z), coeff, T_RENDER - T_IDX)
         end = time.time()
         print("Finished iteration: {:.1f} sec | {} iterations per second".format((end-start), T_RENDER/(end-start)))
- 
-        save_image(xl[T_IDX:], yl[T_IDX:], zl[T_IDX:], coeff, plane="xy")
-        save_image(xl[T_IDX:], zl[T_IDX:], yl[T_IDX:], coeff, plane="xz")
-        save_image(yl[T_IDX:], zl[T_IDX:], xl[T_IDX:], coeff, plane="yz")
+
+        save_images(positions[T_IDX:], coeff, alpha=alpha, xres=xres, yres=yres)
+
+def render_key(mode, transient=None, **settings):
+    """ cache key of a render: everything besides seed, iterations, plane and resolution that changes its buffers
+
+    the bounds and steps are estimated from the orbit the same way for a given
+    mode and settings, so they follow from the key
+    """
+    return dict(settings, mode=mode, transient=T_IDX if transient is None else transient, precision=PRECISION)
+
+def cached_views(seed, iterations, key, projections, xres, yres):
+    """ raw buffers of every projection from the accumulation cache, or None unless all are cached """
+    views = [load_accumulation(cache_path(seed, iterations, plane, xres, yres, key)) for plane, _ in projections]
+    if any(view is None for view in views):
+        return None
+    print("Loaded cached accumulation")
+    return np.array(views)
+
+def save_views(raw, coeff, projections, alpha, key, seed=None, iterations=None, xres=3200, yres=1800):
+    """ cache the raw buffer of every projection if the cache is on, then tone map and save it """
+    seed = seed or coeff_to_string(coeff)
+    iterations = iterations or T_RENDER
+    for (plane, _), view in zip(projections, raw):
+        view = decode(view)
+        path = cache_path(seed, iterations, plane, xres, yres, key)
+        if path and not os.path.exists(path):
+            save_accumulation(path, view)
+        save_render(tone_map(view, alpha, TONE_MAP, GAMMA), coeff, plane)
+
+def view_bounds(positions, projections, xres, yres):
+    """ bounds of every projection and largest step per axis, from one pass per axis """
+    ranges = [get_minmax_rng(positions[:, axis]) for axis in range(3)]
+    steps = [get_dx(positions[:, axis])[1] for axis in range(3)]
+    return projection_bounds(ranges, projections, xres, yres), steps
+
+def projection_bounds(ranges, projections, xres, yres):
+    """ (xmin, xrng, ymin, yrng, zmin, zrng) of every projection from the (min, range) of each axis """
+    bounds = []
+    for plane, (h, v, d) in projections:
+        xmin, ymin, xrng, yrng = fit_aspect(*ranges[h], *ranges[v], xres, yres, debug=True)
+        bounds.append((xmin, xrng, ymin, yrng) + tuple(ranges[d]))
+    return bounds
+
+def save_images(positions, coeff, projections=PROJECTIONS, alpha=0.025, xres=3200, yres=1800):
+    """ render every projection of positions (n x 3) in a single traversal """
+    start = time.time()
+    bounds, steps = view_bounds(positions, projections, xres, yres)
+    axes = [axes for plane, axes in projections]
+
+    print("Calculating pixel values")
+    raw = raw_buffer(len(projections), yres, xres)
+    backends.accumulate(positions, axes, bounds, steps, raw, 1.0)
+    save_views(raw, coeff, projections, alpha, render_key("stored"), xres=xres, yres=yres)
+
+    end = time.time()
+    print("{:.2f} sec".format(end-start))
+
+def save_checkpoint(path, coeff, states, done, transient, bounds, steps, projections, raw):
+    """ write everything needed to resume a render, replacing path atomically """
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, coeff=coeff, states=states, done=done, transient=transient,
+             bounds=np.asarray(bounds), steps=np.asarray(steps),
+             planes=[plane for plane, _ in projections], axes=[axes for _, axes in projections], raw=raw)
+    os.replace(tmp, path)
+
+def load_checkpoint(path):
+    """ (coeff, states, done, transient, bounds, steps, projections, raw) saved by save_checkpoint """
+    data = np.load(path)
+    projections = [(str(plane), tuple(axes)) for plane, axes in zip(data["planes"], data["axes"].tolist())]
+    return (data["coeff"], data["states"].copy(), int(data["done"]), int(data["transient"]),
+            data["bounds"], data["steps"], projections, data["raw"].copy())
+
+def checkpoint_path(directory, coeff):
+    if directory is None:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, "{}.npz".format(coeff_to_string(coeff)))
+
+def render_orbits(coeff, states, done, total, transient, bounds, steps, projections, raw, checkpoint=None):
+    """ advance every orbit in states (k x 3, updated in place) from done to total steps into raw
+
+    with a checkpoint path the render state is saved there every CHECKPOINT_INTERVAL
+    seconds and at the end, so the render can be resumed by continue_render
+    """
+    axes = [axes for plane, axes in projections]
+    work = orbit_work(len(states)) if len(states) > 1 else None
+    saved = time.time()
+    while done < total:
+        repeat = min(STREAM_CHUNK, total - done)
+        if len(states) == 1:
+            accumulate(states[0], coeff, repeat, axes, bounds, steps, raw, 1.0)
+        else:
+            accumulate_orbits(states, coeff, repeat, axes, bounds, steps, raw, 1.0, work)
+        done += repeat
+
+        if checkpoint and (done == total or time.time() - saved > CHECKPOINT_INTERVAL):
+            save_checkpoint(checkpoint, coeff, states, done, transient, bounds, steps, projections, raw)
+            saved = time.time()
+    return done
+
+def continue_render(path, alpha=0.025):
+    """ resume the render checkpointed at path until T_RENDER iterations, adding to its buffer """
+    coeff, states, done, transient, bounds, steps, projections, raw = load_checkpoint(path)
+    total = (T_RENDER - transient) // len(states)
+    print("\nAttractor: {} | resuming {} orbit(s) at {} iterations".format(
+        coeff_to_string(coeff), len(states), transient + done * len(states)))
+
+    start = time.time()
+    if done < total:
+        before = done
+        done = render_orbits(coeff, states, done, total, transient, bounds, steps, projections, raw, path)
+        end = time.time()
+        print("{:.2f} sec | {:.0f} iterations per second".format(
+            end-start, (done-before)*len(states)/(end-start)))
+    else:
+        print("Checkpoint already has {} iterations".format(transient + done * len(states)))
+
+    _, yres, xres, _ = raw.shape
+    if len(states) == 1:
+        key = render_key("stream", transient, prefix=T_PREFIX)
+    else:
+        key = render_key("orbits", transient, prefix=T_PREFIX, orbits=len(states))
+    save_views(raw, coeff, projections, alpha, key, iterations=transient + done * len(states), xres=xres, yres=yres)
+
+def plot_attractors_streaming(att_coeffs, projections=PROJECTIONS, alpha=0.025, xres=3200, yres=1800, checkpoints=None):
+    """ render without storing the orbit, so memory does not grow with T_RENDER """
+    for i, coeff in enumerate(att_coeffs, 1):
+
+        print("\nAttractor: {} | {}/{}".format(coeff_to_string(coeff), i, len(att_coeffs)))
+        key = render_key("stream", prefix=T_PREFIX)
+        # a checkpointed render needs the orbit state, which the cache does not keep
+        raw = None if checkpoints else cached_views(coeff_to_string(coeff), T_RENDER, key, projections, xres, yres)
+        if raw is not None:
+            save_views(raw, coeff, projections, alpha, key, xres=xres, yres=yres)
+            continue
+
+        print("Streaming {} steps in chunks of {}".format(T_RENDER, STREAM_CHUNK))
+
+        xl, yl, zl = iterator(0, 0, 0, coeff, T_IDX)
+        start_state = np.array([xl[-1], yl[-1], zl[-1]])
+
+        if not np.isfinite(start_state.sum()):
+            print("Error during calculation")
+            continue
+
+        n_prefix = min(T_PREFIX, T_RENDER - T_IDX)
+        prefix = iterate(start_state, coeff, n_prefix)
+
+        start = time.time()
+        bounds, steps = view_bounds(prefix, projections, xres, yres)
+        raw = raw_buffer(len(projections), yres, xres)
+
+        done = render_orbits(coeff, start_state[None, :].copy(), 0, T_RENDER - T_IDX, T_IDX,
+                             bounds, steps, projections, raw, checkpoint_path(checkpoints, coeff))
+
+        save_views(raw, coeff, projections, alpha, key, xres=xres, yres=yres)
+        end = time.time()
+        print("{:.2f} sec | {:.0f} iterations per second".format(end-start, done/(end-start)))
+
+def orbit_chunks(coeff, state, repeat, chunk=STREAM_CHUNK):
+    """ the repeat points after state, chunk at a time, every chunk starting with the last point of the one before """
+    positions = np.empty((chunk + 1, 3))
+    positions[0] = state
+    done = 0
+    while done < repeat:
+        n = min(chunk, repeat - done)
+        iterate(positions[0].copy(), coeff, n, out=positions[1:n + 1])
+        yield positions[:n + 1]
+        positions[0] = positions[n]
+        done += n
+
+def render_out_of_core(chunks, coeff, seed, iterations, key, bounds, steps, projections, alpha, xres, yres, budget):
+    """ render an image larger than memory, using about budget MB
+
+    the raw buffer of every projection is a .npy file, in the accumulation cache
+    if it is on and in a temporary directory in OUTDIR otherwise, filled a strip
+    of rows at a time from the points of chunks() binned by strip in one pass
+    (see accumulate_strips), then tone mapped and written to a PNG a strip at a time
+    """
+    paths = [cache_path(seed, iterations, plane, xres, yres, key) for plane, _ in projections]
+    cached = None not in paths
+    with tempfile.TemporaryDirectory(dir=OUTDIR) as tmp:
+        if not cached:
+            paths = [os.path.join(tmp, plane + ".npy") for plane, _ in projections]
+
+        if cached and all(os.path.exists(path) for path in paths):
+            print("Loaded cached accumulation")
+            for path in paths:
+                os.utime(path)
+        else:
+            parts = [path[:-len(".npy")] + ".part.npy" for path in paths]
+            os.makedirs(os.path.dirname(paths[0]) or ".", exist_ok=True)
+            accumulate_strips(chunks, parts, [axes for _, axes in projections], bounds, steps, xres, yres, budget,
+                              tmp)
+            for part, path in zip(parts, paths):
+                os.replace(part, path)
+
+        for (plane, _), path in zip(projections, paths):
+            save_strips(path, seed, plane, alpha, xres, yres, budget)
+
+    if cached:
+        evict(os.path.dirname(paths[0]))
+
+def accumulate_strips(chunks, paths, axes, bounds, steps, xres, yres, budget, spill):
+    """ scatter the points of chunks() into new .npy buffers at paths, one per view, a strip of rows at a time
+
+    a single pass over the points bins their pixel records (32 bytes per point
+    and view) by strip into files in the directory spill, then every strip is
+    added from its own file, so the orbit is read once however many strips
+    there are
+    """
+    dtype = PRECISIONS[PRECISION][0]
+    # a strip of every view in memory and the pages of the files it is copied into, beside a block of records
+    row_bytes = 2 * len(paths) * xres * 4 * np.dtype(dtype).itemsize
+    fixed = SPILL_BLOCK * len(paths) * RECORD.itemsize
+    rows = strips.strip_rows(budget * 2**20, row_bytes, fixed)
+    if budget * 2**20 < fixed + row_bytes or -(-yres // rows) > MAX_STRIPS:
+        needed = fixed + row_bytes * -(-yres // MAX_STRIPS)
+        raise ValueError("A memory budget of {} MB is too small for {} views of {}x{}, at least {} MB are needed".format(
+                         budget, len(paths), xres, yres, -(-needed // 2**20)))
+    nstrips = -(-yres // rows)
+    print("Accumulating in strips of {} rows | {} strips".format(min(rows, yres), nstrips))
+
+    start = time.time()
+    spills = [os.path.join(spill, "strip{}.records".format(s)) for s in range(nstrips)]
+    records = np.empty(SPILL_BLOCK * len(paths), dtype=RECORD)
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(path, "wb")) for path in spills]
+        for chunk in chunks():
+            # consecutive blocks share a point, as the chunks do
+            for first in range(0, len(chunk) - 1, SPILL_BLOCK):
+                block = chunk[first:first + SPILL_BLOCK + 1]
+                binned, starts = bin_strips(block, axes, bounds, steps, 1.0, xres, yres, rows, records)
+                for s in np.flatnonzero(np.diff(starts)):
+                    binned[starts[s]:starts[s + 1]].tofile(files[s])
+    print("Binned the points | {:.2f} sec".format(time.time()-start))
+
+    for path in paths:
+        strips.create(path, dtype, (yres, xres, 4))
+    for spill_path, row0 in zip(spills, range(0, yres, rows)):
+        start = time.time()
+        row1 = min(row0 + rows, yres)
+        raw = np.zeros((len(paths), row1 - row0, xres, 4), dtype=dtype)
+        with open(spill_path, "rb") as f:
+            while True:
+                n = f.readinto(records.view(np.uint8)) // RECORD.itemsize
+                if n == 0:
+                    break
+                scatter_binned(records[:n], raw, row0, yres)
+        os.remove(spill_path)
+        for path, view in zip(paths, raw):
+            out = strips.strip(path, row0, row1, "r+")
+            out[:] = view
+            out.flush()
+            del out
+        del raw
+        print("Rows {}-{} of {} | {:.2f} sec".format(row0, row1, yres, time.time()-start))
+
+def save_strips(path, seed, plane, alpha, xres, yres, budget):
+    """ tone map the .npy buffer at path and save it as a PNG, a strip of rows at a time """
+    itemsize = np.load(path, mmap_mode="r").dtype.itemsize
+    # a mapped strip, its float32 copy and the temporaries of tone_map
+    rows = strips.strip_rows(budget * 2**20, xres * (4 * itemsize + 96))
+
+    # tone maps other than clip normalise by values of the whole image
+    limits = None
+    if TONE_MAP != "clip":
+        for row0 in range(0, yres, rows):
+            limits = merge_limits(limits, image_limits(strips.strip(path, row0, min(row0 + rows, yres)),
+                                                       alpha, TONE_MAP))
+
+    fname = render_path(seed, plane)
+    with strips.PNGWriter(fname, xres, yres) as png:
+        for row0 in range(0, yres, rows):
+            rgb = tone_map(strips.strip(path, row0, min(row0 + rows, yres)), alpha, TONE_MAP, GAMMA, limits)
+            png.write((np.clip(rgb, None, 1) * 255).astype(np.uint8))
+    print("Saved " + fname)
+
+def plot_attractors_out_of_core(att_coeffs, projections=PROJECTIONS, alpha=0.025, xres=3200, yres=1800,
+                                budget=MEMORY_BUDGET):
+    """ render images too large for memory without storing the orbit, see render_out_of_core """
+    for i, coeff in enumerate(att_coeffs, 1):
+
+        seed = coeff_to_string(coeff)
+        print("\nAttractor: {} | {}/{}".format(seed, i, len(att_coeffs)))
+
+        xl, yl, zl = iterator(0, 0, 0, coeff, T_IDX)
+        start_state = np.array([xl[-1], yl[-1], zl[-1]])
+        if not np.isfinite(start_state.sum()):
+            print("Error during calculation")
+            continue
+
+        n_prefix = min(T_PREFIX, T_RENDER - T_IDX)
+        prefix = iterate(start_state, coeff, n_prefix)
+
+        start = time.time()
+        bounds, steps = view_bounds(prefix, projections, xres, yres)
+        render_out_of_core(lambda: orbit_chunks(coeff, start_state, T_RENDER - T_IDX), coeff, seed, T_RENDER,
+                           render_key("out-of-core", prefix=T_PREFIX), bounds, steps, projections, alpha,
+                           xres, yres, budget)
+        end = time.time()
+        print("{:.2f} sec".format(end-start))
+
+def warm_orbits(coeff, reference, n_orbits, transient, sample=10000, tol=0.05):
+    """ start n_orbits near the reference orbit, warm them up and keep those on the same attractor
+
+    each start is a random reference point displaced by 1% of the attractor size. After its own
+    transient, an orbit is kept if the bounding box of its next `sample` points matches the
+    reference box to within tol of the attractor size in every axis
+    """
+    lo, hi = reference.min(axis=0), reference.max(axis=0)
+    size = hi - lo
+    picks = reference[np.random.randint(len(reference), size=n_orbits)]
+    starts = picks + np.random.normal(scale=0.01, size=(n_orbits, 3)) * size
+
+    states = []
+    for x, y, z in starts:
+        xl, yl, zl = iterator(x, y, z, coeff, transient)
+        if not np.isfinite(xl[-1] + yl[-1] + zl[-1]):
+            continue
+        orbit = iterate((xl[-1], yl[-1], zl[-1]), coeff, sample)
+        if not np.isfinite(orbit).all():
+            continue
+        if (abs(orbit.min(axis=0) - lo) < tol * size).all() and (abs(orbit.max(axis=0) - hi) < tol * size).all():
+            states.append(orbit[-1])
+    return np.array(states)
+
+def plot_attractors_orbits(att_coeffs, n_orbits=N_ORBITS, projections=PROJECTIONS, alpha=0.025, xres=3200, yres=1800,
+                           checkpoints=None):
+    """ render by iterating many independent orbits in parallel, splitting T_RENDER between them """
+    for i, coeff in enumerate(att_coeffs, 1):
+
+        print("\nAttractor: {} | {}/{}".format(coeff_to_string(coeff), i, len(att_coeffs)))
+        key = render_key("orbits", prefix=T_PREFIX, orbits=n_orbits)
+        # a checkpointed render needs the orbit state, which the cache does not keep
+        raw = None if checkpoints else cached_views(coeff_to_string(coeff), T_RENDER, key, projections, xres, yres)
+        if raw is not None:
+            save_views(raw, coeff, projections, alpha, key, xres=xres, yres=yres)
+            continue
+
+        xl, yl, zl = iterator(0, 0, 0, coeff, T_IDX)
+        if not np.isfinite(xl[-1] + yl[-1] + zl[-1]):
+            print("Error during calculation")
+            continue
+
+        n_prefix = min(T_PREFIX, T_RENDER - T_IDX)
+        prefix = iterate((xl[-1], yl[-1], zl[-1]), coeff, n_prefix)
+
+        start = time.time()
+        states = warm_orbits(coeff, prefix, n_orbits, T_IDX)
+        if len(states) == 0:
+            print("No orbit settled on the attractor")
+            continue
+        print("Warmed up {}/{} orbits | {:.2f} sec".format(len(states), n_orbits, time.time()-start))
+
+        bounds, steps = view_bounds(prefix, projections, xres, yres)
+        raw = raw_buffer(len(projections), yres, xres)
+
+        done = render_orbits(coeff, states, 0, (T_RENDER - T_IDX) // len(states), T_IDX,
+                             bounds, steps, projections, raw, checkpoint_path(checkpoints, coeff))
+
+        save_views(raw, coeff, projections, alpha, key, xres=xres, yres=yres)
+        end = time.time()
+        print("{:.2f} sec | {:.0f} iterations per second".format(end-start, done*len(states)/(end-start)))
+
+def camera(azimuth, elevation=0):
+    """ camera turned azimuth degrees about the z axis and tilted elevation degrees down onto the attractor
+
+    its rows are the horizontal, vertical and depth axes of the view; camera(0) is the xz projection
+    """
+    a, e = np.radians(azimuth), np.radians(elevation)
+    h = np.array([np.cos(a), np.sin(a), 0])
+    d = np.array([-np.sin(a), np.cos(a), 0])
+    v = np.array([0, 0, 1.0])
+    return np.array([h, np.cos(e) * v - np.sin(e) * d, np.sin(e) * v + np.cos(e) * d])
+
+def rotated_bounds(positions, rotations, xres, yres, sample=int(1e5)):
+    """ bounds and largest steps of every camera, from sample points spread over positions and its first sample steps
+
+    every view is centred on the centre of the attractor and has the scale of
+    the widest, so a turning camera neither drifts nor zooms
+    """
+    spread = positions[::max(1, len(positions) // sample)]
+    deltas = np.diff(positions[:sample + 1], axis=0)
+    centre = (spread.min(axis=0) + spread.max(axis=0)) / 2
+
+    rotated = [spread @ rotation.T for rotation in rotations]
+    mids = [rotation @ centre for rotation in rotations]
+    half = np.max([np.abs(q - mid).max(axis=0) for q, mid in zip(rotated, mids)], axis=0)
+
+    bounds, steps = [], []
+    for rotation, q, mid in zip(rotations, rotated, mids):
+        xmin, ymin, xrng, yrng = fit_aspect(mid[0] - half[0], 2 * half[0], mid[1] - half[1], 2 * half[1], xres, yres)
+        zmin, zrng = get_minmax_rng(q[:, 2])
+        bounds.append((xmin, xrng, ymin, yrng, zmin, zrng))
+        steps.append(np.abs(deltas @ rotation.T).max(axis=0))
+    return bounds, steps
+
+def plot_attractors_turntable(att_coeffs, views=TURNTABLE_VIEWS, elevation=0, alpha=0.025, xres=3200, yres=1800,
+                              budget=MEMORY_BUDGET):
+    """ render views cameras turning once about the z axis, without storing the orbit
+
+    as many views as fit in budget MB are rendered together, the orbit being
+    iterated once for all of them and every chunk of it scattered into each;
+    the views are saved as turnNNN images
+    """
+    rotations = [camera(360 * i / views, elevation) for i in range(views)]
+    group = max(1, budget * 2**20 // (yres * xres * 4 * np.dtype(PRECISIONS[PRECISION][0]).itemsize))
+
+    for i, coeff in enumerate(att_coeffs, 1):
+
+        print("\nAttractor: {} | {}/{}".format(coeff_to_string(coeff), i, len(att_coeffs)))
+        xl, yl, zl = iterator(0, 0, 0, coeff, T_IDX)
+        start_state = np.array([xl[-1], yl[-1], zl[-1]])
+        if not np.isfinite(start_state.sum()):
+            print("Error during calculation")
+            continue
+
+        start = time.time()
+        prefix = iterate(start_state, coeff, min(T_PREFIX, T_RENDER - T_IDX))
+        bounds, steps = rotated_bounds(prefix, rotations, xres, yres)
+        for first in range(0, views, group):
+            last = min(first + group, views)
+            print("Streaming {} steps into views {}-{} of {}".format(T_RENDER, first, last, views))
+            raw = raw_buffer(last - first, yres, xres)
+            for chunk in orbit_chunks(coeff, start_state, T_RENDER - T_IDX):
+                scatter_rotated(chunk, rotations[first:last], bounds[first:last], steps[first:last], raw, 1.0)
+            for view, raw_view in enumerate(raw, first):
+                save_render(tone_map(raw_view, alpha, TONE_MAP, GAMMA), coeff, "turn{:03d}".format(view))
+            del raw
+
+        end = time.time()
+        print("{} views in {} passes | {:.2f} sec".format(views, -(-views // group), end-start))
 
 def seed_check(seed):
     symbols_valid = all(ord("A") <= ord(c) <= ord("Y") for c in seed.upper())
-    if symbols_valid and len(seed) == 60:
+    lengths = [3 * len(kernels.monomials(order, 3)) for order in MODES.values()]
+    if symbols_valid and len(seed) in lengths:
         return seed
-    raise ArgumentTypeError("Seed must contain exactly 60 characters in range A-Y inclusive")
+    raise ArgumentTypeError("Seed must contain {} characters in range A-Y inclusive".format(
+        " or ".join(map(str, lengths))))
+
+def resolution(text):
+    try:
+        xres, yres = (int(n) for n in text.lower().split("x"))
+    except ValueError:
+        raise ArgumentTypeError("expected WIDTHxHEIGHT, got '{}'".format(text))
+    return xres, yres
+
+def read_seeds(path):
+    """ seeds listed one per line in path ("-" for stdin), ignoring blank lines and # comments """
+    with (sys.stdin if path == "-" else open(path)) as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if line:
+                yield line.upper()
+
+def worker_settings(workers):
+    """ settings of this process passed to init_worker, the workers sharing the cores """
+    return (PRECISION, SCATTER, TONE_MAP, GAMMA, T_RENDER, T_IDX, OUTDIR, max(1, THREADS // workers),
+            tonemap.CACHE_DIR, tonemap.CACHE_LIMIT)
+
+def init_worker(settings):
+    """ give a batch worker the settings of the parent, and silence its progress output """
+    global PRECISION, SCATTER, TONE_MAP, GAMMA, T_RENDER, T_IDX, OUTDIR, THREADS
+    (PRECISION, SCATTER, TONE_MAP, GAMMA, T_RENDER, T_IDX, OUTDIR, THREADS,
+     tonemap.CACHE_DIR, tonemap.CACHE_LIMIT) = settings
+    sys.stdout = open(os.devnull, "w")
+
+def render_options(args):
+    """ the keyword arguments of render_attractors given on the command line """
+    return dict(alpha=args.alpha, resolution=args.resolution, trajectories=args.save_trajectory,
+                turntable=args.turntable, elevation=args.elevation, memory=args.memory, orbits=args.orbits,
+                stream=args.stream, checkpoints=args.checkpoint)
+
+def render_attractors(att_coeffs, alpha=0.025, resolution=(3200, 1800), trajectories=None, turntable=None,
+                      elevation=0, memory=None, orbits=None, stream=False, checkpoints=None):
+    """ render att_coeffs the way the options of render_options ask for """
+    xres, yres = resolution
+    if trajectories:
+        plot_attractors_stored(att_coeffs, trajectories, alpha, xres, yres, memory)
+    elif turntable:
+        plot_attractors_turntable(att_coeffs, turntable, elevation, alpha, xres, yres, memory or MEMORY_BUDGET)
+    elif memory:
+        plot_attractors_out_of_core(att_coeffs, alpha=alpha, xres=xres, yres=yres, budget=memory)
+    elif orbits:
+        plot_attractors_orbits(att_coeffs, orbits, alpha=alpha, xres=xres, yres=yres, checkpoints=checkpoints)
+    elif stream:
+        plot_attractors_streaming(att_coeffs, alpha=alpha, xres=xres, yres=yres, checkpoints=checkpoints)
+    else:
+        plot_attractors(att_coeffs, alpha, xres, yres)
+
+def already_rendered(seed, options):
+    """ whether render_attractors has saved every image of seed with these options """
+    if options.get("turntable"):
+        planes = ["turn{:03d}".format(view) for view in range(options["turntable"])]
+    else:
+        planes = [plane for plane, _ in PROJECTIONS]
+    return all(os.path.exists(render_path(seed, plane)) for plane in planes)
+
+def render_seed(seed, options):
+    """ render seed with render_attractors in a batch worker, returning (seconds, error or None) """
+    start = time.time()
+    try:
+        render_attractors([coeff_from_str(seed)], **options)
+    except Exception as e:
+        return time.time() - start, "{}: {}".format(type(e).__name__, e)
+    if not already_rendered(seed, options):
+        return time.time() - start, "orbit escaped"
+    return time.time() - start, None
+
+def render_batch(seeds, workers=None, options=None):
+    """ render a stream of seeds on a pool of worker processes, skipping those already rendered
+
+    every seed is rendered by render_attractors with options (see render_options)
+
+    the pool is started once, so every seed costs its render only and not the
+    start up of a process loading numpy, PIL and helper.so
+    """
+    workers = workers or os.cpu_count()
+    options = options or {}
+    settings = worker_settings(workers)
+    print("Rendering seeds | Workers: {} | Output: {}".format(workers, OUTDIR))
+
+    rendered, skipped, failed = 0, 0, 0
+    start = time.time()
+    seeds = iter(seeds)
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(settings,)) as pool:
+        pending = {}
+        while True:
+            # keep a bounded number of seeds in flight so long lists stream instead of queueing
+            for seed in seeds:
+                try:
+                    seed_check(seed)
+                except ArgumentTypeError as e:
+                    print("{} | Failed: {}".format(seed, e))
+                    failed += 1
+                    continue
+                seed = coeff_to_string(coeff_from_str(seed))
+                if len(seed) != 60 and (options.get("stream") or options.get("orbits")):
+                    print("{} | Failed: --stream and --orbits only support the cubic map".format(seed))
+                    failed += 1
+                    continue
+                if already_rendered(seed, options):
+                    print("{} | Skipped, already rendered".format(seed))
+                    skipped += 1
+                    continue
+                pending[pool.submit(render_seed, seed, options)] = seed
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                seed = pending.pop(future)
+                seconds, error = future.result()
+                if error:
+                    print("{} | Failed: {} | {:.2f} sec".format(seed, error, seconds))
+                    failed += 1
+                else:
+                    print("{} | Rendered | {:.2f} sec".format(seed, seconds))
+                    rendered += 1
+
+    end = time.time()
+    print("Rendered: {} | Skipped: {} | Failed: {} | {:.1f} sec | {:.2f} seeds per second".format(
+        rendered, skipped, failed, end-start, rendered/(end-start)))
+    return failed == 0
 
 def main():
+    global MODE, PRECISION, SCATTER, TONE_MAP, GAMMA, T_RENDER, T_IDX, OUTDIR
     parser = ArgumentParser(description="Plots strange attractors")
     parser.add_argument("--seed", dest="seed", action="store", nargs=1, type=seed_check,
             help="an alphabetical seed representing the coefficients of the attractor")
+    parser.add_argument("--seeds", dest="seeds", action="store", metavar="FILE",
+            help="render every seed listed in FILE (- for stdin) on --workers processes, skipping rendered ones")
+    parser.add_argument("--outdir", dest="outdir", action="store", default=OUTDIR,
+            help="directory to save images in (default the working directory)")
+    parser.add_argument("--mode", dest="mode", action="store", choices=MODES, default=MODE,
+            help="polynomial map to search, other than cubic maps use a generated kernel")
+    parser.add_argument("--trajectory", dest="trajectory", action="store", nargs="+",
+            help="render trajectory stores instead of searching")
+    parser.add_argument("--save-trajectory", dest="save_trajectory", action="store", metavar="DIR",
+            help="store each orbit in DIR before rendering it, for rendering again later")
+    parser.add_argument("--alpha", dest="alpha", action="store", type=float, default=0.025,
+            help="brightness of a single point; with --cache, changing it reuses the cached accumulation")
+    parser.add_argument("--cache", dest="cache", action="store", metavar="DIR", default=tonemap.CACHE_DIR,
+            help="cache the raw pixel sums of every render in DIR, so --alpha, --tone-map and --gamma can be "
+                 "changed without iterating again (default off, or $ATTRACTOR_ACCUMULATION_CACHE)")
+    parser.add_argument("--cache-limit", dest="cache_limit", action="store", type=int, default=tonemap.CACHE_LIMIT,
+            metavar="MB", help="delete the least recently used cached buffers beyond this size "
+                               "(default {})".format(tonemap.CACHE_LIMIT))
+    parser.add_argument("--tone-map", dest="tone_map", action="store", choices=TONE_MAPS, default=TONE_MAP,
+            help="how accumulated pixels are turned into colours")
+    parser.add_argument("--gamma", dest="gamma", action="store", type=float, default=GAMMA,
+            help="gamma applied after tone mapping")
+    parser.add_argument("--iterations", dest="iterations", action="store", type=int,
+            help="number of iterations to render (default {})".format(T_RENDER))
+    parser.add_argument("--checkpoint", dest="checkpoint", action="store", metavar="DIR",
+            help="save the state of --stream and --orbits renders in DIR so they can be continued")
+    parser.add_argument("--continue", dest="resume", action="store", nargs="+", metavar="CHECKPOINT",
+            help="continue checkpointed renders until --iterations, adding to their pixels")
+    parser.add_argument("--precision", dest="precision", action="store", choices=PRECISIONS, default=PRECISION,
+            help="element type of the accumulation buffers, float and fixed use half the memory")
+    parser.add_argument("--scatter", dest="scatter", action="store", choices=SCATTERS, default=SCATTER,
+            help="tiled sorts points by image tile before adding them, faster for large images")
+    parser.add_argument("--resolution", dest="resolution", action="store", type=resolution, default=(3200, 1800), metavar="WxH",
+            help="image size as WIDTHxHEIGHT (default 3200x1800)")
+    parser.add_argument("--memory", dest="memory", action="store", type=int, nargs="?", const=MEMORY_BUDGET, metavar="MB",
+            help="render out of core, keeping the image and the points binned by strip (32 bytes per point "
+                 "and view) on disk and using about this many MB (default {}), for images too large for "
+                 "memory".format(MEMORY_BUDGET))
+    parser.add_argument("--turntable", dest="turntable", action="store", type=int, nargs="?", const=TURNTABLE_VIEWS,
+            metavar="VIEWS", help="render this many views (default {}) from cameras turning about the z axis, "
+                                  "as many per pass over the orbit as fit in --memory".format(TURNTABLE_VIEWS))
+    parser.add_argument("--elevation", dest="elevation", action="store", type=float, default=0,
+            help="degrees the --turntable cameras look down onto the attractor")
+    parser.add_argument("--stream", dest="stream", action="store_true",
+            help="render without keeping the orbit in memory")
+    parser.add_argument("--orbits", dest="orbits", action="store", type=int,
+            help="render by iterating this many orbits concurrently")
+    parser.add_argument("--batch", dest="batch", action="store_true",
+            help="search by testing batches of candidates in single calls to the search backend (see backends.py)")
+    parser.add_argument("--workers", dest="workers", action="store", type=int,
+            help="search or render --seeds in parallel on this many worker processes (0 for all cores)")
+    parser.add_argument("--max-attractors", dest="max_attractors", action="store", type=int,
+            default=MAX_ATTRACTORS, help="number of attractors to search for")
+    parser.add_argument("--base-seed", dest="base_seed", action="store", type=int,
+            help="base seed of the parallel search (random if omitted)")
+    parser.add_argument("--lyapunov-min", dest="lyapunov_min", action="store", type=float,
+            default=LYAPUNOV_MIN, help="reject candidates with a smaller Lyapunov exponent (bits/iteration)")
+    parser.add_argument("--candidate", dest="candidate", action="store", type=int,
+            help="regenerate a candidate found by the parallel search (needs --base-seed)")
     args = parser.parse_args()
 
+    MODE = args.mode
+    TONE_MAP, GAMMA, PRECISION, SCATTER = args.tone_map, args.gamma, args.precision, args.scatter
+    OUTDIR = args.outdir
+    os.makedirs(OUTDIR, exist_ok=True)
+    tonemap.CACHE_DIR, tonemap.CACHE_LIMIT = args.cache, args.cache_limit
+    if args.iterations:
+        T_RENDER, T_IDX = args.iterations, int(0.01 * args.iterations)
+    if args.seed:
+        MODE = next(mode for mode, order in MODES.items() if 3 * len(kernels.monomials(order, 3)) == len(args.seed[0]))
+    if MODE != "Cubic" and (args.stream or args.orbits):
+        parser.error("--stream and --orbits only support the cubic map")
+    xres, yres = args.resolution
+
+    if args.seeds:
+        if not render_batch(read_seeds(args.seeds), args.workers, render_options(args)):
+            sys.exit(1)
+        return
+
+    if args.resume:
+        for path in args.resume:
+            continue_render(path, args.alpha)
+        return
+
+    if args.trajectory:
+        for path in args.trajectory:
+            print("\nTrajectory: {}".format(path))
+            render_trajectory(open_trajectory(path), alpha=args.alpha, xres=xres, yres=yres, budget=args.memory)
+        return
+
     if args.seed:
         att_coeffs = [coeff_from_str(args.seed[0])]
+    elif args.candidate is not None:
+        if args.base_seed is None:
+            parser.error("--candidate requires --base-seed")
+        att_coeffs = [candidate_coeff(args.base_seed, args.candidate)]
+    elif args.workers is not None:
+        att_coeffs = [coeff for _, coeff in search_parallel(
+            args.max_attractors, args.workers, args.base_seed, lyapunov_min=args.lyapunov_min)]
+    elif args.batch:
+        att_coeffs = search_attractors_batched(args.max_attractors, lyapunov_min=args.lyapunov_min)
     else:
-        att_coeffs = search_attractors(MAX_ATTRACTORS)
+        att_coeffs = search_attractors(args.max_attractors, lyapunov_min=args.lyapunov_min)
 
-    plot_attractors(att_coeffs)
+    render_attractors(att_coeffs, **render_options(args))
      
 
 if __name__ == "__main__":
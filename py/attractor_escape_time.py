@@ -3,6 +3,8 @@ import matplotlib.pyplot as plt
 import numpy as np 
 import colorsys
 import time
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 def iterator(x,y,coeff):
 
@@ -51,7 +53,38 @@ def find_coeffs(low_iters, high_iters, radius, max_attractors = 1):
 
 	return att_coeffs,esc_iters
 
-def render_basins(coeff, xres, yres, xmin, xmax, max_iters, radius):
+def iterate_tile(x, y, coeff, max_iters, radius):
+	""" escape time and final position of every start point in x,y (modified in place) """
+
+	xc = coeff[0:6]
+	yc = coeff[6:12]
+
+	iters = np.zeros(x.shape)
+	active = np.flatnonzero(x*x + y*y < radius*radius)
+	xa = x.flat[active]
+	ya = y.flat[active]
+
+	with np.errstate(over='ignore', invalid='ignore'):
+		for i in range(max_iters):
+			if len(active) == 0:
+				break
+
+			xy = [1, xa, ya, xa*ya, xa**2, ya**2]
+			xa, ya = sum(c*t for c, t in zip(xc, xy)), sum(c*t for c, t in zip(yc, xy))
+
+			iters.flat[active] += 1
+			x.flat[active] = xa
+			y.flat[active] = ya
+
+			# drop escaped points from the working set
+			keep = xa*xa + ya*ya < radius*radius
+			active = active[keep]
+			xa = xa[keep]
+			ya = ya[keep]
+
+	return iters
+
+def render_basins(coeff, xres, yres, xmin, xmax, max_iters, radius, tile_rows=64, threads=None):
 
 	start = time.time()
 
@@ -66,22 +99,21 @@ def render_basins(coeff, xres, yres, xmin, xmax, max_iters, radius):
 
 	render = np.zeros((yres,xres,3))
 
-	for X in range(xres):
-		for Y in range(yres):
-			x = xmin + xrng * X/xres
-			y = ymin + yrng * Y/yres		
-
-			rr = x*x + y*y
-			i = 0
-
-			while rr < radius*radius and i < max_iters:
-				x,y = iterator(x,y,coeff)
-				rr = x*x + y*y
-				i += 1
-
-			render[Y,X,0] = i
-			render[Y,X,1] = abs(x)
-			render[Y,X,2] = abs(y)
+	X, Y = np.meshgrid(np.arange(xres), np.arange(yres))
+	x = xmin + xrng * X/xres
+	y = ymin + yrng * Y/yres
+
+	def render_tile(row):
+		xt = x[row:row+tile_rows]
+		yt = y[row:row+tile_rows]
+		render[row:row+tile_rows,:,0] = iterate_tile(xt, yt, coeff, max_iters, radius)
+		render[row:row+tile_rows,:,1] = abs(xt)
+		render[row:row+tile_rows,:,2] = abs(yt)
+
+	# numpy releases the GIL inside array operations, so tiles run concurrently
+	pool = ThreadPool(threads or cpu_count())
+	pool.map(render_tile, range(0, yres, tile_rows))
+	pool.close()
 
 	for i in range(3):
 		render[:,:,i] /= render[:,:,i].max()
@@ -1,9 +1,22 @@
+import subprocess
 import matplotlib.pyplot as plt 
 import numpy as np 
 from matplotlib.widgets import Slider
 
+import kernels
+
 plt.rcParams['axes.facecolor'] = '#000000'
 
+RADIUS = 100		# orbits with a coordinate beyond this have escaped
+COARSE = 2000		# points drawn as soon as the orbit changes, doubled at every refinement
+DEBOUNCE = 150		# ms the orbit sliders must rest before the drawing is refined
+
+# the compiled quadratic map, whose monomials are in the order of iterator
+try:
+	kernel = kernels.load_kernel(2, 3)
+except (OSError, subprocess.CalledProcessError):
+	kernel = None
+
 def iterator(x,y,z,coeffs):
 
 	xc = coeffs[0:10]
@@ -18,59 +31,111 @@ def iterator(x,y,z,coeffs):
 
 	return x,y,z
 
-def itdata(coeffs,tmax,colorstep,x0,y0,z0):
-
-	xl,yl,zl = [],[],[]
-	colors = []
-
-	x = x0; y = y0; z = z0
-
-	for t in range(tmax):
-		x,y,z = iterator(x,y,z,coeffs)
-		xl.append(x)
-		yl.append(y)
-		zl.append(z)
-
-		if abs(x) > 100 or abs(y) > 100 or abs(z) > 100:
-			break
-
-	dxs = [abs(xl[i+colorstep]-xl[i]) for i in range(len(xl)-colorstep)]
-	dys = [abs(yl[i+colorstep]-yl[i]) for i in range(len(yl)-colorstep)]
-	dzs = [abs(zl[i+colorstep]-yl[i]) for i in range(len(zl)-colorstep)]
-
-	mdx = max(dxs)
-	mdy = max(dys)
-	mdz = max(dzs)
-
-	if mdx == 0:
-		mdx = 1
-	if mdy == 0:
-		mdy = 1
-	if mdz == 0:
-		mdz = 1
-
-	for dx,dy,dz in zip(dxs,dys,dzs):
-		cx = 1-dx/mdx
-		cy = 1-dy/mdy
-		cz = 1-dz/mdz
-		cv = (cx,cy,cz)
-		colors.append(cv)
-
-	return xl,yl,zl,colors
-
-def sliders_on_changed(val):
-
-	coeffs = [slider.val for slider in coeff_sliders]
+def iterate(coeffs,tmax,x0,y0,z0):
+	""" positions (n x 3) after x0, y0, z0, ending with the first with a coordinate beyond RADIUS """
+
+	if kernel is not None:
+		# the kernel stops outside a sphere, which holds the cube the explorer stops outside
+		positions = kernel((x0,y0,z0),coeffs,tmax,RADIUS*np.sqrt(3))
+	else:
+		positions = np.zeros((tmax,3))
+		x = x0; y = y0; z = z0
+		for t in range(tmax):
+			x,y,z = iterator(x,y,z,coeffs)
+			positions[t] = x,y,z
+			if abs(x) > RADIUS or abs(y) > RADIUS or abs(z) > RADIUS:
+				positions = positions[:t+1]
+				break
+
+	outside = np.flatnonzero((np.abs(positions) > RADIUS).any(axis=1))
+	if len(outside):
+		positions = positions[:outside[0]+1]
+	return positions
+
+def colours(positions,colorstep):
+
+	d = np.abs(positions[colorstep:] - positions[:-colorstep])
+	if len(d) == 0:
+		return 'w'
+
+	md = d.max(axis=0)
+	md[md == 0] = 1
+	return 1 - d/md
+
+class Orbit(object):
+	""" the orbit of the current coefficients and start, kept and extended as more points are asked for """
+
+	def __init__(self):
+		self.key = None
+		self.positions = np.zeros((0,3))
+		self.escaped = False
+
+	def get(self,coeffs,tmax,start):
+
+		key = (tuple(coeffs),tuple(start))
+		if key != self.key:
+			self.key = key
+			self.positions = np.zeros((0,3))
+			self.escaped = False
+
+		more = tmax - len(self.positions)
+		if more > 0 and not self.escaped:
+			last = self.positions[-1] if len(self.positions) else start
+			new = iterate(coeffs,more,*last)
+			self.escaped = len(new) < more or bool((np.abs(new[-1:]) > RADIUS).any())
+			self.positions = np.vstack((self.positions,new))
+
+		return self.positions[:tmax]
+
+	def covers(self,coeffs,start,tmax):
+		return self.key == (tuple(coeffs),tuple(start)) and (self.escaped or len(self.positions) >= tmax)
+
+def current():
+	coeffs = tuple(slider.val for slider in coeff_sliders)
+	return coeffs,(x0_slider.val,y0_slider.val,z0_slider.val)
+
+def draw_orbit(n):
+
+	global shown
+	coeffs, start = current()
+	positions = orbit.get(coeffs,n,start)
+	pxy.set_offsets(positions[:,:2])
+	pxy.set_facecolor(colours(positions,int(cstep_slider.val)))
+	shown = len(positions)
+	fig.canvas.draw_idle()
 
-	xl, yl, zl, colors = itdata(coeffs,
-		int(tmax_slider.val),int(cstep_slider.val),
-		x0_slider.val,y0_slider.val,z0_slider.val)
+def orbit_on_changed(val):
+	# a coarse orbit straight away and the rest once the sliders rest,
+	# so a further change cancels the refinement still to come
+	refine_timer.stop()
+	tmax = int(tmax_slider.val)
+	coeffs, start = current()
+	if orbit.covers(coeffs,start,tmax):
+		draw_orbit(tmax)
+		return
+
+	# a longer tmax starts from what is already computed
+	known = len(orbit.positions) if orbit.covers(coeffs,start,0) else 0
+	draw_orbit(min(max(COARSE,known),tmax))
+	refine_timer.interval = DEBOUNCE
+	refine_timer.start()
+
+def refine():
+
+	tmax = int(tmax_slider.val)
+	draw_orbit(min(max(2*shown,COARSE),tmax))
+	if shown < tmax and not orbit.escaped:
+		refine_timer.interval = 1
+		refine_timer.start()
+
+def colour_on_changed(val):
+	if shown:
+		pxy.set_facecolor(colours(orbit.positions[:shown],int(cstep_slider.val)))
+		fig.canvas.draw_idle()
+
+def view_on_changed(val):
 
-	xy = np.vstack((xl,yl)).T
-	pxy.set_offsets(xy)
-	pxy.set_facecolor(colors)
 	pxy.set_alpha(alpha_slider.val)
-	ax.set_aspect('equal')
 	ax.set_xlim(-xlim_slider.val+xc_slider.val,
 		xlim_slider.val+xc_slider.val)
 	ax.set_ylim(-ylim_slider.val+yc_slider.val,
@@ -86,58 +151,65 @@ fig = plt.figure(1)
 ax = plt.subplot2grid((2,3),(0,0),colspan=2,rowspan=2)
 pxy = ax.scatter(xl,yl,marker='.',s=6,
 			facecolor='w',edgecolor='None',alpha=0.7)
+ax.set_aspect('equal')
 pos = ax.get_position()
 
+orbit = Orbit()
+shown = 0
+refine_timer = fig.canvas.new_timer(interval=DEBOUNCE)
+refine_timer.single_shot = True
+refine_timer.add_callback(refine)
+
 coeff_sliders_ax = []
 coeff_sliders = []
 for i in range(30):
-	coeff_sliders_ax.append(fig.add_axes([1.1*pos.x1, pos.y1 - (0.02*i), pos.width/3., 0.01], axisbg='w'))
+	coeff_sliders_ax.append(fig.add_axes([1.1*pos.x1, pos.y1 - (0.02*i), pos.width/3., 0.01], facecolor='w'))
 	if i < 10:
 		coeff_sliders.append(Slider(coeff_sliders_ax[i],'a%d' % i,-1,1,valinit=0))
 	elif i >= 10 and i < 20:
 		coeff_sliders.append(Slider(coeff_sliders_ax[i],'b%d' % (i-10),-1,1,valinit=0))
 	else: 
 		coeff_sliders.append(Slider(coeff_sliders_ax[i],'c%d' % (i-20),-1,1,valinit=0))
-	coeff_sliders[i].on_changed(sliders_on_changed)
+	coeff_sliders[i].on_changed(orbit_on_changed)
 
-xlim_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.63, pos.width/3., 0.01], axisbg='w')
+xlim_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.63, pos.width/3., 0.01], facecolor='w')
 xlim_slider = Slider(xlim_slider_ax,'xlim',0.1,2,valinit=1)
-xlim_slider.on_changed(sliders_on_changed)
+xlim_slider.on_changed(view_on_changed)
 
-ylim_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.65, pos.width/3., 0.01], axisbg='w')
+ylim_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.65, pos.width/3., 0.01], facecolor='w')
 ylim_slider = Slider(ylim_slider_ax,'ylim',0.1,2,valinit=1)
-ylim_slider.on_changed(sliders_on_changed)
+ylim_slider.on_changed(view_on_changed)
 
-tmax_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.67, pos.width/3., 0.01], axisbg='w')
+tmax_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.67, pos.width/3., 0.01], facecolor='w')
 tmax_slider = Slider(tmax_slider_ax,'tmax',1000,100000,valinit=5000,valfmt='%d')
-tmax_slider.on_changed(sliders_on_changed)
+tmax_slider.on_changed(orbit_on_changed)
 
-alpha_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.69, pos.width/3., 0.01], axisbg='w')
+alpha_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.69, pos.width/3., 0.01], facecolor='w')
 alpha_slider = Slider(alpha_slider_ax,'alpha',0,1,valinit=0.7)
-alpha_slider.on_changed(sliders_on_changed)
+alpha_slider.on_changed(view_on_changed)
 
-cstep_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.71, pos.width/3., 0.01], axisbg='w')
+cstep_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.71, pos.width/3., 0.01], facecolor='w')
 cstep_slider = Slider(cstep_slider_ax,'colorstep',1,10,valinit=1)
-cstep_slider.on_changed(sliders_on_changed)
+cstep_slider.on_changed(colour_on_changed)
 
-x0_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.73, pos.width/3., 0.01], axisbg='w')
+x0_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.73, pos.width/3., 0.01], facecolor='w')
 x0_slider = Slider(x0_slider_ax,'x0',-1,1,valinit=0.1)
-x0_slider.on_changed(sliders_on_changed)
+x0_slider.on_changed(orbit_on_changed)
 
-y0_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.75, pos.width/3., 0.01], axisbg='w')
+y0_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.75, pos.width/3., 0.01], facecolor='w')
 y0_slider = Slider(y0_slider_ax,'y0',-1,1,valinit=0.1)
-y0_slider.on_changed(sliders_on_changed)
+y0_slider.on_changed(orbit_on_changed)
 
-z0_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.77, pos.width/3., 0.01], axisbg='w')
+z0_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.77, pos.width/3., 0.01], facecolor='w')
 z0_slider = Slider(z0_slider_ax,'z0',-1,1,valinit=0.1)
-z0_slider.on_changed(sliders_on_changed)
+z0_slider.on_changed(orbit_on_changed)
 
-xc_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.79, pos.width/3., 0.01], axisbg='w')
+xc_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.79, pos.width/3., 0.01], facecolor='w')
 xc_slider = Slider(xc_slider_ax,'x center',-1,1,valinit=0.0)
-xc_slider.on_changed(sliders_on_changed)
+xc_slider.on_changed(view_on_changed)
 
-yc_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.81, pos.width/3., 0.01], axisbg='w')
+yc_slider_ax = fig.add_axes([1.1*pos.x1, pos.y1 - 0.81, pos.width/3., 0.01], facecolor='w')
 yc_slider = Slider(yc_slider_ax,'y center',-1,1,valinit=0.0)
-yc_slider.on_changed(sliders_on_changed)
+yc_slider.on_changed(view_on_changed)
 
 plt.show()
\ No newline at end of file
@@ -2,6 +2,8 @@ from __future__ import division
 import time
 import matplotlib.pyplot as plt
 import numpy as np
+import ctypes
+import os
 from numpy import tensordot as tdot
 
 """
@@ -9,8 +11,45 @@ code for finding and saving images of strange attractors in n
 dimensions. currently using cubic order for the equations
 """
 
+""" import external C helper functions (helper.so is built in the repository root, found from any directory) """
+dll = ctypes.cdll.LoadLibrary(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'helper.so'))
+c_n_iterator = dll.n_iterator
+
+def n_iterator(start, compact, d, repeat, radius=0, out=None):
+	""" iterate the compact cubic map in C, returning the points visited
+
+	stops after the first point outside radius (0 disables the check)
+	"""
+	double_p = ctypes.POINTER(ctypes.c_double)
+	if out is None:
+		out = np.zeros((repeat, d))
+
+	start = np.ascontiguousarray(start, dtype=np.float64)
+	steps = c_n_iterator(start.ctypes.data_as(double_p), compact.ctypes.data_as(double_p),
+		d, repeat, ctypes.c_double(radius), out.ctypes.data_as(double_p))
+	if steps < 0:
+		raise MemoryError('Could not allocate the buffers of n_iterator')
+
+	return out[:steps]
+
+def compact_coefficients(coefficients, d):
+	""" collapse the symmetric coefficient tensor to one weight per monomial
+
+	the weights are ordered i <= j <= k over (1, x_1, ..., x_d), as used by
+	n_iterator and cython/search.py
+	"""
+	compact = []
+	for X in range(d):
+		for i in range(d + 1):
+			for j in range(i, d + 1):
+				for k in range(j, d + 1):
+					compact.append(coefficients[X, i, j, k] * len(set(
+						[(i, j, k), (i, k, j), (j, i, k), (j, k, i), (k, i, j), (k, j, i)])))
+
+	return np.array(compact)
+
 def N_iterator(coordinates,coefficients,d):
-	""" single iteration """
+	""" single iteration (dense reference implementation) """
 
 	coordinates = reshape_coordinates(coordinates)
 
@@ -25,17 +64,17 @@ def pixel_density(iterates, xres=320, yres=180):
 	""" check for density of points in image """
 
 	xmin, ymin, xrng, yrng = set_aspect(iterates[:,0], iterates[:,1], xres, yres)
-	render = np.zeros((yres, xres))
 
-	try:
-		for x, y in zip(iterates[:,0], iterates[:,1]):
-			J = get_index(x, xmin, xrng, xres)
-			I = get_index(y, ymin, yrng, yres)
-			render[I, J] += 1
-	except ValueError:
+	if not (xrng > 0 and yrng > 0 and np.isfinite(xrng + yrng)):
 		print 'Invalid value'
 		return False
 
+	J = ((iterates[:,0]-xmin)/xrng * (xres-1)).astype(int)
+	I = ((iterates[:,1]-ymin)/yrng * (yres-1)).astype(int)
+
+	render = np.zeros((yres, xres))
+	render.flat[I * xres + J] = 1
+
 	return check_density(render)
 	
 def check_density(render, min_fill=2.0):
@@ -55,6 +94,10 @@ def set_aspect(xdata, ydata, width, height, debug=False, margin=1.1):
 	xmin, xrng = get_minmax_rng(xdata) 
 	ymin, yrng = get_minmax_rng(ydata)
 
+	return fit_aspect(xmin, xrng, ymin, yrng, width, height, debug, margin)
+
+def fit_aspect(xmin, xrng, ymin, yrng, width, height, debug=False, margin=1.1):
+	""" widen the given data range to aspect ratio w/h """
 	if debug:
 		print 'Data range | X: %.2f | Y: %.2f | Intrinsic aspect ratio: %.2f' % (
 			xrng, yrng, xrng/yrng)
@@ -131,51 +174,48 @@ def make_coefficients(d):
 
 	return coefficients
 
-def save_image(iterates, alpha=0.035, xres=3200, yres=1800):
+def save_image(iterates, projections=None, alpha=0.035, xres=3200, yres=1800):
+	""" render (x, y, depth) index projections, sharing per-dimension work between them """
 
 	dims = ['x','y','z','u','v','w','q','r','s','t']
 
-	for i in range(DIMENSION):
-
-		x_idx = i % DIMENSION
-		y_idx = (i + 1) % DIMENSION
-		z_idx = (i + 2) % DIMENSION
+	if projections is None:
+		projections = [(i, (i + 1) % DIMENSION, (i + 2) % DIMENSION)
+			for i in range(DIMENSION)]
 
-		start = time.time()
-		xmin, ymin, xrng, yrng = set_aspect(
-			iterates[:, x_idx], 
-			iterates[:, y_idx], 
-			xres, yres, debug=True)
-		zmin, zrng = get_minmax_rng(iterates[:, z_idx])
+	start = time.time()
 
-		dxs, mdx = get_dx(iterates[:, x_idx])
-		dys, mdy = get_dx(iterates[:, y_idx])
-		dzs, mdz = get_dx(iterates[:, z_idx])
+	# quantities that only depend on a single dimension are computed once
+	ranges = [get_minmax_rng(iterates[:, k]) for k in range(DIMENSION)]
+	colors = []
+	zalphas = []
+	for k in range(DIMENSION):
+		dks, mdk = get_dx(iterates[:, k])
+		colors.append((1-dks/mdk)*alpha)
+		zmin, zrng = ranges[k]
+		zalphas.append(zalpha(iterates[1:, k], zmin, zrng, a_min=0.25))
 
-		render  = np.zeros((yres, xres, 3))
+	print 'Calculated shared values %.2f sec' % (time.time()-start)
 
-		print 'Calculating pixel values'
-		try:
-			for x, y, z, dx, dy, dz in zip(
-				iterates[1:, x_idx], 
-				iterates[1:, y_idx], 
-				iterates[1:, z_idx], 
-				dxs, dys, dzs):
+	for x_idx, y_idx, z_idx in projections:
 
-				J = get_index(x, xmin, xrng, xres)
-				I = get_index(y, ymin, yrng, yres)
+		start = time.time()
+		xmin, xrng = ranges[x_idx]
+		ymin, yrng = ranges[y_idx]
+		xmin, ymin, xrng, yrng = fit_aspect(xmin, xrng, ymin, yrng, xres, yres, debug=True)
 
-				z_alpha = zalpha(z, zmin, zrng, a_min=0.25)
-				render[I, J, 0] += (1-dx/mdx)*alpha*z_alpha
-				render[I, J, 1] += (1-dy/mdy)*alpha*z_alpha
-				render[I, J, 2] += (1-dz/mdz)*alpha*z_alpha
+		print 'Calculating pixel values'
+		J = ((iterates[1:, x_idx]-xmin)/xrng * (xres-1)).astype(int)
+		I = ((iterates[1:, y_idx]-ymin)/yrng * (yres-1)).astype(int)
+		pixels = I * xres + J
 
-		except ValueError:
-			print 'Invalid value'
+		render = np.zeros((yres, xres, 3))
+		for k, idx in enumerate((x_idx, y_idx, z_idx)):
+			weights = colors[idx] * zalphas[z_idx]
+			render[:, :, k] = np.bincount(pixels, weights, minlength=xres*yres).reshape((yres, xres))
 
 		# set pixel that exceed max RGB to 1
-		for k in range(3):
-			render[:, :, k][np.where(render[:, :, k] > 1)] = 1
+		render[render > 1] = 1
 
 		fname = 'D%d-%s-%dK-%s%s.png' % (
 			DIMENSION, 
@@ -206,20 +246,13 @@ while N_ATTRACTORS < MAX_ATTRACTORS:
 	np.random.seed(seed)
 
 	coefficients = make_coefficients(d)
-	coordinates = np.zeros(d + 1)
-	coordinates[0] = 1
-
-	iterates = np.zeros((T_SEARCH,d))
-	out_of_bounds = False
+	compact = compact_coefficients(coefficients, d)
 
-	for t in range(T_SEARCH):
-		coordinates = N_iterator(coordinates, coefficients, d)
-		iterates[t, :] = coordinates[1:]
-		r = (coordinates[1:]*coordinates[1:]).sum()
+	iterates = n_iterator(np.zeros(d), compact, d, T_SEARCH, radius=10)
+	r = (iterates[-1]*iterates[-1]).sum()
 
-		if r > 100 or np.isnan(r): # trajectory escapes outside radius
-			out_of_bounds = True
-			break
+	# trajectory escapes outside radius
+	out_of_bounds = len(iterates) < T_SEARCH or r > 100 or np.isnan(r)
 
 	if not out_of_bounds:
 		if pixel_density(iterates):
@@ -234,21 +267,16 @@ for i, (coefficients, seed) in enumerate(zip(ATT_COEFFS,ATT_SEED)):
 	print '\n' + 'Attractor: ' + str(seed) + ' | %d/%d' % (
 		i+1, MAX_ATTRACTORS)
 
-	coordinates = np.zeros(d+1)
-	coordinates[0] = 1
+	compact = compact_coefficients(coefficients, d)
 	iterates = np.zeros((T_RENDER,d))
 	
 	print 'Iterating %d steps' % T_RENDER
 	# calculate initial set of points
-	for t in range(T_IDX):
-		coordinates = N_iterator(coordinates,coefficients,d)
-		iterates[t,:] = coordinates[1:]
-	check = np.isnan(iterates[t,:].sum()) # check for overflow
+	n_iterator(np.zeros(d), compact, d, T_IDX, out=iterates[:T_IDX])
+	check = np.isnan(iterates[T_IDX-1,:].sum()) # check for overflow
 
 	if not check:
-		for t in range(T_IDX,T_RENDER):
-			coordinates = N_iterator(coordinates,coefficients,d)
-			iterates[t,:] = coordinates[1:]
+		n_iterator(iterates[T_IDX-1], compact, d, T_RENDER-T_IDX, out=iterates[T_IDX:])
 	
 		end = time.time()
 		its_per_sec = T_RENDER/(end-start)
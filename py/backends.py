@@ -0,0 +1,254 @@
+""" one API over every implementation of iterating, searching and accumulating attractors
+
+    iterate(start, coeff, repeat, radius=0, out=None)
+    search(coeffs, min_fill=1.5, lyapunov_min=LYAPUNOV_MIN)
+    accumulate(positions, axes, bounds, steps, out, alpha=1.0)
+    tone_map(raw, alpha=0.025, mode="clip", gamma=1.0)
+
+each call runs on the first backend in BACKENDS that loads and implements it
+for the given arguments. Backends are loaded on first use, so importing this
+module neither loads helper.so nor runs gcc. BACKENDS is ordered fastest
+first, as measured by benchmark.py:
+
+    ctypes  helper.so, built in the repository root by make
+    kernel  the generated kernels of kernels.py, compiled with gcc on first use
+    cython  the extensions in cython/, built in place with their setup files
+    numpy   vectorized.py, always available
+
+every backend's search keeps the same candidates: an orbit of T_SEARCH steps
+from the origin that stays within RADIUS, whose points (all of them, bounds
+included) fill more than min_fill percent of a 320 x 180 grid, with a
+Lyapunov exponent above lyapunov_min. The fill reported for a hit is that of
+its whole orbit.
+
+attractor.py searches and renders stored orbits through this module. Its
+streaming, multi-orbit, out-of-core and turntable renders call helper.so
+directly, since no other backend implements them.
+
+ATTRACTOR_BACKEND=name (or use(name)) moves one backend to the front
+"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+import kernels
+import vectorized
+from tonemap import tone_map
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = ("ctypes", "kernel", "cython", "numpy")
+T_SEARCH = 2000                 # iterations per candidate during search, as in attractor.py
+LYAPUNOV_MIN = 0.005
+RADIUS = 10
+
+
+class Unsupported(NotImplementedError):
+    """ raised by a backend for arguments it cannot handle, so the next one is tried """
+
+
+def escaped(positions, radius):
+    """ positions up to and including the first outside radius or non-finite """
+    if radius:
+        with np.errstate(invalid="ignore"):
+            inside = np.einsum("ij,ij->i", positions, positions) <= radius * radius
+        outside = np.flatnonzero(~inside)
+        if len(outside):
+            return positions[:outside[0] + 1]
+    return positions
+
+
+def cubic(coeff):
+    if np.size(coeff) != 60:
+        raise Unsupported("Only cubic maps (60 coefficients) are supported")
+
+
+class NumpyBackend(object):
+    name = "numpy"
+
+    def iterate(self, start, coeff, repeat, radius=0, out=None):
+        cubic(coeff)
+        return vectorized.iterate(start, coeff, repeat, radius, out)
+
+    def search(self, coeffs, min_fill, lyapunov_min):
+        cubic(coeffs[0])
+        survivors, xl, yl = vectorized.iterate_batch(coeffs, T_SEARCH, RADIUS)
+        fill = vectorized.batch_density(xl, yl)
+        survivors, fill = survivors[fill > min_fill], fill[fill > min_fill]
+        exponents = vectorized.lyapunov(coeffs[survivors], T_SEARCH, T_SEARCH//10, RADIUS)
+        return [(int(i), f, l) for i, f, l in zip(survivors, fill, exponents) if l > lyapunov_min]
+
+    def accumulate(self, positions, axes, bounds, steps, out, alpha):
+        return vectorized.scatter_views(positions, axes, bounds, steps, out, alpha)
+
+
+class CtypesBackend(object):
+    name = "ctypes"
+
+    def __init__(self):
+        # raises OSError when helper.so has not been built
+        import attractor
+        self.helper = attractor
+
+    def iterate(self, start, coeff, repeat, radius=0, out=None):
+        return escaped(self.helper.iterate(start, coeff, repeat, radius, out), radius)
+
+    def search(self, coeffs, min_fill, lyapunov_min):
+        cubic(coeffs[0])
+        fill = self.helper.fill_densities(coeffs, T_SEARCH, RADIUS, min_fill)
+        survivors = np.flatnonzero(fill > min_fill)
+        exponents = self.helper.lyapunov(coeffs[survivors], T_SEARCH, T_SEARCH//10, RADIUS)
+        chaotic = exponents > lyapunov_min
+        # the test stops counting once past min_fill, so count the whole orbit of the hits
+        fill = self.helper.fill_densities(coeffs[survivors[chaotic]], T_SEARCH, RADIUS, None)
+        return [(int(i), f, l) for i, f, l in zip(survivors[chaotic], fill, exponents[chaotic])]
+
+    def accumulate(self, positions, axes, bounds, steps, out, alpha):
+        self.helper.scatter_views(positions, axes, bounds, steps, out, alpha)
+        return out
+
+
+class KernelBackend(object):
+    name = "kernel"
+
+    def kernel(self, coeff):
+        for order in range(1, 9):
+            n_terms = len(kernels.monomials(order, 3))
+            if 3 * n_terms == np.size(coeff):
+                try:
+                    return kernels.load_kernel(order, 3)
+                except (OSError, subprocess.CalledProcessError) as e:
+                    raise Unsupported("Could not compile the kernel of order {} ({})".format(order, e))
+            if 3 * n_terms > np.size(coeff):
+                break
+        raise Unsupported("No polynomial map in 3D has {} coefficients".format(np.size(coeff)))
+
+    def iterate(self, start, coeff, repeat, radius=0, out=None):
+        return self.kernel(coeff)(start, coeff, repeat, radius, out)
+
+    def search(self, coeffs, min_fill, lyapunov_min):
+        kernel = self.kernel(coeffs[0])
+        hits = []
+        for i, coeff in enumerate(coeffs):
+            positions = kernel((0, 0, 0), coeff, T_SEARCH, RADIUS)
+            if len(positions) < T_SEARCH:
+                continue
+            fill = vectorized.batch_density(positions[:, :1], positions[:, 1:2])[0]
+            if fill <= min_fill:
+                continue
+            exponent = kernel.lyapunov(coeff, T_SEARCH, T_SEARCH//10, RADIUS)[0]
+            if exponent > lyapunov_min:
+                hits.append((i, fill, exponent))
+        return hits
+
+
+class CythonBackend(object):
+    name = "cython"
+
+    def __init__(self):
+        # the extensions are built in place in cython/ and import from there
+        if os.path.join(ROOT, "cython") not in sys.path:
+            sys.path.append(os.path.join(ROOT, "cython"))
+        import iterator_cubic_8d
+        self.iterator = iterator_cubic_8d
+
+    def iterate(self, start, coeff, repeat, radius=0, out=None):
+        cubic(coeff)
+        if np.any(start):
+            raise Unsupported("iteration_cubic_8d always starts from the origin")
+        positions = np.asarray(self.iterator.iteration_cubic_8d(repeat, kernels.compact_coeffs(coeff), 3))
+        if out is not None:
+            out[:] = positions
+            positions = out
+        return escaped(positions, radius)
+
+    def search(self, coeffs, min_fill, lyapunov_min):
+        cubic(coeffs[0])
+        hits = []
+        for i, coeff in enumerate(coeffs):
+            compact = kernels.compact_coeffs(coeff)
+            # density_cubic_8d has no escape radius, so the fill is measured as the other backends do
+            positions = np.asarray(self.iterator.iteration_cubic_8d(T_SEARCH, compact, 3))
+            if len(escaped(positions, RADIUS)) < T_SEARCH or not np.isfinite(positions[-1]).all():
+                continue
+            fill = vectorized.batch_density(positions[:, :1], positions[:, 1:2])[0]
+            if fill <= min_fill:
+                continue
+            exponent = self.iterator.lyapunov_cubic_8d(T_SEARCH, compact[None, :], 3, T_SEARCH//10)[0]
+            if exponent > lyapunov_min:
+                hits.append((i, fill, exponent))
+        return hits
+
+
+CLASSES = {"numpy": NumpyBackend, "ctypes": CtypesBackend, "kernel": KernelBackend, "cython": CythonBackend}
+
+loaded = {}                     # name -> backend, for every backend loaded so far
+unavailable = {}                # name -> why it could not be loaded
+preference = list(BACKENDS)
+
+
+def load(name):
+    """ backend name, loaded on first use, or None if it is unavailable """
+    if name not in loaded and name not in unavailable:
+        try:
+            loaded[name] = CLASSES[name]()
+        except Exception as e:
+            unavailable[name] = "{}: {}".format(type(e).__name__, e)
+    return loaded.get(name)
+
+
+def use(name):
+    """ try backend name before all others """
+    if name not in BACKENDS:
+        raise ValueError("Unknown backend '{}', expected one of {}".format(name, ", ".join(BACKENDS)))
+    preference.remove(name)
+    preference.insert(0, name)
+
+
+if os.environ.get("ATTRACTOR_BACKEND"):
+    use(os.environ["ATTRACTOR_BACKEND"])
+
+
+def dispatch(operation, *args):
+    """ run operation on the first backend in preference that implements it for args """
+    for name in preference:
+        method = getattr(load(name), operation, None)
+        if method is None:
+            continue
+        try:
+            return method(*args)
+        except Unsupported:
+            continue
+    raise Unsupported("No available backend can {} these arguments".format(operation))
+
+
+def backend(operation):
+    """ name of the backend operation runs on by default """
+    return next(name for name in preference if hasattr(load(name), operation))
+
+
+def iterate(start, coeff, repeat, radius=0, out=None):
+    """ points visited from start, shape (steps, 3), stopping after the first outside radius (0 disables it)
+
+    points are written into out (repeat x 3, contiguous float64) if given and
+    the result is a view of it
+    """
+    return dispatch("iterate", start, coeff, repeat, radius, out)
+
+
+def search(coeffs, min_fill=1.5, lyapunov_min=LYAPUNOV_MIN):
+    """ (row, fill, exponent) of every row of coeffs that stays bounded, fills min_fill% and is chaotic """
+    return dispatch("search", np.atleast_2d(np.asarray(coeffs, dtype=np.float64)), min_fill, lyapunov_min)
+
+
+def accumulate(positions, axes, bounds, steps, out, alpha=1.0):
+    """ add positions (n x 3) into every view of out, a raw buffer (nviews x yres x xres x 4)
+
+    axes holds (horizontal, vertical, depth) of every view, bounds its
+    (xmin, xrng, ymin, yrng, zmin, zrng) and steps the largest step per axis
+    """
+    return dispatch("accumulate", np.ascontiguousarray(positions, dtype=np.float64), axes, bounds, steps, out, alpha)
+
+
+__all__ = ["iterate", "search", "accumulate", "tone_map", "use", "load", "backend", "loaded", "unavailable", "BACKENDS"]
@@ -0,0 +1,371 @@
+""" benchmark every backend on fixed seeds and print the results as JSON
+
+each case (backend, measure, size) runs in a fresh process, so the peak RSS
+reported is that of the case alone. Backends:
+
+    ctypes  helper.so through attractor.py
+    kernel  the generated C kernels of kernels.py
+    numpy   vectorized.py, the fallback of backends.py
+    cython  the extensions in cython/ (skipped unless built in place)
+    c       the X11 renderer's pipeline, built headless from c/bench.c
+
+measures are iteration steps/sec, search candidates/sec, scatter points/sec
+(tiled: the same for the tile-sorted scatter of helper.c) and end-to-end
+render time. Run from anywhere after building helper.so:
+
+    python py/benchmark.py --sizes 1e5,1e6,1e7 --output bench.json
+
+scatter rates against image size, 1080p to 16K, in float buffers so 16K fits
+in memory:
+
+    python py/benchmark.py --backends ctypes --measures scatter,tiled --sizes 1e7 \
+        --resolution 1920x1080,3840x2160,7680x4320,15360x8640 --precision float
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, SUPPRESS
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the seeds of c/render.c, so every backend iterates the same cubic maps
+SEEDS = ["PIIGEDYLHLKWHQXFCUPHPRNGSBIYBYSTKDAOGCCONONUGMDKJSRBMFJFJSGK",
+         "ODPUMUHYVHMSYKLVJQHGPHEGIJKPFCFPQIFAUNOKFJFCSJGQUCFFKLYESOQL",
+         "KUIGFJAQPTYSSAIWUTSYRXMFFMNVBMLLJTUOGUFXQHQKHCJEVCGODSTIHJEJ",
+         "KLYCUAVJBAQBNUDRICOHHKPVIHIBSPIDDHHBJFKLFEOVBTPJWGSGRKCARNBM"]
+BASE_SEED = 7                   # counter-based seed of the candidates tested by search cases
+SIZES = [int(1e5), int(1e6), int(1e7)]
+CANDIDATES = 1024               # candidates tested by every search case
+RESOLUTIONS = [(1920, 1080)]
+PRECISION = "double"            # element type of the accumulation buffers of ctypes cases
+SEARCH_ITERATES = 2000          # T_SEARCH of attractor.py and c/attractor.h
+
+CASES = [("ctypes", "iterate"), ("ctypes", "search"), ("ctypes", "scatter"), ("ctypes", "tiled"),
+         ("ctypes", "render"),
+         ("kernel", "iterate"), ("kernel", "search"),
+         ("numpy", "iterate"), ("numpy", "search"), ("numpy", "scatter"),
+         ("cython", "iterate"), ("cython", "search"), ("cython", "scatter"), ("cython", "render"),
+         ("c", "render")]
+
+
+class Skipped(Exception):
+    pass
+
+
+def import_attractor():
+    sys.path.insert(0, os.path.join(ROOT, "py"))
+    if not os.path.exists(os.path.join(ROOT, "helper.so")):
+        raise Skipped("helper.so is not built (run make)")
+    import attractor
+    return attractor
+
+
+def import_kernels():
+    sys.path.insert(0, os.path.join(ROOT, "py"))
+    import kernels
+    return kernels
+
+
+def import_cython():
+    sys.path.insert(0, os.path.join(ROOT, "py"))
+    sys.path.insert(0, os.path.join(ROOT, "cython"))
+    try:
+        import iterator_cubic_8d
+        import renderer_v1
+    except ImportError as e:
+        raise Skipped("cython extensions are not built ({})".format(e))
+    return iterator_cubic_8d, renderer_v1
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def ctypes_iterate(seed, size, xres, yres):
+    attractor = import_attractor()
+    coeff = attractor.coeff_from_str(seed)
+    out = np.zeros((size, 3))
+    _, seconds = timed(attractor.iterate, (0, 0, 0), coeff, size, 0, out)
+    return {"seconds": seconds, "steps_per_sec": size / seconds}
+
+
+def ctypes_search(seed, size, xres, yres):
+    return backend_search("CtypesBackend", size)
+
+
+def backend_search(backend, size):
+    """ search case of a backends.py backend, which all keep the same candidates """
+    attractor = import_attractor()
+    import backends
+    search = getattr(backends, backend)().search
+    hits, seconds = timed(search, attractor.candidate_coeffs(BASE_SEED, 0, size), 1.5, attractor.LYAPUNOV_MIN)
+    return {"seconds": seconds, "candidates_per_sec": size / seconds, "hits": len(hits)}
+
+
+def ctypes_scatter(seed, size, xres, yres, scatter="direct"):
+    attractor = import_attractor()
+    attractor.PRECISION = PRECISION
+    positions = attractor.iterate((0, 0, 0), attractor.coeff_from_str(seed), size)[size // 100:]
+    projections = attractor.PROJECTIONS[:1]
+    bounds, steps = attractor.view_bounds(positions, projections, xres, yres)
+    raw = attractor.raw_buffer(1, yres, xres)
+    _, seconds = timed(attractor.scatter_views, positions, [(0, 1, 2)], bounds, steps, raw, 1.0, None, scatter)
+    return {"seconds": seconds, "points_per_sec": len(positions) / seconds, "views": 1, "precision": PRECISION}
+
+
+def ctypes_tiled(seed, size, xres, yres):
+    return ctypes_scatter(seed, size, xres, yres, "tiled")
+
+
+def ctypes_render(seed, size, xres, yres):
+    attractor = import_attractor()
+    attractor.T_RENDER, attractor.T_IDX = size, size // 100
+    with tempfile.TemporaryDirectory() as tmp:
+        # images are written to the working directory
+        os.chdir(tmp)
+        _, seconds = timed(attractor.plot_attractors, [attractor.coeff_from_str(seed)], 0.025, xres, yres)
+    return {"seconds": seconds, "views": len(attractor.PROJECTIONS)}
+
+
+def kernel_iterate(seed, size, xres, yres):
+    attractor = import_attractor()
+    kernel = attractor.kernels.load_kernel(3, 3)
+    out = np.zeros((size, 3))
+    _, seconds = timed(kernel, (0, 0, 0), attractor.coeff_from_str(seed), size, 0, out)
+    return {"seconds": seconds, "steps_per_sec": size / seconds}
+
+
+def kernel_search(seed, size, xres, yres):
+    return backend_search("KernelBackend", size)
+
+
+def numpy_iterate(seed, size, xres, yres):
+    attractor = import_attractor()
+    import vectorized
+    out = np.zeros((size, 3))
+    _, seconds = timed(vectorized.iterate, (0, 0, 0), attractor.coeff_from_str(seed), size, 0, out)
+    return {"seconds": seconds, "steps_per_sec": size / seconds}
+
+
+def numpy_search(seed, size, xres, yres):
+    return backend_search("NumpyBackend", size)
+
+
+def numpy_scatter(seed, size, xres, yres):
+    attractor = import_attractor()
+    import vectorized
+    positions = attractor.iterate((0, 0, 0), attractor.coeff_from_str(seed), size)[size // 100:]
+    bounds, steps = attractor.view_bounds(positions, attractor.PROJECTIONS[:1], xres, yres)
+    raw = attractor.raw_buffer(1, yres, xres)
+    _, seconds = timed(vectorized.scatter_views, positions, [(0, 1, 2)], bounds, steps, raw, 1.0)
+    return {"seconds": seconds, "points_per_sec": len(positions) / seconds, "views": 1}
+
+
+def cython_iterate(seed, size, xres, yres):
+    iterator, _ = import_cython()
+    coeffs = import_kernels().compact_coeffs(import_attractor().coeff_from_str(seed))
+    _, seconds = timed(iterator.iteration_cubic_8d, size, coeffs, 3)
+    return {"seconds": seconds, "steps_per_sec": size / seconds}
+
+
+def cython_search(seed, size, xres, yres):
+    import_cython()
+    from search import test_candidates
+
+    def search():
+        return len(test_candidates(BASE_SEED, 0, size, SEARCH_ITERATES, 3, 0.005))
+
+    hits, seconds = timed(search)
+    return {"seconds": seconds, "candidates_per_sec": size / seconds, "hits": int(hits)}
+
+
+def cython_scatter(seed, size, xres, yres):
+    iterator, _ = import_cython()
+    from render_v1 import accumulate_points
+    from functions import set_aspect, get_minmax_rng
+
+    coeffs = import_kernels().compact_coeffs(import_attractor().coeff_from_str(seed))
+    itdata = np.asarray(iterator.iteration_cubic_8d(size, coeffs, 3))[size // 100:]
+    xa, ya, za = (np.ascontiguousarray(itdata[:, k]) for k in range(3))
+    bounds = set_aspect(xa, ya, xres, yres) + get_minmax_rng(za)
+    raw = np.zeros((yres, xres, 4))
+    _, seconds = timed(accumulate_points, xa, ya, za, bounds, raw)
+    return {"seconds": seconds, "points_per_sec": len(xa) / seconds, "views": 1}
+
+
+def cython_render(seed, size, xres, yres):
+    import_cython()
+    import matplotlib.pyplot as plt
+    from compute import compute_attractors
+    from render_v1 import accumulate_attractor
+    from tonemap import tone_map
+
+    coeffs = import_kernels().compact_coeffs(import_attractor().coeff_from_str(seed))
+
+    def render(path):
+        itdata, error = compute_attractors(coeffs, size, 0.01, 3)
+        raw = accumulate_attractor(itdata[:, 0], itdata[:, 1], itdata[:, 2], xres, yres)
+        plt.imsave(path, tone_map(raw, 0.0065), dpi=300)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _, seconds = timed(render, os.path.join(tmp, "render.png"))
+    return {"seconds": seconds, "views": 1}
+
+
+def run_case(backend, measure, seed, size, xres, yres):
+    """ result of one case, run in this process with everything it prints sent to stderr """
+    with redirect_stdout(sys.stderr):
+        return globals()["{}_{}".format(backend, measure)](seed, size, xres, yres)
+
+
+def build_c(size, xres, yres, directory):
+    """ c/bench.c compiled for size iterations at xres x yres, as make bench does with -D overrides """
+    c = os.path.join(ROOT, "c")
+    path = os.path.join(directory, "bench-{}-{}x{}".format(size, xres, yres))
+    subprocess.check_call(["gcc"] + [os.path.join(c, f) for f in ("bench.c", "attractor.c", "transform.c")] +
+                          ["-Ofast", "-funsafe-math-optimizations", "-DT_RENDER={}".format(size),
+                           "-DXRES={}".format(xres), "-DYRES={}".format(yres), "-lm", "-o", path])
+    return path
+
+
+def c_result(output):
+    """ the JSON line of c/bench.c, with rates added """
+    result = json.loads(output)
+    result["steps_per_sec"] = result["iterations"] / result["iterate_seconds"]
+    result["points_per_sec"] = result["points"] / result["scatter_seconds"]
+    result["views"] = 1
+    return {k: v for k, v in result.items() if k not in ("seed", "iterations", "points", "xres", "yres")}
+
+
+def measure_process(command, verbose=False):
+    """ (stdout, exit code, peak RSS in MB) of a child process """
+    with tempfile.TemporaryFile() as out:
+        child = subprocess.Popen(command, cwd=ROOT, stdout=out, stderr=None if verbose else subprocess.DEVNULL)
+        _, status, usage = os.wait4(child.pid, 0)
+        child.returncode = os.waitstatus_to_exitcode(status)
+        out.seek(0)
+        output = out.read().decode()
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 / 2**20 if sys.platform == "darwin" else 1 / 2**10
+    return output, child.returncode, usage.ru_maxrss * scale
+
+
+def benchmark(cases, seeds, sizes, candidates, resolutions, verbose=False):
+    """ run every case in its own process and collect the results """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend, measure in cases:
+            for seed, size, (xres, yres) in [(seed, size, res)
+                                             for res in (resolutions if measure != "search" else resolutions[:1])
+                                             for seed in (seeds if measure != "search" else seeds[:1])
+                                             for size in (sizes if measure != "search" else [candidates])]:
+                    case = {"backend": backend, "measure": measure, "seed": seed, "size": size,
+                            "xres": xres, "yres": yres}
+                    if backend == "c":
+                        try:
+                            command = [build_c(size, xres, yres, tmp), seed]
+                        except (OSError, subprocess.CalledProcessError) as e:
+                            results.append(dict(case, skipped="could not build c/bench.c ({})".format(e)))
+                            continue
+                    else:
+                        command = [sys.executable, os.path.abspath(__file__), "--case",
+                                   json.dumps([backend, measure, seed, size, xres, yres, PRECISION])]
+
+                    output, code, rss = measure_process(command, verbose)
+                    if code != 0:
+                        case["error"] = "exit code {}".format(code)
+                    else:
+                        case.update(c_result(output) if backend == "c" else json.loads(output))
+                        if "skipped" not in case:
+                            case["peak_rss_mb"] = rss
+                    results.append(case)
+                    print("{backend:>6} {measure:<8} {size:>10} {xres:>5}x{yres:<5} {0}".format(
+                          case.get("skipped") or case.get("error") or "{:.3f} sec | {:.0f} MB".format(
+                              case["seconds"], rss), **case), file=sys.stderr)
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL)
+        commit = commit.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count()}
+
+
+def sizes_list(text):
+    return [int(float(size)) for size in text.split(",")]
+
+
+def resolutions_list(text):
+    return [tuple(int(n) for n in res.lower().split("x")) for res in text.split(",")]
+
+
+def main():
+    global PRECISION
+    parser = ArgumentParser(description="Benchmarks every backend on fixed seeds")
+    parser.add_argument("--backends", dest="backends", action="store", default=",".join(dict(CASES)),
+            help="comma separated backends to run (default all)")
+    parser.add_argument("--measures", dest="measures", action="store", default="iterate,search,scatter,tiled,render",
+            help="comma separated measures to run (default all)")
+    parser.add_argument("--sizes", dest="sizes", action="store", type=sizes_list, default=SIZES,
+            help="comma separated numbers of iterations, e.g. 1e5,1e6")
+    parser.add_argument("--candidates", dest="candidates", action="store", type=int, default=CANDIDATES,
+            help="candidates tested by search cases (default {})".format(CANDIDATES))
+    parser.add_argument("--seeds", dest="seeds", action="store", type=int, default=1,
+            help="how many of the fixed seeds to run (1 to {})".format(len(SEEDS)))
+    parser.add_argument("--resolution", dest="resolutions", action="store", type=resolutions_list,
+            default=RESOLUTIONS, help="comma separated image sizes as WIDTHxHEIGHT (default {}x{})".format(
+            *RESOLUTIONS[0]))
+    parser.add_argument("--precision", dest="precision", action="store", default=PRECISION,
+            choices=("double", "float", "fixed"), help="accumulation buffers of ctypes cases (default double)")
+    parser.add_argument("--output", dest="output", action="store",
+            help="write the JSON results to a file instead of stdout")
+    parser.add_argument("--verbose", dest="verbose", action="store_true",
+            help="show the output of every case")
+    parser.add_argument("--case", dest="case", action="store", help=SUPPRESS)
+    args = parser.parse_args()
+
+    PRECISION = args.precision
+    if args.case:
+        backend, measure, seed, size, xres, yres, PRECISION = json.loads(args.case)
+        try:
+            result = run_case(backend, measure, seed, size, xres, yres)
+        except Skipped as e:
+            result = {"skipped": str(e)}
+        print(json.dumps(result))
+        return
+
+    backends = args.backends.split(",")
+    measures = args.measures.split(",")
+    cases = [case for case in CASES if case[0] in backends and case[1] in measures]
+    results = benchmark(cases, SEEDS[:args.seeds], args.sizes, args.candidates, args.resolutions,
+                        verbose=args.verbose)
+
+    report = json.dumps({"meta": metadata(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
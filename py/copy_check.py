@@ -0,0 +1,174 @@
+""" check that the helper.so wrappers of attractor.py copy nothing when given their buffers
+
+every case calls a wrapper with preallocated, contiguous buffers of the right
+type and reports the bytes Python allocated during the call (traced by
+tracemalloc, which also sees NumPy array data) next to the size of the buffers
+passed in. A case fails if the call allocates more than COPY_LIMIT bytes or if
+its output is not the buffer given. The control case passes float32 positions,
+which must be converted, so it checks that the copies would be seen. Run from
+anywhere after building helper.so:
+
+    python py/copy_check.py --size 1e6 --resolution 1920x1080
+
+or, as a test asserting the byte counts at a smaller size:
+
+    python -m pytest py/copy_check.py
+"""
+import io
+import os
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "py"))
+
+import attractor
+
+SEED = "PIIGEDYLHLKWHQXFCUPHPRNGSBIYBYSTKDAOGCCONONUGMDKJSRBMFJFJSGK"
+SIZE = int(1e6)                 # points iterated or scattered by every case
+RESOLUTION = (1920, 1080)
+COPY_LIMIT = 64 * 1024          # bytes a call may allocate for its small arguments (axes, bounds, ...)
+
+
+def allocated(function, *args, **kwargs):
+    """ result of the call and the peak bytes allocated during it """
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(*args, **kwargs)
+    return result, tracemalloc.get_traced_memory()[1] - before
+
+
+def views(positions, xres, yres):
+    projections = attractor.PROJECTIONS
+    # fit_aspect prints the ranges of every view
+    with redirect_stdout(io.StringIO()):
+        bounds, steps = attractor.view_bounds(positions, projections, xres, yres)
+    return [axes for plane, axes in projections], bounds, steps
+
+
+def check_iterate(coeff, positions, size, xres, yres):
+    out = np.zeros((size, 3))
+    result, nbytes = allocated(attractor.iterate, (0, 0, 0), coeff, size, 0, out)
+    return nbytes, out.nbytes, result is out
+
+
+def check_sum_alpha(coeff, positions, size, xres, yres):
+    Is = np.random.randint(0, yres, size).astype(np.int32)
+    Js = np.random.randint(0, xres, size).astype(np.int32)
+    rx, ry, rz = np.ascontiguousarray(positions.T)
+    out = np.zeros((yres, xres, 3))
+    result, nbytes = allocated(attractor.sum_alpha, yres, xres, Is, Js, rx, ry, rz, out=out)
+    return nbytes, out.nbytes + Is.nbytes + Js.nbytes + 3 * rx.nbytes, result is out
+
+
+def check_accumulate(coeff, positions, size, xres, yres):
+    axes, bounds, steps = views(positions, xres, yres)
+    state = positions[-1].copy()
+    out = attractor.raw_buffer(len(axes), yres, xres)
+    address = out.ctypes.data
+    _, nbytes = allocated(attractor.accumulate, state, coeff, size, axes, bounds, steps, out, 1.0)
+    return nbytes, out.nbytes, out.ctypes.data == address and out.any()
+
+
+def check_scatter(coeff, positions, size, xres, yres, scatter="direct"):
+    axes, bounds, steps = views(positions, xres, yres)
+    out = attractor.raw_buffer(len(axes), yres, xres)
+    address = out.ctypes.data
+    _, nbytes = allocated(attractor.scatter_views, positions, axes, bounds, steps, out, 1.0, None, scatter)
+    return nbytes, out.nbytes + positions.nbytes, out.ctypes.data == address and out.any()
+
+
+def check_tiled(coeff, positions, size, xres, yres):
+    return check_scatter(coeff, positions, size, xres, yres, "tiled")
+
+
+def check_strip(coeff, positions, size, xres, yres):
+    axes, bounds, steps = views(positions, xres, yres)
+    out = attractor.raw_buffer(len(axes), yres // 4, xres)
+    address = out.ctypes.data
+    _, nbytes = allocated(attractor.scatter_strip, positions, axes, bounds, steps, out, 1.0, yres // 4, yres)
+    return nbytes, out.nbytes + positions.nbytes, out.ctypes.data == address and out.any()
+
+
+def check_orbits(coeff, positions, size, xres, yres):
+    axes, bounds, steps = views(positions, xres, yres)
+    states = positions[-attractor.N_ORBITS:].copy()
+    work = attractor.orbit_work(len(states))
+    out = attractor.raw_buffer(len(axes), yres, xres)
+    address = out.ctypes.data
+    _, nbytes = allocated(attractor.accumulate_orbits, states, coeff, size // len(states),
+                          axes, bounds, steps, out, 1.0, work)
+    return nbytes, out.nbytes + work.nbytes, out.ctypes.data == address and out.any()
+
+
+def check_control(coeff, positions, size, xres, yres):
+    # float32 positions are converted by as_doubles, a copy the check must see
+    return check_scatter(coeff, positions.astype(np.float32), size, xres, yres)
+
+
+CASES = [("iterate", check_iterate), ("sum_alpha", check_sum_alpha), ("accumulate", check_accumulate),
+         ("scatter_views", check_scatter), ("scatter_tiled", check_tiled), ("scatter_strip", check_strip),
+         ("accumulate_orbits", check_orbits)]
+
+
+def copies(size, xres, yres):
+    """ (name, bytes allocated, bytes passed, ok) of every case, then of the control """
+    coeff = attractor.coeff_from_str(SEED)
+    positions = attractor.iterate((0, 0, 0), coeff, size)[size // 100:]
+    rows = []
+
+    tracemalloc.start()
+    try:
+        for name, check in CASES:
+            nbytes, passed, same = check(coeff, positions, size, xres, yres)
+            rows.append((name, nbytes, passed, nbytes <= COPY_LIMIT and same))
+
+        nbytes, passed, _ = check_control(coeff, positions, size, xres, yres)
+        rows.append(("control (float32)", nbytes, passed, nbytes >= positions.nbytes))
+    finally:
+        tracemalloc.stop()
+    return rows
+
+
+def test_copies():
+    """ pytest entry: every case stays within COPY_LIMIT and the control copy is seen """
+    rows = copies(int(1e5), 640, 360)
+    for name, nbytes, passed, ok in rows[:-1]:
+        assert nbytes <= COPY_LIMIT, "{} allocated {:,} bytes".format(name, nbytes)
+        assert ok, "{} did not fill the buffer it was given".format(name)
+    name, nbytes, passed, ok = rows[-1]
+    assert ok, "the float32 copy of {:,} bytes was not seen ({:,} allocated)".format(passed, nbytes)
+
+
+def resolution(text):
+    return tuple(int(n) for n in text.lower().split("x"))
+
+
+def main():
+    parser = ArgumentParser(description="Checks that the helper.so wrappers copy nothing")
+    parser.add_argument("--size", dest="size", action="store", type=lambda text: int(float(text)), default=SIZE,
+            help="points iterated or scattered by every case (default {:.0e})".format(SIZE))
+    parser.add_argument("--resolution", dest="resolution", action="store", type=resolution, default=RESOLUTION,
+            help="image size as WIDTHxHEIGHT (default {}x{})".format(*RESOLUTION))
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(ROOT, "helper.so")):
+        sys.exit("helper.so is not built (run make)")
+
+    failed = []
+    for name, nbytes, passed, ok in copies(args.size, *args.resolution):
+        print("{:<18} {:>12,} bytes allocated for {:>13,} bytes passed  {}".format(
+              name, nbytes, passed, "ok" if ok else "FAILED"))
+        if not ok:
+            failed.append(name)
+
+    if failed:
+        sys.exit("Copies found in: " + ", ".join(failed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+""" mapping orbits onto images: bounds, aspect ratio, step sizes and depth alpha
+
+shared by attractor.py, animate.py and the Cython scripts (cython/functions.py)
+"""
+import numpy as np
+
+
+def get_minmax_rng(data):
+    max_val = data.max()
+    min_val = data.min()
+    data_range = max_val - min_val
+
+    return min_val, data_range
+
+
+def fit_aspect(xmin, xrng, ymin, yrng, width, height, debug=False, margin=1.1):
+    """ widen the data range xmin..xmin+xrng, ymin..ymin+yrng to the aspect ratio w/h """
+    if debug:
+        print("Data range | X: {:.2f} | Y: {:.2f} | Intrinsic aspect ratio: {:.2f}".format(xrng, yrng, xrng/yrng))
+
+    xmid = xmin + xrng/2
+    ymid = ymin + yrng/2
+
+    if xrng/yrng < width/height:
+        xrng = width/height * yrng
+    else:
+        yrng = height/width * xrng
+
+    xrng *= margin
+    yrng *= margin
+
+    xmin = xmid - xrng/2.
+    ymin = ymid - yrng/2
+    if debug:
+        print("Rescaled data range | X: {:.2f} | Y: {:.2f} | New aspect ratio: {:.2f}".format(xrng, yrng, xrng/yrng))
+
+    return xmin, ymin, xrng, yrng
+
+
+def get_dx(xdata):
+    dx = abs(xdata - np.roll(xdata, 1))[1:]
+    mdx = np.amax(dx)
+    return dx, mdx
+
+
+def zalpha(z, zmin, zrng, a_min=0):
+    """ return alpha based on z depth """
+    alpha = a_min + (1-a_min)*(z-zmin)/zrng
+    return alpha
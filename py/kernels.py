@@ -0,0 +1,207 @@
+""" generate, compile and cache unrolled C kernels for polynomial maps of any order and dimension """
+import ctypes
+import hashlib
+import os
+import subprocess
+import tempfile
+from collections import Counter
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+CACHE_DIR = os.environ.get("ATTRACTOR_KERNEL_CACHE",
+                           os.path.join(os.path.expanduser("~"), ".cache", "strange-attractors"))
+CFLAGS = ["-shared", "-fPIC", "-Ofast", "-funsafe-math-optimizations"]
+VARIABLES = "xyzuvwqrst"
+
+_loaded = {}
+
+
+def monomials(order, dim):
+    """ terms of a polynomial map as tuples of variable indices, in Sprott's order
+
+    terms are sorted by degree, then by the number of distinct variables
+    (descending), then by their variables listed most repeated first. For the
+    cubic map in 3D this is the 20-term order of helper.c, for quadratic maps in
+    2D and 3D the order used by the escape-time and explorer scripts
+    """
+    terms = []
+    for degree in range(order + 1):
+        terms.extend(combinations_with_replacement(range(dim), degree))
+
+    def key(term):
+        counts = Counter(term)
+        spelled = sorted(term, key=lambda v: (-counts[v], v))
+        return len(term), -len(counts), spelled
+
+    return sorted(terms, key=key)
+
+
+def compact_coeffs(coeff):
+    """ cubic 3D coefficients in Sprott's order rearranged for cython/iterator_cubic_8d
+
+    there every term is a product coords[i] * coords[j] * coords[k] with
+    i <= j <= k over (1, x, y, z), so a term of lower degree is padded with ones
+    """
+    terms = monomials(3, 3)
+    compact = [(i, j, k) for i in range(4) for j in range(i, 4) for k in range(j, 4)]
+    index = [compact.index(tuple(sorted((0,) * (3 - len(t)) + tuple(v + 1 for v in t)))) for t in terms]
+
+    coeff = np.asarray(coeff, dtype=np.float64).reshape(3, len(terms))
+    out = np.zeros((3, len(compact)))
+    out[:, index] = coeff
+    return out.ravel()
+
+
+def term_name(term):
+    return "".join(VARIABLES[v] for v in term) or "1"
+
+
+def kernel_source(order, dim):
+    """ C source of the unrolled map of given order and dimension
+
+    int iterate(double *start, double *coeffs, int repeat, double radius, double *out)
+    writes up to repeat points of dim coordinates to out and returns how many
+    were written; it stops after the first point outside radius (0 disables it)
+
+    void lyapunov(double *coeffs, int n, int repeat, int transient, double radius, double *out)
+    largest Lyapunov exponent of each of the n coefficient sets, as in helper.c
+    """
+    terms = monomials(order, dim)
+    index = {term: i for i, term in enumerate(terms)}
+    nterms = len(terms)
+    radius2 = " + ".join("p[{0}]*p[{0}]".format(v) for v in range(dim))
+
+    lines = [
+        "/* generated by kernels.py: order {}, dimension {}, {} terms */".format(order, dim, nterms),
+        "#include <math.h>",
+        "",
+        "static inline void step(double *p, double *coeffs) {",
+    ]
+
+    # every term is its parent term (one factor fewer) times a single variable
+    for i, term in enumerate(terms[1:], 1):
+        parent = index[term[1:]]
+        expr = "t{} * p[{}]".format(parent, term[0]) if parent else "p[{}]".format(term[0])
+        lines.append("\tdouble t{} = {}; /* {} */".format(i, expr, term_name(term)))
+
+    for v in range(dim):
+        sums = ["coeffs[{}]".format(v * nterms)]
+        sums += ["coeffs[{}] * t{}".format(v * nterms + i, i) for i in range(1, nterms)]
+        lines.append("\tdouble n{} = {};".format(v, "\n\t\t+ ".join(sums)))
+
+    lines += ["\tp[{0}] = n{0};".format(v) for v in range(dim)]
+    lines += [
+        "}",
+        "",
+        "int iterate(double *start, double *coeffs, int repeat, double radius, double *out) {",
+        "\tdouble p[{}];".format(dim),
+        "\tfor (int v = 0; v < {}; v++)".format(dim),
+        "\t\tp[v] = start[v];",
+        "\tfor (int run = 0; run < repeat; run++) {",
+        "\t\tstep(p, coeffs);",
+        "\t\tfor (int v = 0; v < {}; v++)".format(dim),
+        "\t\t\tout[{} * run + v] = p[v];".format(dim),
+        "\t\tif (radius && radius * radius < {})".format(radius2),
+        "\t\t\treturn run + 1;",
+        "\t}",
+        "\treturn repeat;",
+        "}",
+        "",
+        "void lyapunov(double *coeffs, int n, int repeat, int transient, double radius, double *out) {",
+        "\tdouble d0 = 1e-8;",
+        "\tfor (int c = 0; c < n; c++) {",
+        "\t\tdouble p[{0}] = {{0}}, e[{0}] = {{d0}};".format(dim),
+        "\t\tdouble lsum = 0;",
+        "\t\tint run;",
+        "\t\tout[c] = -HUGE_VAL;",
+        "\t\tfor (run = 0; run < repeat; run++) {",
+        "\t\t\tstep(p, coeffs + {} * c);".format(dim * nterms),
+        "\t\t\tstep(e, coeffs + {} * c);".format(dim * nterms),
+        "\t\t\tif (radius * radius < {})".format(radius2),
+        "\t\t\t\tbreak;",
+        "\t\t\tdouble d = 0;",
+        "\t\t\tfor (int v = 0; v < {}; v++)".format(dim),
+        "\t\t\t\td += (e[v] - p[v]) * (e[v] - p[v]);",
+        "\t\t\td = sqrt(d);",
+        "\t\t\tif (d == 0)",
+        "\t\t\t\tbreak;",
+        "\t\t\tif (run >= transient)",
+        "\t\t\t\tlsum += log(d / d0);",
+        "\t\t\tfor (int v = 0; v < {}; v++)".format(dim),
+        "\t\t\t\te[v] = p[v] + d0 * (e[v] - p[v]) / d;",
+        "\t\t}",
+        "\t\tif (run == repeat && repeat > transient)",
+        "\t\t\tout[c] = 1.4426950408889634 * lsum / (repeat - transient);",
+        "\t}",
+        "}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class Kernel(object):
+    """ compiled iterator for one (order, dimension) pair """
+
+    def __init__(self, order, dim, path):
+        self.order = order
+        self.dim = dim
+        self.n_terms = len(monomials(order, dim))
+        self.path = path
+        dll = ctypes.cdll.LoadLibrary(path)
+        self._iterate = dll.iterate
+        self._iterate.restype = ctypes.c_int
+        self._lyapunov = dll.lyapunov
+
+    def __call__(self, start, coeffs, repeat, radius=0, out=None):
+        """ points visited from start, shape (steps, dim), stopping after leaving radius
+
+        the points are written into out (repeat x dim, contiguous) if given and
+        the result is a view of it
+        """
+        double_p = ctypes.POINTER(ctypes.c_double)
+        start = np.ascontiguousarray(start, dtype=np.float64)
+        coeffs = np.ascontiguousarray(coeffs, dtype=np.float64)
+        if coeffs.size != self.dim * self.n_terms:
+            raise ValueError("Expected {} coefficients, got {}".format(self.dim * self.n_terms, coeffs.size))
+
+        if out is None:
+            out = np.zeros((repeat, self.dim))
+        elif out.shape != (repeat, self.dim) or out.dtype != np.float64 or not out.flags.c_contiguous:
+            raise ValueError("Expected a contiguous float64 output of shape ({}, {})".format(repeat, self.dim))
+        steps = self._iterate(start.ctypes.data_as(double_p), coeffs.ctypes.data_as(double_p),
+                         repeat, ctypes.c_double(radius), out.ctypes.data_as(double_p))
+        return out[:steps]
+
+    def lyapunov(self, coeffs, repeat, transient, radius):
+        """ largest Lyapunov exponent (bits/iteration) of every row of coeffs, -inf if it escapes """
+        double_p = ctypes.POINTER(ctypes.c_double)
+        coeffs = np.ascontiguousarray(coeffs, dtype=np.float64).reshape(-1, self.dim * self.n_terms)
+        out = np.zeros(len(coeffs))
+        self._lyapunov(coeffs.ctypes.data_as(double_p), len(coeffs), repeat, transient,
+                       ctypes.c_double(radius), out.ctypes.data_as(double_p))
+        return out
+
+
+def load_kernel(order, dim):
+    """ compile the kernel for (order, dim) on first use and load it from the disk cache after """
+    if (order, dim) in _loaded:
+        return _loaded[order, dim]
+
+    source = kernel_source(order, dim)
+    digest = hashlib.sha1((source + " ".join(CFLAGS)).encode()).hexdigest()[:12]
+    path = os.path.join(CACHE_DIR, "poly_o{}_d{}_{}.so".format(order, dim, digest))
+
+    if not os.path.exists(path):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # build next to the cache so the final rename stays on one file system
+        with tempfile.TemporaryDirectory(dir=CACHE_DIR) as tmp:
+            src = os.path.join(tmp, "kernel.c")
+            with open(src, "w") as f:
+                f.write(source)
+            built = os.path.join(tmp, "kernel.so")
+            subprocess.check_call(["gcc"] + CFLAGS + [src, "-o", built])
+            # another process may be compiling the same kernel, so move into place atomically
+            os.replace(built, path)
+
+    _loaded[order, dim] = Kernel(order, dim, path)
+    return _loaded[order, dim]
@@ -0,0 +1,90 @@
+""" images larger than memory: .npy buffers mapped a strip of rows at a time, and a PNG writer taking strips
+
+an accumulation buffer of shape (yres, xres, 4) is an ordinary .npy file, so
+it doubles as the accumulation cache of tonemap.py; strip() maps only the rows
+being worked on, which leave memory again when the strip is dropped
+"""
+import struct
+import zlib
+
+import numpy as np
+
+
+def create(path, dtype, shape):
+    """ a zeroed .npy file of shape, sparse on most file systems until its strips are written """
+    np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+
+def strip(path, row0, row1, mode="r"):
+    """ rows row0 to row1 of the .npy array at path as an np.memmap of their own """
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if fortran:
+        raise ValueError("{} is not stored in row order".format(path))
+
+    row_bytes = dtype.itemsize * int(np.prod(shape[1:]))
+    return np.memmap(path, dtype=dtype, mode=mode, offset=offset + row0 * row_bytes,
+                     shape=(row1 - row0,) + tuple(shape[1:]))
+
+
+def strip_rows(budget, bytes_per_row, fixed=0):
+    """ rows per strip so that strips of bytes_per_row each stay within budget bytes beside fixed ones """
+    return max(1, (budget - fixed) // bytes_per_row)
+
+
+class PNGWriter(object):
+    """ write an 8 bit RGB PNG strip by strip, compressing every strip into its own IDAT chunk """
+
+    def __init__(self, path, width, height, level=1):
+        self.width, self.height = width, height
+        self.rows = 0
+        self._compressor = zlib.compressobj(level)
+        self._file = open(path, "wb")
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bit RGB, no interlacing
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def write(self, rgb):
+        """ add the next rows, uint8 of shape (rows, width, 3) """
+        if rgb.dtype != np.uint8 or rgb.shape[1:] != (self.width, 3):
+            raise ValueError("Expected uint8 rows of shape (n, {}, 3)".format(self.width))
+        if self.rows + len(rgb) > self.height:
+            raise ValueError("Image only has {} rows".format(self.height))
+
+        # every row is a filter byte (none) followed by its pixels
+        rows = np.zeros((len(rgb), 3 * self.width + 1), dtype=np.uint8)
+        rows[:, 1:] = rgb.reshape(len(rgb), -1)
+        self._chunk(b"IDAT", self._compressor.compress(rows.tobytes()))
+        self.rows += len(rgb)
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self.rows != self.height:
+                raise ValueError("Wrote {} of {} rows".format(self.rows, self.height))
+            self._chunk(b"IDAT", self._compressor.flush())
+            self._chunk(b"IEND", b"")
+        finally:
+            self._file.close()
+
+    def _chunk(self, kind, data):
+        if not data and kind == b"IDAT":
+            return
+        self._file.write(struct.pack(">I", len(data)) + kind + data)
+        self._file.write(struct.pack(">I", zlib.crc32(kind + data)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, *exc):
+        # after an error the image is incomplete anyway, so only release the file
+        if kind is None:
+            self.close()
+        else:
+            self._file.close()
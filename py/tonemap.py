@@ -0,0 +1,170 @@
+""" tone mapping of raw accumulation buffers, and an on-disk cache of those buffers
+
+a raw buffer is yres x xres x 4: the colour weights summed with alpha = 1 in
+the first three channels and the number of points per pixel in the last, so
+alpha, clipping, stretching and gamma can all be changed without iterating
+or scattering again
+
+the cache is off unless CACHE_DIR is set (or $ATTRACTOR_ACCUMULATION_CACHE);
+it keeps at most CACHE_LIMIT MB, deleting the least recently used buffers first
+"""
+import hashlib
+import os
+
+import numpy as np
+
+CACHE_DIR = os.environ.get("ATTRACTOR_ACCUMULATION_CACHE")     # None disables the cache
+CACHE_LIMIT = 4096              # MB of buffers kept in the cache
+TONE_MAPS = ("clip", "stretch", "feedback", "density")
+FIXED_BITS = 12                 # fractional bits of fixed point buffers, as in helper.c
+
+
+def cache_path(seed, iterations, plane, xres, yres, key=None, directory=None):
+    """ file of the raw buffer of one projection, or None when the cache is off
+
+    key holds every other setting that changes the buffer's content (how the
+    orbit was rendered, its transient, the buffer precision, ...) and is hashed
+    into the name
+    """
+    directory = directory or CACHE_DIR
+    if not directory:
+        return None
+    digest = hashlib.sha1(repr(sorted((key or {}).items())).encode()).hexdigest()[:12]
+    name = "{}-{}K-{}-{}x{}-{}.npy".format(seed, iterations // 1000, plane, xres, yres, digest)
+    return os.path.join(directory, name)
+
+
+def save_accumulation(path, raw):
+    """ cache raw at path (nothing if None), then evict buffers beyond CACHE_LIMIT """
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # single precision halves the size; the sums are only ever turned into 8 bit pixels
+    part = path[:-len(".npy")] + ".part.npy"
+    np.save(part, raw.astype(np.float32))
+    os.replace(part, path)
+    evict(os.path.dirname(path))
+
+
+def load_accumulation(path):
+    """ cached raw buffer at path, or None if there is none """
+    if path is None or not os.path.exists(path):
+        return None
+    # the modification time orders the buffers for evict
+    os.utime(path)
+    return np.load(path)
+
+
+def evict(directory=None, limit=None):
+    """ delete the least recently used buffers in the cache until it holds at most limit MB (CACHE_LIMIT) """
+    directory = directory or CACHE_DIR
+    limit = CACHE_LIMIT if limit is None else limit
+    buffers = []
+    for entry in os.scandir(directory):
+        # .part.npy files are buffers still being written
+        if entry.name.endswith(".npy") and not entry.name.endswith(".part.npy"):
+            stat = entry.stat()
+            buffers.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in buffers)
+    for _, size, path in sorted(buffers):
+        if total <= limit * 2**20:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # evicted by another process sharing the cache
+            pass
+        total -= size
+
+
+def decode(raw):
+    """ raw buffer as float32, converting fixed point (uint32) weights """
+    if raw.dtype == np.uint32:
+        out = raw.astype(np.float32)
+        out[..., :3] *= 1 / 2**FIXED_BITS
+        return out
+    return raw.astype(np.float32, copy=False)
+
+
+def channel_limits(rgb):
+    """ (lo, hi) of every channel """
+    # per channel reductions over strided views are much faster than one over axes (0, 1)
+    lo = np.array([rgb[..., k].min() for k in range(3)])
+    hi = np.array([rgb[..., k].max() for k in range(3)])
+    return lo, hi
+
+
+def stretch(rgb, limits=None):
+    """ map every channel linearly onto [0, 1] (the np.interp of render_v2), from limits (lo, hi) if given """
+    lo, hi = channel_limits(rgb) if limits is None else limits
+    rng = hi - lo
+    return (rgb - lo) / np.where(rng > 0, rng, 1)
+
+
+def feedback(rgb):
+    """ alpha-scaled sums damped as render_v2 does, before stretching (see tone_map) """
+    norm = np.sqrt(np.einsum("ijk,ijk->ij", rgb, rgb))[..., None]
+    return rgb * -np.expm1(-norm) / np.where(norm > 0, norm, 1)
+
+
+def image_limits(raw, alpha=0.025, mode="clip"):
+    """ (lo, hi) of the values a tone map normalises the whole image by, None for clip
+
+    tone mapping a part of an image, such as a strip, with the limits of the
+    whole image (those of its parts joined by merge_limits) gives the same
+    pixels as tone mapping the whole image
+    """
+    raw = decode(raw)
+    sums = raw[..., :3]
+    if mode == "stretch":
+        return channel_limits(alpha * sums)
+    if mode == "feedback":
+        return channel_limits(feedback(alpha * sums))
+    if mode == "density":
+        counts = raw[..., 3:]
+        return np.zeros(2), np.array([(sums / np.maximum(counts, 1)).max(), counts.max()])
+    return None
+
+
+def merge_limits(a, b):
+    """ limits of two parts of an image together """
+    if a is None or b is None:
+        return a if b is None else b
+    return np.minimum(a[0], b[0]), np.maximum(a[1], b[1])
+
+
+def tone_map(raw, alpha=0.025, mode="clip", gamma=1.0, limits=None):
+    """ RGB image in [0, 1] from a raw buffer
+
+    clip      alpha-scaled sums clipped at 1 (render_v1 and attractor.py)
+    stretch   alpha-scaled sums stretched onto [0, 1] per channel
+    feedback  render_v2: there every point is damped by (1 - |RGB|) of its pixel,
+              which for a pixel of fixed hue sums to |RGB| = 1 - exp(-|alpha * sums|);
+              the result is stretched as render_v2 does
+    density   mean colour of the pixel scaled by log(1 + count), ignoring alpha
+
+    limits (see image_limits) replace those of raw itself, for tone mapping
+    an image in parts
+    """
+    raw = decode(raw)
+    sums = raw[..., :3]
+
+    if mode == "clip":
+        rgb = alpha * sums
+        np.minimum(rgb, 1, out=rgb)
+    elif mode == "stretch":
+        rgb = stretch(alpha * sums, limits)
+    elif mode == "feedback":
+        rgb = stretch(feedback(alpha * sums), limits)
+    elif mode == "density":
+        counts = raw[..., 3:]
+        mean = sums / np.maximum(counts, 1)
+        mean_max, count_max = limits[1] if limits is not None else (mean.max(), counts.max())
+        rgb = mean / max(mean_max, 1e-300) * np.log1p(counts) / max(np.log1p(count_max), 1e-300)
+    else:
+        raise ValueError("Unknown tone map '{}', expected one of {}".format(mode, ", ".join(TONE_MAPS)))
+
+    if gamma != 1:
+        rgb = np.maximum(rgb, 0) ** (1 / gamma)
+    return rgb
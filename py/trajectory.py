@@ -0,0 +1,127 @@
+""" memory-mapped trajectory store: compute an orbit once, render it many times
+
+a store is a JSON header padded to a multiple of PAGE bytes (coefficients, seed,
+dimension, transient, length, per-axis bounds and largest steps) followed by
+the points as raw float64 rows, read back lazily through np.memmap
+"""
+import json
+import os
+
+import numpy as np
+
+MAGIC = b"ATTRACTOR-TRAJECTORY"
+PAGE = 4096
+VERSION = 1
+
+
+class TrajectoryWriter(object):
+    """ append chunks of points to a new store, updating its header on close """
+
+    def __init__(self, path, coeffs, dimension=3, seed="", transient=0):
+        self.path = path
+        self.meta = {
+            "version": VERSION,
+            "dimension": dimension,
+            "seed": seed,
+            "coeffs": [float(c) for c in coeffs],
+            "transient": transient,
+            "length": 0,
+            "min": [np.inf] * dimension,
+            "max": [-np.inf] * dimension,
+            "steps": [0.0] * dimension,
+        }
+        self._last = None
+        # room for the fields that grow as points are appended, which are the only ones rewritten
+        self.header_size = PAGE * ((len(json.dumps(self.meta)) + 1024) // PAGE + 1)
+        self._file = open(path, "wb")
+        self._write_header()
+
+    def append(self, points):
+        """ add points (n x dimension) after those already stored """
+        points = np.ascontiguousarray(points, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != self.meta["dimension"]:
+            raise ValueError("Expected points of shape (n, {})".format(self.meta["dimension"]))
+        if len(points) == 0:
+            return
+
+        # the step across the chunk boundary counts too, so compare with the last stored point
+        joined = points if self._last is None else np.vstack([self._last, points])
+        meta = self.meta
+        meta["min"] = np.minimum(meta["min"], points.min(axis=0)).tolist()
+        meta["max"] = np.maximum(meta["max"], points.max(axis=0)).tolist()
+        if len(joined) > 1:
+            meta["steps"] = np.maximum(meta["steps"], np.abs(np.diff(joined, axis=0)).max(axis=0)).tolist()
+        meta["length"] += len(points)
+        self._last = points[-1:].copy()
+
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(points.tobytes())
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._write_header()
+        self._file.close()
+
+    def _write_header(self):
+        header = MAGIC + b" %08d\n" % self.header_size + json.dumps(self.meta).encode()
+        if len(header) > self.header_size:
+            raise ValueError("Trajectory header exceeds {} bytes".format(self.header_size))
+        self._file.seek(0)
+        self._file.write(header.ljust(self.header_size, b" "))
+        self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Trajectory(object):
+    """ read-only view of a store; points is an (length x dimension) np.memmap """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            first = f.readline()
+            if not first.startswith(MAGIC):
+                raise ValueError("{} is not a trajectory store".format(path))
+            self.header_size = int(first[len(MAGIC):])
+            meta = json.loads(f.read(self.header_size - len(first)).decode())
+        if meta["version"] != VERSION:
+            raise ValueError("Unsupported trajectory version {}".format(meta["version"]))
+
+        self.meta = meta
+        self.dimension = meta["dimension"]
+        self.seed = meta["seed"]
+        self.coeffs = np.array(meta["coeffs"])
+        self.transient = meta["transient"]
+        self.min = np.array(meta["min"])
+        self.max = np.array(meta["max"])
+        self.steps = np.array(meta["steps"])
+
+        if meta["length"]:
+            self.points = np.memmap(path, dtype=np.float64, mode="r", offset=self.header_size,
+                                    shape=(meta["length"], self.dimension))
+        else:
+            self.points = np.zeros((0, self.dimension))
+
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, index):
+        return self.points[index]
+
+    def axis(self, a):
+        """ coordinate a of every point, as a strided view """
+        return self.points[:, a]
+
+    def chunks(self, size, overlap=0):
+        """ consecutive slices of at most size points, each starting overlap points before the last ended """
+        for first in range(0, len(self), size):
+            yield self.points[max(first - overlap, 0):first + size]
+
+
+def open_trajectory(path):
+    return Trajectory(path)
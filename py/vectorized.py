@@ -0,0 +1,164 @@
+""" numpy implementations of the cubic map, for many candidates at once or when no compiled helper is available """
+import numpy as np
+
+A_MIN = 0.25                    # alpha of the farthest points, as in helper.c
+
+
+def cubic_terms(x, y, z):
+    """ monomials of the cubic map, in the same order as helper.c """
+    return np.array([np.ones_like(x), x, y, z, x*y, x*z, y*z, x*x, y*y, z*z,
+                     x*y*z, x*x*y, x*x*z, y*y*x, y*y*z, z*z*x, z*z*y,
+                     x*x*x, y*y*y, z*z*z])
+
+
+def iterate_batch(coeffs, repeat, radius=10):
+    """ iterate many candidates together, dropping those that escape
+
+    coeffs has shape (n, 60). Returns the indices of the surviving candidates
+    and their x and y trajectories, each of shape (repeat, survivors).
+    """
+    n = len(coeffs)
+    # structure-of-arrays layout: (output, term, candidate)
+    soa = np.ascontiguousarray(coeffs.reshape(n, 3, 20).transpose(1, 2, 0))
+
+    active = np.arange(n)
+    x, y, z = np.zeros(n), np.zeros(n), np.zeros(n)
+    xhist = np.empty((repeat, n))
+    yhist = np.empty((repeat, n))
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        for t in range(repeat):
+            x, y, z = np.einsum("ktn,tn->kn", soa, cubic_terms(x, y, z))
+            xhist[t, active] = x
+            yhist[t, active] = y
+
+            keep = x*x + y*y + z*z <= radius * radius
+            if not keep.all():
+                active = active[keep]
+                if len(active) == 0:
+                    break
+                soa = soa[:, :, keep]
+                x, y, z = x[keep], y[keep], z[keep]
+
+    return active, xhist[:, active], yhist[:, active]
+
+
+def batch_density(xdata, ydata, xres=320, yres=180):
+    """ fill percentage of every column of xdata/ydata, computed in bulk """
+    xmin, xrng = xdata.min(axis=0), np.ptp(xdata, axis=0)
+    ymin, yrng = ydata.min(axis=0), np.ptp(ydata, axis=0)
+    valid = (xrng > 0) & (yrng > 0) & np.isfinite(xrng + yrng)
+    xdata, ydata = xdata[:, valid], ydata[:, valid]
+    xmin, xrng, ymin, yrng = xmin[valid], xrng[valid], ymin[valid], yrng[valid]
+
+    # vectorized equivalent of set_aspect for every candidate
+    xmid = xmin + xrng/2
+    ymid = ymin + yrng/2
+    wide = xrng/yrng < xres/yres
+    xrng, yrng = np.where(wide, xres/yres * yrng, xrng), np.where(wide, yrng, yres/xres * xrng)
+    xrng, yrng = 1.1 * xrng, 1.1 * yrng
+    xmin, ymin = xmid - xrng/2, ymid - yrng/2
+
+    J = ((xdata - xmin) * (xres-1) / xrng).astype(np.intp)
+    I = ((ydata - ymin) * (yres-1) / yrng).astype(np.intp)
+
+    # points outside the grid are not counted, as in helper.c's fill_density; ranges
+    # at rounding level (orbits collapsed onto a point) put some of them there
+    m = xdata.shape[1]
+    inside = (J >= 0) & (J < xres) & (I >= 0) & (I < yres)
+    occupied = np.zeros((m, yres * xres), dtype=bool)
+    occupied[np.broadcast_to(np.arange(m), I.shape)[inside], (I * xres + J)[inside]] = True
+
+    fill = np.zeros(len(valid))
+    fill[valid] = 100 * np.count_nonzero(occupied, axis=1) / (xres * yres)
+    return fill
+
+
+
+def iterate(start, coeff, repeat, radius=0, out=None):
+    """ points visited from start (repeat x 3), stopping after the first one outside radius (0 disables it) """
+    weights = np.asarray(coeff, dtype=np.float64).reshape(3, 20)
+    if out is None:
+        out = np.zeros((repeat, 3))
+    x, y, z = (float(v) for v in start)
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        for t in range(repeat):
+            out[t] = weights.dot(cubic_terms(x, y, z))
+            x, y, z = out[t]
+            if radius and radius * radius < x*x + y*y + z*z:
+                return out[:t + 1]
+    return out
+
+
+def lyapunov(coeffs, repeat, transient, radius=10):
+    """ largest Lyapunov exponent (bits/iteration) of every row of coeffs, -inf if it escapes
+
+    the orbits of all rows are followed together, each with a neighbour d0 away
+    that is pulled back to that distance after every step, as in helper.c
+    """
+    d0 = 1e-8
+    n = len(coeffs)
+    soa = np.ascontiguousarray(np.reshape(coeffs, (n, 3, 20)).transpose(1, 2, 0))
+    active = np.arange(n)
+    p = np.zeros((3, n))
+    e = np.zeros((3, n))
+    e[0] = d0
+    lsum = np.zeros(n)
+
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        for run in range(repeat):
+            p = np.einsum("ktn,tn->kn", soa, cubic_terms(*p))
+            e = np.einsum("ktn,tn->kn", soa, cubic_terms(*e))
+            d = np.sqrt(((e - p)**2).sum(axis=0))
+
+            keep = (radius * radius >= (p * p).sum(axis=0)) & (d != 0)
+            if not keep.all():
+                active, soa, p, e, d, lsum = active[keep], soa[:, :, keep], p[:, keep], e[:, keep], d[keep], lsum[keep]
+                if len(active) == 0:
+                    break
+
+            if run >= transient:
+                lsum += np.log(d / d0)
+            e = p + d0 * (e - p) / d
+
+    out = np.full(n, -np.inf)
+    if repeat > transient:
+        out[active] = lsum / np.log(2) / (repeat - transient)
+    return out
+
+
+def scatter_views(positions, axes, bounds, steps, out, alpha):
+    """ add stored positions (n x 3) into every view of out, computing what helper.c's scatter_views does
+
+    out is nviews x yres x xres x channels of float64, float32 or fixed point
+    uint32 (FIXED_BITS fractional bits, saturating), bounds and steps as in helper.c
+    """
+    from tonemap import FIXED_BITS
+
+    nviews, yres, xres, channels = out.shape
+    p = positions[1:]
+    colour = 1 - np.abs(np.diff(positions, axis=0)) / steps
+    colour = np.where(colour > 0, alpha * colour, 0)
+
+    for view, (ax, b) in zip(out, zip(axes, bounds)):
+        # truncation towards zero, like the casts in helper.c
+        J = ((p[:, ax[0]] - b[0]) * (xres - 1) / b[1]).astype(np.intp)
+        I = ((p[:, ax[1]] - b[2]) * (yres - 1) / b[3]).astype(np.intp)
+        inside = (J >= 0) & (J < xres) & (I >= 0) & (I < yres)
+
+        zscaled = np.clip((p[inside, ax[2]] - b[4]) * (1 - A_MIN) / b[5] + A_MIN, A_MIN, 1)
+        pixel = I[inside] * xres + J[inside]
+        pixels = view.reshape(-1, channels)
+
+        for k in range(3):
+            w = colour[inside, ax[k]] * zscaled
+            if out.dtype == np.uint32:
+                sums = np.bincount(pixel, np.floor(w * 2**FIXED_BITS + 0.5), xres * yres) + pixels[:, k]
+                pixels[:, k] = np.minimum(sums, 2**32 - 1)
+            else:
+                pixels[:, k] += np.bincount(pixel, w, xres * yres).astype(out.dtype)
+        if channels == 4:
+            counts = np.bincount(pixel, minlength=xres * yres) + pixels[:, 3]
+            pixels[:, 3] = np.minimum(counts, 2**32 - 1) if out.dtype == np.uint32 else counts
+    return out